@@ -1,42 +1,459 @@
+import functools
+import multiprocessing
 import os
-import shutil
-import sqlite3
+import time
 import tkinter as tk
-from tkinter import filedialog, messagebox
-from datetime import datetime, timedelta
+from tkinter import filedialog as tk_filedialog, messagebox as tk_messagebox
+from datetime import date, datetime
 
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 from ttkbootstrap.tooltip import ToolTip
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+
+from rastreador_dados import (
+    ARQUIVO_BANCO, MESES, FORMAS_PAGAMENTO, para_centavos, formatar_moeda, ciclo_fatura, somar_meses_ciclo,
+    data_do_ciclo, vencimento_fatura, ExecutorBanco, CacheAgregados, DespesasColunares, MotorRelatorios,
+    ComprasParceladas, ExportacaoExcel, ImportacaoPlanilha, SnapshotBanco, AgendadorSnapshots,
+    RestauracaoBanco, RelatorioLote, Diagnostico, preparar_banco, ler_dados, ler_agregados, inserir_despesa,
+    linhas_relatorio, montar_filtro_despesas, periodo_vencimento, sql_pagina_despesas, condicao_pagina
+)
+
+# Medição das ações do usuário (painel Diagnóstico: Ctrl+Shift+D)
+diagnostico = Diagnostico()
+
+
+class DialogosMedidos:
+    # Repassa para tkinter.messagebox/filedialog descontando das ações medidas o tempo em
+    # que o diálogo modal fica aberto esperando o usuário
+    def __init__(self, modulo):
+        self._modulo = modulo
+
+    def __getattr__(self, nome):
+        funcao = getattr(self._modulo, nome)
+
+        def chamar(*args, **kwargs):
+            with diagnostico.pausado():
+                return funcao(*args, **kwargs)
+        return chamar
+
+
+messagebox = DialogosMedidos(tk_messagebox)
+filedialog = DialogosMedidos(tk_filedialog)
+
+
+def acao_usuario(metodo):
+    # Mede o método como uma ação do usuário (tempo, banco, linhas e memória)
+    @functools.wraps(metodo)
+    def medido(self, *args, **kwargs):
+        with self.diagnostico.acao(metodo.__name__):
+            return metodo(self, *args, **kwargs)
+    return medido
+
+
+def chave_ordenacao(valor):
+    # Ordenação em memória: números como números, datas dd/mm/aaaa e mm/aa pela data,
+    # texto sem diferenciar maiúsculas e vazios no fim (o primeiro item separa os tipos)
+    if valor is None or valor == "":
+        return (3, "")
+    if isinstance(valor, (int, float)):
+        return (0, valor)
+    partes = str(valor).split("/")
+    if len(partes) in (2, 3) and all(parte.isdigit() for parte in partes):
+        return (1, tuple(int(parte) for parte in reversed(partes)))
+    return (2, str(valor).casefold())
+
+
+class CabecalhosOrdenaveis:
+    # Cabeçalhos clicáveis de um Treeview: cliques seguidos na mesma coluna alternam entre
+    # crescente, decrescente e a ordem original; a seta no título mostra a ordem atual.
+    # ao_ordenar recebe (coluna ou None, decrescente).
+    def __init__(self, tabela, colunas, ao_ordenar):
+        self.tabela = tabela
+        self.colunas = colunas
+        self.ao_ordenar = ao_ordenar
+        self.coluna = None
+        self.decrescente = False
+        for coluna in colunas:
+            self.tabela.heading(coluna, command=lambda c=coluna: self.clicar(c))
+
+    def clicar(self, coluna):
+        if coluna != self.coluna:
+            self.coluna, self.decrescente = coluna, False
+        elif not self.decrescente:
+            self.decrescente = True
+        else:
+            self.coluna, self.decrescente = None, False
+        for c in self.colunas:
+            seta = (" ▼" if self.decrescente else " ▲") if c == self.coluna else ""
+            self.tabela.heading(c, text=c + seta)
+        self.ao_ordenar(self.coluna, self.decrescente)
+
+
+class TabelaPaginada:
+    # Treeview "virtual": mantém materializada apenas a janela visível (mais uma folga)
+    # e busca as páginas no banco por keyset conforme a rolagem, na ordem (chave, id) da
+    # ordenação escolhida (ORDENACOES_DESPESAS, servida por índice) ou do id.
+    # Cada item usa o id da despesa como iid. As consultas são assíncronas: "consultar"
+    # recebe (sql, parametros, ao_concluir), entrega as linhas na thread da interface e
+    # devolve o Future, cancelado se um novo filtro chegar antes de a consulta começar.
+    def __init__(self, tabela, scrollbar, consultar, tamanho_pagina=200, max_paginas=3):
+        self.tabela = tabela
+        self.scrollbar = scrollbar
+        self.consultar = consultar
+        self.tamanho_pagina = tamanho_pagina
+        self.max_linhas = tamanho_pagina * max_paginas
+        self.where = ""
+        self.parametros = []
+        self.ordenacao = None
+        self.decrescente = False
+        # (chave, id) das linhas exibidas, na ordem da tabela: âncoras das páginas e
+        # busca binária da posição de uma despesa nova
+        self.chaves = []
+        self.inicio_alcancado = True
+        self.fim_alcancado = False
+        self._carregando = False
+        # Respostas de consultas feitas antes do último recarregar() são descartadas
+        self._geracao = 0
+        self._futuro = None
+        # Menor id incluído enquanto uma página estava a caminho: buscar de novo ao recebê-la
+        self._novas_pendentes = None
+        self.tabela.configure(yscrollcommand=self._ao_rolar)
+        self.scrollbar.configure(command=self.tabela.yview)
+
+    def definir_consulta(self, where="", parametros=()):
+        # where no formato devolvido por montar_filtro_despesas (" WHERE ..." ou "")
+        self.where = where
+        self.parametros = list(parametros)
+        self.recarregar()
+
+    def definir_ordem(self, ordenacao=None, decrescente=False):
+        # ordenacao: chave de ORDENACOES_DESPESAS ou None (ordem de inclusão); mantém o filtro
+        self.ordenacao = ordenacao
+        self.decrescente = decrescente
+        self.recarregar()
+
+    def recarregar(self):
+        self._geracao += 1
+        self._novas_pendentes = None
+        if self._futuro is not None:
+            self._futuro.cancel()
+        self.tabela.delete(*self.tabela.get_children())
+        self.chaves = []
+        self.inicio_alcancado = True
+        self.fim_alcancado = False
+        self._carregar_proxima()
+
+    def _buscar(self, adiante, ancora, ao_concluir, condicao=None, parametros=(), por_id=False):
+        # Página seguinte (adiante=True) ou anterior na ordem exibida, a partir da âncora
+        self._carregando = True
+        geracao = self._geracao
+        crescente = adiante != self.decrescente
+        where = self.where
+        parametros = self.parametros + list(parametros)
+        if ancora is not None:
+            condicao_ancora, valores = condicao_pagina(self.ordenacao, crescente, *ancora)
+            condicao = condicao_ancora if condicao is None else f"{condicao} AND {condicao_ancora}"
+            parametros += valores
+        if condicao is not None:
+            where += (" AND " if where else " WHERE ") + condicao
+
+        def receber(linhas):
+            if geracao != self._geracao:
+                return
+            self._carregando = False
+            ao_concluir(linhas)
+            if self._novas_pendentes is not None:
+                self.incluir_novas(self._novas_pendentes)
+
+        self._futuro = self.consultar(
+            sql_pagina_despesas(where, "ASC" if crescente else "DESC", self.ordenacao, por_id),
+            parametros + [self.tamanho_pagina],
+            receber
+        )
+
+    def incluir_novas(self, primeiro_id):
+        # Despesas recém-gravadas (ids a partir de primeiro_id, pelo AUTOINCREMENT) que
+        # passam no filtro entram direto na posição da ordenação, se ela cair na janela
+        # carregada; as de fora aparecem quando a rolagem chegar nelas
+        if self._carregando:
+            pendente = self._novas_pendentes
+            self._novas_pendentes = primeiro_id if pendente is None else min(pendente, primeiro_id)
+            return
+        self._novas_pendentes = None
+        self._buscar(True, None, self._posicionar, "id >= ?", [primeiro_id], por_id=True)
+
+    def _posicionar(self, linhas):
+        dentro = False
+        for linha in linhas:
+            iid = str(linha[0])
+            if self.tabela.exists(iid):
+                continue
+            chave = (linha[-1], linha[0])
+            posicao = self._posicao(chave)
+            if (posicao == 0 and not self.inicio_alcancado) or (posicao == len(self.chaves) and not self.fim_alcancado):
+                continue
+            self.tabela.insert("", posicao, iid=iid, values=self._valores(linha))
+            self.chaves.insert(posicao, chave)
+            dentro = True
+        if len(linhas) == self.tamanho_pagina and dentro:
+            # Inclusão em massa (ex.: importação) com linhas na janela: pode haver mais
+            # além desta página, então recarrega
+            self.recarregar()
+            return
+        excesso = len(self.chaves) - self.max_linhas
+        if excesso > 0:
+            self.tabela.delete(*[str(despesa_id) for _, despesa_id in self.chaves[-excesso:]])
+            del self.chaves[-excesso:]
+            self.fim_alcancado = False
+
+    def _posicao(self, chave):
+        # Busca binária de (chave, id) na ordem exibida, crescente ou decrescente
+        inicio, fim = 0, len(self.chaves)
+        while inicio < fim:
+            meio = (inicio + fim) // 2
+            if (self.chaves[meio] < chave) != self.decrescente:
+                inicio = meio + 1
+            else:
+                fim = meio
+        return inicio
+
+    def remover(self, ids):
+        ids = set(ids)
+        self.tabela.delete(*[str(i) for i in ids if self.tabela.exists(str(i))])
+        self.chaves = [chave for chave in self.chaves if chave[1] not in ids]
+
+    def _carregar_proxima(self):
+        self._buscar(True, self.chaves[-1] if self.chaves else None, self._inserir_no_fim)
+
+    def _inserir_no_fim(self, linhas):
+        if len(linhas) < self.tamanho_pagina:
+            self.fim_alcancado = True
+        for linha in linhas:
+            self.tabela.insert("", "end", iid=str(linha[0]), values=self._valores(linha))
+        self.chaves += [(linha[-1], linha[0]) for linha in linhas]
+        # Descarta as linhas mais antigas do topo para manter a janela limitada
+        excesso = len(self.chaves) - self.max_linhas
+        if excesso > 0:
+            self.tabela.delete(*[str(despesa_id) for _, despesa_id in self.chaves[:excesso]])
+            del self.chaves[:excesso]
+            self.tabela.yview_scroll(-excesso, "units")
+            self.inicio_alcancado = False
+
+    def _carregar_anterior(self):
+        if not self.chaves:
+            return
+        self._buscar(False, self.chaves[0], self._inserir_no_inicio)
+
+    def _inserir_no_inicio(self, linhas):
+        if len(linhas) < self.tamanho_pagina:
+            self.inicio_alcancado = True
+        for linha in linhas:
+            self.tabela.insert("", 0, iid=str(linha[0]), values=self._valores(linha))
+        self.chaves[:0] = [(linha[-1], linha[0]) for linha in reversed(linhas)]
+        self.tabela.yview_scroll(len(linhas), "units")
+        excesso = len(self.chaves) - self.max_linhas
+        if excesso > 0:
+            self.tabela.delete(*[str(despesa_id) for _, despesa_id in self.chaves[-excesso:]])
+            del self.chaves[-excesso:]
+            self.fim_alcancado = False
+
+    @staticmethod
+    def _valores(linha):
+        # Colunas exibidas (sem o id e sem a chave de ordenação), com o valor em centavos
+        # formatado como dinheiro
+        return linha[1:4] + (formatar_moeda(linha[4] or 0),) + linha[5:10]
+
+    def _ao_rolar(self, primeiro, ultimo):
+        self.scrollbar.set(primeiro, ultimo)
+        if self._carregando:
+            return
+        if float(ultimo) > 0.9 and not self.fim_alcancado:
+            self._carregar_proxima()
+        elif float(primeiro) < 0.1 and not self.inicio_alcancado:
+            self._carregar_anterior()
+
+
+class ModeloTabela:
+    # View-model de um Treeview com todas as linhas (cartões, metas): guarda por iid os
+    # valores e tags exibidos e, a cada definir() ou ordenar(), aplica ao widget só as
+    # diferenças (inclusões, alterações, exclusões e mudanças de posição) num único
+    # after_idle. A ordenação usa os valores brutos de cada coluna, não o texto formatado.
+    def __init__(self, tabela):
+        self.tabela = tabela
+        self.linhas = {}
+        self.ordem = []
+        self.coluna = None
+        self.decrescente = False
+        self._base = []
+        self._agendado = False
+
+    def definir(self, linhas):
+        # linhas: [(iid, valores, tags, brutos)] na ordem original, brutos alinhados às
+        # colunas; várias chamadas antes da aplicação valem pela última
+        self._base = [(str(iid), tuple(valores), tuple(tags), tuple(brutos)) for iid, valores, tags, brutos in linhas]
+        self._agendar()
+
+    def ordenar(self, coluna=None, decrescente=False):
+        # coluna: índice da coluna ou None (ordem original)
+        self.coluna = coluna
+        self.decrescente = decrescente
+        self._agendar()
+
+    def _agendar(self):
+        if not self._agendado:
+            self._agendado = True
+            self.tabela.after_idle(self._aplicar)
+
+    def _aplicar(self):
+        self._agendado = False
+        if not self.tabela.winfo_exists():
+            return
+        novas = self._base
+        if self.coluna is not None:
+            novas = sorted(novas, key=lambda linha: chave_ordenacao(linha[3][self.coluna]), reverse=self.decrescente)
+        desejadas = {iid: (valores, tags) for iid, valores, tags, _ in novas}
+        removidas = [iid for iid in self.ordem if iid not in desejadas]
+        if removidas:
+            self.tabela.delete(*removidas)
+        ordem = [iid for iid in self.ordem if iid in desejadas]
+        existentes = set(ordem)
+        # Invariante: ordem[:indice] já coincide com as primeiras linhas desejadas
+        for indice, (iid, valores, tags, _) in enumerate(novas):
+            if iid not in existentes:
+                self.tabela.insert("", indice, iid=iid, values=valores, tags=tags)
+                ordem.insert(indice, iid)
+                continue
+            if self.linhas[iid] != (valores, tags):
+                self.tabela.item(iid, values=valores, tags=tags)
+            if ordem[indice] != iid:
+                self.tabela.move(iid, "", indice)
+                ordem.remove(iid)
+                ordem.insert(indice, iid)
+        self.linhas = desejadas
+        self.ordem = ordem
+
+
+class JanelaProgresso(ttk.Toplevel):
+    # Janela modal simples com barra de progresso e botão de cancelar (sem ao_cancelar, a
+    # operação não pode ser interrompida: sem botão, e a janela não fecha pelo X)
+    def __init__(self, master, titulo, ao_cancelar):
+        super().__init__(master)
+        self.title(titulo)
+        self.resizable(False, False)
+        self.transient(master)
+        self.label = ttk.Label(self, text="Preparando...", font=("Helvetica", 10))
+        self.label.pack(padx=15, pady=(15, 5))
+        self.barra = ttk.Progressbar(self, orient="horizontal", length=320, mode="determinate")
+        self.barra.pack(padx=15, pady=5 if ao_cancelar else (5, 15))
+        if ao_cancelar is not None:
+            self.botao_cancelar = ttk.Button(self, text="Cancelar", bootstyle=DANGER, command=ao_cancelar)
+            self.botao_cancelar.pack(pady=(5, 15))
+        self.protocol("WM_DELETE_WINDOW", ao_cancelar or (lambda: None))
+
+    def atualizar(self, feito, total, texto):
+        # total None: tamanho desconhecido, a barra fica em movimento contínuo
+        indeterminada = str(self.barra["mode"]) == "indeterminate"
+        if total is None:
+            if not indeterminada:
+                self.barra.configure(mode="indeterminate")
+                self.barra.start(15)
+        else:
+            if indeterminada:
+                self.barra.stop()
+                self.barra.configure(mode="determinate")
+            self.barra["value"] = (feito / total * 100) if total else 0
+        self.label.config(text=texto)
+
+
+class JanelaDiagnostico(ttk.Toplevel):
+    # Painel oculto com as ações mais lentas recentes e o último perfil capturado
+    COLUNAS = ("Ação", "Quando", "Total (ms)", "Interface (ms)", "Banco (ms)", "Linhas", "Pico do processo (MB)")
+
+    def __init__(self, master, diagnostico):
+        super().__init__(master)
+        self.diagnostico = diagnostico
+        self.title("Diagnóstico")
+        self.geometry("900x600")
+        barra = ttk.Frame(self, padding=10)
+        barra.pack(fill=ttk.X)
+        ttk.Button(barra, text="Atualizar", bootstyle=INFO, command=self.atualizar).pack(side=ttk.LEFT, padx=5)
+        self.botao_perfil = ttk.Button(barra, bootstyle=WARNING, command=self.alternar_perfil)
+        self.botao_perfil.pack(side=ttk.LEFT, padx=5)
+        ToolTip(self.botao_perfil, text="Captura a próxima ação com cProfile (o .prof fica ao lado do log).")
+        ttk.Label(barra, text=f"Log: {os.path.abspath(diagnostico.arquivo)}").pack(side=ttk.LEFT, padx=10)
+        self.tabela = ttk.Treeview(self, columns=self.COLUNAS, show="headings", height=12)
+        self.tabela.pack(fill=ttk.BOTH, expand=True, padx=10)
+        for col in self.COLUNAS:
+            self.tabela.heading(col, text=col)
+            self.tabela.column(col, width=110, anchor="center")
+        self.text_perfil = tk.Text(self, wrap="none", height=14, font=("Courier", 9))
+        self.text_perfil.pack(fill=ttk.BOTH, expand=True, padx=10, pady=10)
+        self.atualizar()
+
+    def alternar_perfil(self):
+        self.diagnostico.perfilar_proxima = not self.diagnostico.perfilar_proxima
+        self.atualizar()
+
+    def atualizar(self):
+        self.tabela.delete(*self.tabela.get_children())
+        for registro in self.diagnostico.mais_lentas():
+            memoria = registro.get("memoria_pico_processo_kb")
+            self.tabela.insert("", "end", values=(
+                registro["acao"], registro["data"][11:], f"{registro['total_ms']:.1f}", f"{registro['interface_ms']:.1f}",
+                f"{registro['banco_ms']:.1f}", registro["linhas"], "" if memoria is None else f"{memoria / 1024:.0f}"
+            ))
+        self.botao_perfil.config(text="Perfil armado (próxima ação)" if self.diagnostico.perfilar_proxima
+                                 else "Perfilar próxima ação")
+        self.text_perfil.delete(1.0, tk.END)
+        self.text_perfil.insert(tk.END, self.diagnostico.ultimo_perfil or "Nenhum perfil capturado ainda.")
+
 
 class SpendingTracker(ttk.Window):
+    # Colunas das tabelas de despesas ordenáveis pelo banco (chaves de ORDENACOES_DESPESAS)
+    ORDENACOES = {"Valor": "valor", "Vencimento": "vencimento", "Categoria": "categoria"}
+    PERIODOS_VENCIMENTO = ["Todos", "Vencidas", "Próximos 15 dias", "Próximos 30 dias",
+                           "1º Trimestre", "2º Trimestre", "3º Trimestre", "4º Trimestre"]
+    # De quanto em quanto tempo conferir se outra ferramenta gravou no banco
+    INTERVALO_RESUMO_MS = 5000
+    # Cada aba só monta seus widgets na primeira vez em que é exibida
+    CONSTRUTORES_ABAS = {
+        "despesas": "configurar_aba_despesas",
+        "cartao": "configurar_aba_cartao",
+        "relatorios": "configurar_aba_relatorios",
+        "metas": "configurar_aba_metas",
+    }
+
     def __init__(self):
         super().__init__(themename="cosmo")
         self.title("Rastreador de Gastos")
         self.geometry("1100x650")
+        self.diagnostico = diagnostico
+        self.bind("<Control-Shift-D>", self.abrir_diagnostico)
+        # Fechar pelo X da janela também passa por destroy() (grava a fila antes de sair)
+        self.protocol("WM_DELETE_WINDOW", self.destroy)
 
-        # Conectar ao banco de dados e carregar os dados
+        # Conectar ao banco de dados (os dados são carregados em segundo plano no fim do __init__)
         self.conectar_banco()
-        self.carregar_dados()
 
         # -------------------------------------------------
         # VARIÁVEIS DE CONTROLE (Despesas)
         # -------------------------------------------------
-        # Cada despesa: (Ano, Mês, Despesa, Valor, Vencimento, Categoria, Observação, Pagamento, Cartão Utilizado)
-        if not hasattr(self, 'despesas'):
-            self.despesas = []
+        # Despesas indexadas pelo id do banco (também usado como iid nas Treeviews), em colunas:
+        # {id: (Ano, Mês, Despesa, Valor, Vencimento, Categoria, Observação, Pagamento, Cartão Utilizado)}
+        self.despesas = DespesasColunares()
+        self.agregados = CacheAgregados()
         self.categorias = ["Alimentação", "Transporte", "Lazer", "Saúde", "Moradia", "Outros"]
-        self.formas_pagamento = ["VR", "Cartão de Crédito", "PIX", "Débito"]
-        self.orcamento_mensal = 0.0  # Apenas despesas via Débito ou PIX diminuem o saldo
+        self.formas_pagamento = list(FORMAS_PAGAMENTO)
+        self.orcamento_mensal = 0  # Em centavos; apenas despesas via Débito ou PIX diminuem o saldo
+        # Compras parceladas com parcelas ainda não lançadas (projeções sob demanda)
+        self.compras = ComprasParceladas()
 
         # -------------------------------------------------
         # VARIÁVEIS DE CONTROLE (Cartão de Crédito)
         # -------------------------------------------------
-        # Cada cartão: (id, nome_cartao, nome_usuario, número (mascarado), validade, bandeira, limite)
-        if not hasattr(self, 'cartoes'):
-            self.cartoes = []
+        # Cada cartão: (id, nome_cartao, nome_usuario, número (mascarado), validade, bandeira, limite,
+        #               dia_fechamento, dia_vencimento)
+        self.cartoes = []
 
         # -------------------------------------------------
         # VARIÁVEIS DE CONTROLE (Metas)
@@ -59,77 +476,110 @@ class SpendingTracker(ttk.Window):
         self.notebook.add(self.tab_cartao, text="Cartão de Crédito")
         self.notebook.add(self.tab_relatorios, text="Relatórios")
         self.notebook.add(self.tab_metas, text="Metas")
+        # Abas cujos dados mudaram por completo (ex.: restauração) e ainda não foram redesenhadas
+        self.abas_pendentes = set()
+        # Abas cujos widgets já foram montados (as demais são montadas ao serem exibidas)
+        self.abas_construidas = set()
+        self.notebook.bind("<<NotebookTabChanged>>", self.ao_trocar_aba)
+
+        # Só a aba visível (Despesas, sempre montada) é criada agora; a primeira página da
+        # tabela entra na fila do banco antes da carga completa dos dados, em segundo plano
+        self.ao_trocar_aba()
+        self.atualizar_tabela()
 
-        # -------------------------------------------------
-        # ABA: DESPESAS
-        # -------------------------------------------------
-        self.configurar_aba_despesas()
-        # -------------------------------------------------
-        # ABA: CARTÃO DE CRÉDITO
-        # -------------------------------------------------
-        self.configurar_aba_cartao()
-        # -------------------------------------------------
-        # ABA: RELATÓRIOS
-        # -------------------------------------------------
-        self.configurar_aba_relatorios()
-        # -------------------------------------------------
-        # ABA: METAS
-        # -------------------------------------------------
-        self.configurar_aba_metas()
+        # Snapshots automáticos do banco em segundo plano
+        self.snapshots = AgendadorSnapshots(ARQUIVO_BANCO)
+        self.snapshots.iniciar()
+
+        self.carregar_dados(ao_concluir=self.dados_iniciais_carregados)
+
+        # Gravações de outras ferramentas no mesmo banco chegam ao indicador de gastos
+        self.versao_banco = None
+        self.verificacao_resumo = None
+        self.after(self.INTERVALO_RESUMO_MS, self.verificar_gravacoes_externas)
+
+    def dados_iniciais_carregados(self):
+        # A tabela de despesas já foi consultada; faltam o indicador e a lista de cartões
+        self.atualizar_indicador_gastos()
+        self.combo_cartao_utilizado["values"] = [c[1] for c in self.cartoes]
+        self.recarregar_abas({"cartao", "relatorios", "metas"})
+
+    def destroy(self):
+        # Cancela exportação, importação e relatório em lote em andamento (cada um apaga seus
+        # arquivos parciais), grava o que ainda estiver na fila e fecha as conexões antes de
+        # fechar a janela
+        for nome in ("exportacao", "importacao", "relatorio_lote"):
+            tarefa = getattr(self, nome, None)
+            if tarefa is not None and tarefa.em_andamento:
+                tarefa.cancelar()
+        relatorio = getattr(self, "relatorio_lote", None)
+        if relatorio is not None and relatorio.em_andamento:
+            relatorio.thread.join(timeout=30)
+        if hasattr(self, "executor"):
+            try:
+                self.executor.encerrar().result(timeout=30)
+            except Exception as e:
+                messagebox.showerror("Erro", f"Erro ao gravar alterações pendentes: {e}")
+        if hasattr(self, "snapshots"):
+            self.snapshots.parar()
+        super().destroy()
+
+    # ----- Acesso ao banco fora da thread da interface -----
+    def no_banco(self, funcao, *args, ao_concluir=None, erro="Erro no banco de dados"):
+        # Executa funcao(banco, *args) na thread de escrita do ExecutorBanco e entrega o
+        # resultado a ao_concluir na thread da interface (via after)
+        futuro = self.executor.submeter(funcao, *args)
+        self.acompanhar_futuro(futuro, ao_concluir, erro)
+        return futuro
+
+    def acompanhar_futuro(self, futuro, ao_concluir=None, erro="Erro no banco de dados"):
+        if not futuro.done():
+            self.apos(10, self.acompanhar_futuro, futuro, ao_concluir, erro)
+            return
+        if futuro.cancelled():
+            return
+        if futuro.exception() is not None:
+            messagebox.showerror("Erro", f"{erro}: {futuro.exception()}")
+        elif ao_concluir is not None:
+            ao_concluir(futuro.result())
+
+    def apos(self, ms, funcao, *args):
+        # after() que mantém o callback atribuído à ação em medição (quando houver uma)
+        acao = self.diagnostico.vincular()
+
+        def executar():
+            try:
+                with self.diagnostico.retomar(acao):
+                    funcao(*args)
+            finally:
+                self.diagnostico.liberar(acao)
+        return self.after(ms, executar)
+
+    def abrir_diagnostico(self, event=None):
+        if getattr(self, "janela_diagnostico", None) is not None and self.janela_diagnostico.winfo_exists():
+            self.janela_diagnostico.atualizar()
+            self.janela_diagnostico.lift()
+            return
+        self.janela_diagnostico = JanelaDiagnostico(self, self.diagnostico)
+
+    def consultar_async(self, sql, parametros, ao_concluir):
+        return self.no_banco(lambda banco: banco.consultar(sql, parametros), ao_concluir=ao_concluir,
+                      erro="Erro ao consultar despesas")
 
     # ----- Conexão com o Banco de Dados (SQLite) -----
     def conectar_banco(self):
-        self.conn = sqlite3.connect("financeiro.db")
-        self.cursor = self.conn.cursor()
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS despesas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ano TEXT,
-                mes TEXT,
-                despesa TEXT,
-                valor REAL,
-                vencimento TEXT,
-                categoria TEXT,
-                observacao TEXT,
-                pagamento TEXT,
-                cartao_utilizado TEXT
-            )
-        """)
-        # Tabela Cartões – removidos os campos de fechamento e vencimento
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS cartoes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome_cartao TEXT,
-                nome_usuario TEXT,
-                numero TEXT,
-                validade TEXT,
-                bandeira TEXT,
-                limite REAL
-            )
-        """)
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS metas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT,
-                valor_meta REAL,
-                valor_atual REAL,
-                data_inicial TEXT,
-                data_final TEXT
-            )
-        """)
-        self.conn.commit()
-
-    def carregar_dados(self):
-        try:
-            self.cursor.execute("SELECT ano, mes, despesa, valor, vencimento, categoria, observacao, pagamento, cartao_utilizado FROM despesas")
-            self.despesas = self.cursor.fetchall()
-            # Incluímos o campo id para os cartões
-            self.cursor.execute("SELECT id, nome_cartao, nome_usuario, numero, validade, bandeira, limite FROM cartoes")
-            self.cartoes = self.cursor.fetchall()
-            self.cursor.execute("SELECT id, nome, valor_meta, valor_atual, data_inicial, data_final FROM metas")
-            self.metas = self.cursor.fetchall()
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao carregar dados do banco: {e}")
+        # Todas as operações passam pelo executor (thread de escrita + pool de leitura);
+        # a criação das tabelas é a primeira tarefa da fila
+        self.executor = ExecutorBanco(ARQUIVO_BANCO, diagnostico=self.diagnostico)
+        self.no_banco(preparar_banco, erro="Erro ao preparar o banco de dados")
+
+    @acao_usuario
+    def carregar_dados(self, ao_concluir=None):
+        def aplicar(resultado):
+            self.despesas, self.agregados, self.cartoes, self.metas, self.compras = resultado
+            if ao_concluir is not None:
+                ao_concluir()
+        self.no_banco(ler_dados, ao_concluir=aplicar, erro="Erro ao carregar dados do banco")
 
     # ------------------------------
     # Aba Despesas
@@ -179,17 +629,14 @@ class SpendingTracker(ttk.Window):
         self.categoria_filtro_var = ttk.StringVar()
         ttk.Label(self.frame_filtros, text="Mês:", font=("Helvetica", 10, "bold")).grid(row=0, column=0, padx=5, pady=5, sticky=ttk.E)
         self.combo_mes = ttk.Combobox(self.frame_filtros, textvariable=self.mes_var, state="readonly", width=15)
-        self.combo_mes["values"] = [
-            "Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho",
-            "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"
-        ]
-        self.combo_mes.current(datetime.now().month - 1)
+        self.combo_mes["values"] = ["Todos"] + MESES
+        self.combo_mes.current(datetime.now().month)
         self.combo_mes.grid(row=0, column=1, padx=5, pady=5, sticky=ttk.W)
         ToolTip(self.combo_mes, text="Selecione o mês para filtrar despesas.")
         ttk.Label(self.frame_filtros, text="Ano:", font=("Helvetica", 10, "bold")).grid(row=0, column=2, padx=5, pady=5, sticky=ttk.E)
         self.combo_ano = ttk.Combobox(self.frame_filtros, textvariable=self.ano_var, state="readonly", width=10)
-        self.combo_ano["values"] = [str(ano) for ano in range(2022, datetime.now().year + 2)]
-        self.combo_ano.current(datetime.now().year - 2022)
+        self.combo_ano["values"] = ["Todos"] + [str(ano) for ano in range(2022, datetime.now().year + 2)]
+        self.combo_ano.current(datetime.now().year - 2022 + 1)
         self.combo_ano.grid(row=0, column=3, padx=5, pady=5, sticky=ttk.W)
         ToolTip(self.combo_ano, text="Selecione o ano para filtrar despesas.")
         ttk.Label(self.frame_filtros, text="Categoria:", font=("Helvetica", 10, "bold")).grid(row=0, column=4, padx=5, pady=5, sticky=ttk.E)
@@ -198,9 +645,26 @@ class SpendingTracker(ttk.Window):
         self.combo_categoria_filtro.current(0)
         self.combo_categoria_filtro.grid(row=0, column=5, padx=5, pady=5, sticky=ttk.W)
         ToolTip(self.combo_categoria_filtro, text="Filtre despesas por categoria.")
+        ttk.Label(self.frame_filtros, text="Vencimento:", font=("Helvetica", 10, "bold")).grid(row=0, column=6, padx=5, pady=5, sticky=ttk.E)
+        self.vencimento_filtro_var = ttk.StringVar()
+        self.combo_vencimento_filtro = ttk.Combobox(self.frame_filtros, textvariable=self.vencimento_filtro_var,
+                                                    values=self.PERIODOS_VENCIMENTO, state="readonly", width=18)
+        self.combo_vencimento_filtro.current(0)
+        self.combo_vencimento_filtro.grid(row=0, column=7, padx=5, pady=5, sticky=ttk.W)
+        ToolTip(self.combo_vencimento_filtro, text="Filtre pela data de vencimento. Os trimestres usam o ano selecionado; "
+                                                   "com um período escolhido, o filtro de mês é ignorado.")
         self.botao_filtrar = ttk.Button(self.frame_filtros, text="Filtrar", bootstyle=INFO, command=self.filtrar_despesas)
-        self.botao_filtrar.grid(row=0, column=6, padx=5, pady=5, sticky=ttk.W)
-        ToolTip(self.botao_filtrar, text="Filtre as despesas pelo mês, ano e categoria selecionados.")
+        self.botao_filtrar.grid(row=0, column=8, padx=5, pady=5, sticky=ttk.W)
+        ToolTip(self.botao_filtrar, text="Filtre as despesas pelo mês, ano, categoria e vencimento selecionados.")
+        ttk.Label(self.frame_filtros, text="Buscar:", font=("Helvetica", 10, "bold")).grid(row=1, column=0, padx=5, pady=5, sticky=ttk.E)
+        self.busca_var = ttk.StringVar()
+        self.busca_agendada = None
+        self.entry_busca = ttk.Entry(self.frame_filtros, textvariable=self.busca_var, width=40)
+        self.entry_busca.grid(row=1, column=1, columnspan=4, padx=5, pady=5, sticky=ttk.EW)
+        self.entry_busca.bind("<Return>", lambda event: self.buscar_agora())
+        self.busca_var.trace_add("write", lambda *args: self.agendar_busca())
+        ToolTip(self.entry_busca, text="Busque pelo nome ou pela observação da despesa (ex.: Uber, Natal), "
+                                       "junto com os filtros acima. Use 'Todos' no mês e no ano para buscar em todo o período.")
 
     def configurar_frame_entrada(self):
         self.frame_entrada = ttk.Frame(self.tab_despesas, padding=10)
@@ -268,19 +732,30 @@ class SpendingTracker(ttk.Window):
         self.combo_cartao_utilizado.grid(row=6, column=1, padx=5, pady=5, sticky=ttk.W)
         ToolTip(self.combo_cartao_utilizado, text="Selecione o cartão utilizado (se for Cartão de Crédito).")
 
+        ttk.Label(self.frame_entrada, text="Parcelas:", font=("Helvetica", 10, "bold")).grid(row=7, column=0, padx=5, pady=5, sticky=ttk.E)
+        self.parcelas_var = ttk.IntVar(value=1)
+        self.spin_parcelas = ttk.Spinbox(self.frame_entrada, from_=1, to=48, textvariable=self.parcelas_var, width=5)
+        self.spin_parcelas.grid(row=7, column=1, padx=5, pady=5, sticky=ttk.W)
+        ToolTip(self.spin_parcelas, text="Número de parcelas. Acima de 1, o Valor é o total da compra e o Vencimento é o da 1ª parcela.")
+
         self.botao_adicionar = ttk.Button(self.frame_entrada, text="Adicionar Despesa", bootstyle=SUCCESS, command=self.adicionar_despesa)
-        self.botao_adicionar.grid(row=7, column=0, columnspan=2, pady=10)
+        self.botao_adicionar.grid(row=8, column=0, columnspan=2, pady=10)
         ToolTip(self.botao_adicionar, text="Adicione uma nova despesa à lista.")
 
     def configurar_tabela(self):
         self.frame_tabela = ttk.Frame(self.tab_despesas)
         self.frame_tabela.pack(fill=ttk.BOTH, expand=True, pady=10)
         colunas = ("Ano", "Mês", "Despesa", "Valor", "Vencimento", "Categoria", "Observação", "Pagamento", "Cartão Utilizado")
+        self.scroll_tabela = ttk.Scrollbar(self.frame_tabela, orient="vertical")
+        self.scroll_tabela.pack(side=ttk.RIGHT, fill=ttk.Y)
         self.tabela = ttk.Treeview(self.frame_tabela, columns=colunas, show="headings")
         self.tabela.pack(fill=ttk.BOTH, expand=True)
         for col in colunas:
             self.tabela.heading(col, text=col)
             self.tabela.column(col, width=120, anchor="center")
+        self.pagina_despesas = TabelaPaginada(self.tabela, self.scroll_tabela, self.consultar_async)
+        CabecalhosOrdenaveis(self.tabela, list(self.ORDENACOES),
+                             lambda coluna, decrescente: self.ordenar_despesas(self.pagina_despesas, coluna, decrescente))
 
     def configurar_frame_botoes(self):
         self.frame_botoes = ttk.Frame(self.tab_despesas, padding=10)
@@ -307,6 +782,7 @@ class SpendingTracker(ttk.Window):
     # -------------------------
     # Lógica de Despesas
     # -------------------------
+    @acao_usuario
     def mudar_tema(self, event=None):
         if self.tema_var.get() == "Modo Claro":
             novo_tema = "cosmo"
@@ -314,23 +790,44 @@ class SpendingTracker(ttk.Window):
             novo_tema = "darkly"
         self.style.theme_use(novo_tema)
 
+    @acao_usuario
     def definir_orcamento(self):
         try:
-            valor_texto = self.orcamento_var.get().replace(',', '.')
-            self.orcamento_mensal = float(valor_texto)
-            messagebox.showinfo("Sucesso", f"Orçamento mensal definido como R$ {self.orcamento_var.get()}")
+            self.orcamento_mensal = para_centavos(self.orcamento_var.get())
+            messagebox.showinfo("Sucesso", f"Orçamento mensal definido como R$ {formatar_moeda(self.orcamento_mensal)}")
             self.atualizar_indicador_gastos()
         except ValueError:
             messagebox.showerror("Erro", "Insira um valor numérico válido para o orçamento.")
 
+    def verificar_gravacoes_externas(self):
+        # Se outra conexão gravou no banco (PRAGMA data_version), relê os agregados de
+        # resumo_mensal, que os triggers mantêm em dia: poucas linhas, sem varrer as despesas.
+        # O resultado é descartado se houve inclusão/exclusão aqui enquanto a leitura corria.
+        self.after(self.INTERVALO_RESUMO_MS, self.verificar_gravacoes_externas)
+        # Banco fechado para a restauração, ou leitura anterior ainda na fila
+        if self.executor.encerrado or (self.verificacao_resumo is not None and not self.verificacao_resumo.done()):
+            return
+        agregados, alteracoes = self.agregados, self.agregados.alteracoes
+
+        def aplicar(resultado):
+            versao, novos = resultado
+            if novos is None:
+                self.versao_banco = versao
+            elif self.agregados is agregados and agregados.alteracoes == alteracoes:
+                self.versao_banco = versao
+                self.agregados = novos
+                self.atualizar_indicador_gastos()
+        self.verificacao_resumo = self.no_banco(ler_agregados, self.versao_banco, ao_concluir=aplicar,
+                                                erro="Erro ao ler o resumo mensal")
+
     def atualizar_indicador_gastos(self):
-        total_gastos = sum(float(d[3]) for d in self.despesas if d[7] in ["Débito", "PIX"])
+        total_gastos = self.agregados.total_pagamento("Débito", "PIX")
         restante = self.orcamento_mensal - total_gastos
         if restante < 0:
             restante = 0
-        txt_gastos = f"{total_gastos:.2f}".replace('.', ',')
-        txt_orc = self.orcamento_var.get()
-        txt_rest = f"{restante:.2f}".replace('.', ',')
+        txt_gastos = formatar_moeda(total_gastos)
+        txt_orc = formatar_moeda(self.orcamento_mensal)
+        txt_rest = formatar_moeda(restante)
         if self.orcamento_mensal > 0:
             percentual_gasto = (total_gastos / self.orcamento_mensal) * 100
             self.progress_bar["value"] = percentual_gasto
@@ -343,6 +840,7 @@ class SpendingTracker(ttk.Window):
                 text=f"Gastos: R$ {txt_gastos} / Orçamento: R$ 0,00 / Restante: R$ 0,00"
             )
 
+    @acao_usuario
     def adicionar_despesa(self):
         valores = [campo.get() for campo in self.campos.values()]
         categoria = self.categoria_var.get()
@@ -352,18 +850,37 @@ class SpendingTracker(ttk.Window):
             messagebox.showerror("Erro", "Preencha os campos obrigatórios (Despesa, Valor, Vencimento).")
             return
         try:
-            valor = float(valores[1].replace(",", "."))
+            valor = para_centavos(valores[1])
         except ValueError:
             messagebox.showerror("Erro", "O campo Valor deve ser numérico.")
             return
         try:
-            datetime.strptime(valores[2], "%d/%m/%Y")
+            vencimento = datetime.strptime(valores[2], "%d/%m/%Y")
         except ValueError:
             messagebox.showerror("Erro", "Data de vencimento inválida. Use o formato dd/mm/yyyy.")
             return
+        try:
+            parcelas = int(self.spin_parcelas.get())
+        except ValueError:
+            parcelas = 0
+        if not 1 <= parcelas <= 48:
+            messagebox.showerror("Erro", "O número de parcelas deve estar entre 1 e 48.")
+            return
+        if parcelas > 1:
+            # Grava só a compra; as parcelas já abertas voltam como despesas novas
+            compra = (valores[0], valor, parcelas, valores[2], categoria, valores[3], forma_pagamento, cartao_utilizado)
+            self.no_banco(
+                ComprasParceladas.registrar, compra,
+                ao_concluir=lambda resultado: self.despesas_adicionadas(*resultado),
+                erro="Erro ao registrar compra parcelada no banco"
+            )
+            return
+        # Com "Todos" no filtro, o ano/mês da despesa vem do vencimento
+        ano = self.combo_ano.get()
+        mes = self.combo_mes.get()
         nova_despesa = (
-            self.combo_ano.get(),
-            self.combo_mes.get(),
+            str(vencimento.year) if ano == "Todos" else ano,
+            MESES[vencimento.month - 1] if mes == "Todos" else mes,
             valores[0],
             valor,
             valores[2],
@@ -372,159 +889,136 @@ class SpendingTracker(ttk.Window):
             forma_pagamento,
             cartao_utilizado
         )
-        self.despesas.append(nova_despesa)
-        try:
-            self.cursor.execute(
-                "INSERT INTO despesas (ano, mes, despesa, valor, vencimento, categoria, observacao, pagamento, cartao_utilizado) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                nova_despesa
-            )
-            self.conn.commit()
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao inserir despesa no banco: {e}")
-        self.atualizar_tabela()
+        self.no_banco(
+            inserir_despesa, nova_despesa,
+            ao_concluir=lambda despesa_id: self.despesas_adicionadas({despesa_id: nova_despesa}),
+            erro="Erro ao inserir despesa no banco"
+        )
+
+    def despesas_adicionadas(self, novas, compras=None):
+        for despesa_id, nova_despesa in novas.items():
+            self.despesas[despesa_id] = nova_despesa
+            self.agregados.adicionar(nova_despesa)
+        if compras is not None:
+            self.compras = compras
+        self.incluir_novas_nas_tabelas(novas)
         self.atualizar_indicador_gastos()
-        self.atualizar_tabela_despesas_cartao()
+        self.abas_pendentes.add("cartao")
         for campo in self.campos.values():
             campo.delete(0, "end")
         self.categoria_var.set("")
         self.forma_pagamento_var.set(self.formas_pagamento[0])
+        self.parcelas_var.set(1)
         self.combo_cartao_utilizado["values"] = [c[1] for c in self.cartoes]
 
+    @acao_usuario
     def excluir_despesa(self):
         selecionado = self.tabela.selection()
         if not selecionado:
             messagebox.showwarning("Aviso", "Selecione uma despesa para excluir.")
             return
-        for item in selecionado:
-            valores = self.tabela.item(item, "values")
-            self.despesas = [d for d in self.despesas if d != valores]
-            self.tabela.delete(item)
-            try:
-                self.cursor.execute("""
-                    DELETE FROM despesas 
-                    WHERE ano=? AND mes=? AND despesa=? AND valor=? AND vencimento=? AND categoria=? AND observacao=? AND pagamento=? AND cartao_utilizado=?
-                """, valores)
-                self.conn.commit()
-            except Exception as e:
-                messagebox.showerror("Erro", f"Erro ao excluir despesa do banco: {e}")
-        self.atualizar_indicador_gastos()
-        self.atualizar_tabela_despesas_cartao()
+        # O iid de cada linha é o id da despesa: um único executemany para toda a seleção
+        ids = [int(item) for item in selecionado]
+        self.no_banco(
+            lambda banco: banco.executar_varios("DELETE FROM despesas WHERE id = ?", [(despesa_id,) for despesa_id in ids]),
+            ao_concluir=lambda _: self.despesas_excluidas(ids),
+            erro="Erro ao excluir despesa do banco"
+        )
 
+    def despesas_excluidas(self, ids):
+        for despesa_id in ids:
+            despesa = self.despesas.pop(despesa_id, None)
+            if despesa is not None:
+                self.agregados.remover(despesa)
+        self.pagina_despesas.remover(ids)
+        if "cartao" in self.abas_construidas:
+            self.pagina_despesas_cartao.remover(ids)
+        self.atualizar_indicador_gastos()
+        self.abas_pendentes.add("cartao")
+
+    def agendar_busca(self):
+        # Busca enquanto se digita: só consulta 300 ms depois da última tecla; uma página
+        # ainda na fila é cancelada pela TabelaPaginada quando a nova consulta chega
+        if self.busca_agendada is not None:
+            self.after_cancel(self.busca_agendada)
+        self.busca_agendada = self.after(300, self.buscar_agora)
+
+    def buscar_agora(self):
+        if self.busca_agendada is not None:
+            self.after_cancel(self.busca_agendada)
+            self.busca_agendada = None
+        self.filtrar_despesas()
+
+    @acao_usuario
     def filtrar_despesas(self):
-        mes_filtro = self.mes_var.get()
-        ano_filtro = self.ano_var.get()
+        mes_filtro = self.mes_var.get().replace("Todos", "")
+        ano_filtro = self.ano_var.get().replace("Todos", "")
         categoria_filtro = self.categoria_filtro_var.get()
-        self.tabela.delete(*self.tabela.get_children())
-        for despesa in self.despesas:
-            if (despesa[0] == ano_filtro or ano_filtro == "") and \
-               (despesa[1] == mes_filtro or mes_filtro == "") and \
-               (despesa[5] == categoria_filtro or categoria_filtro == "Todas"):
-                self.tabela.insert("", "end", values=despesa)
+        busca = self.busca_var.get()
+        periodo = periodo_vencimento(self.vencimento_filtro_var.get(), ano_filtro)
+        if periodo is None:
+            where, parametros = montar_filtro_despesas(ano_filtro, mes_filtro, categoria_filtro, busca=busca)
+        else:
+            where, parametros = montar_filtro_despesas(categoria=categoria_filtro, vencimento_de=periodo[0],
+                                                       vencimento_ate=periodo[1], busca=busca)
+        self.pagina_despesas.definir_consulta(where, parametros)
 
+    @acao_usuario
     def salvar_no_excel(self):
+        if getattr(self, "exportacao", None) and self.exportacao.em_andamento:
+            messagebox.showwarning("Aviso", "Já existe uma exportação em andamento.")
+            return
         filepath = filedialog.asksaveasfilename(defaultextension=".xlsx",
                                                 filetypes=[("Excel Files", "*.xlsx")])
         if not filepath:
             return
-        workbook = openpyxl.Workbook()
-        # Aba Despesas
-        despesas_sheet = workbook.active
-        despesas_sheet.title = "Despesas"
-        cabecalho = ["Ano", "Mês", "Despesa", "Valor", "Vencimento", "Categoria", "Observação", "Pagamento", "Cartão Utilizado"]
-        despesas_sheet.append(cabecalho)
-        for row in self.despesas:
-            despesas_sheet.append(row)
-        bold_font = Font(bold=True)
-        center_alignment = Alignment(horizontal="center")
-        header_fill = PatternFill(start_color="BDD7EE", end_color="BDD7EE", fill_type="solid")
-        thin_border = Border(left=Side(style="thin"), right=Side(style="thin"),
-                             top=Side(style="thin"), bottom=Side(style="thin"))
-        for col in range(1, despesas_sheet.max_column + 1):
-            cell = despesas_sheet.cell(row=1, column=col)
-            cell.font = bold_font
-            cell.alignment = center_alignment
-            cell.fill = header_fill
-            cell.border = thin_border
-        despesas_sheet.auto_filter.ref = f"A1:I1"
-        for row in despesas_sheet.iter_rows(min_row=2, max_row=despesas_sheet.max_row, min_col=1, max_col=despesas_sheet.max_column):
-            for cell in row:
-                cell.border = thin_border
-        total_gastos = sum(float(d[3]) for d in self.despesas if d[7] in ["Débito", "PIX"])
+        total_gastos = self.agregados.total_pagamento("Débito", "PIX")
         saldo_restante = self.orcamento_mensal - total_gastos
         if saldo_restante < 0:
             saldo_restante = 0
-        despesas_sheet.append([])
-        despesas_sheet.append(["Orçamento", f"R$ {self.orcamento_var.get()}"])
-        despesas_sheet.append(["Saldo Restante", f"R$ {saldo_restante:.2f}".replace('.', ',')])
-        for col in despesas_sheet.columns:
-            max_length = 0
-            col_letter = openpyxl.utils.get_column_letter(col[0].column)
-            for cell in col:
-                try:
-                    if cell.value:
-                        max_length = max(max_length, len(str(cell.value)))
-                except:
-                    pass
-            despesas_sheet.column_dimensions[col_letter].width = max_length + 2
-
-        # Aba Cartões
-        cartoes_sheet = workbook.create_sheet(title="Cartões")
-        cabecalho_cartoes = ["Nome do Cartão", "Nome do Usuário", "Número", "Validade", "Bandeira", "Limite"]
-        cartoes_sheet.append(cabecalho_cartoes)
-        for cartao in self.cartoes:
-            # Exibe os dados sem o id
-            cartao_exibicao = (cartao[1], cartao[2], cartao[3], cartao[4], cartao[5], cartao[6])
-            cartoes_sheet.append(cartao_exibicao)
-        for col in range(1, cartoes_sheet.max_column + 1):
-            cell = cartoes_sheet.cell(row=1, column=col)
-            cell.font = bold_font
-            cell.alignment = center_alignment
-            cell.fill = header_fill
-            cell.border = thin_border
-        cartoes_sheet.auto_filter.ref = f"A1:F1"
-        for row in cartoes_sheet.iter_rows(min_row=2, max_row=cartoes_sheet.max_row, min_col=1, max_col=cartoes_sheet.max_column):
-            for cell in row:
-                cell.border = thin_border
-
-        # Bloco: Despesas no Cartão de Crédito
-        cartoes_sheet.append([])
-        cartoes_sheet.append(["Despesas no Cartão de Crédito"])
-        cabecalho_desp_cartao = ["Ano", "Mês", "Despesa", "Valor", "Vencimento", "Categoria", "Observação", "Pagamento", "Cartão Utilizado"]
-        cartoes_sheet.append(cabecalho_desp_cartao)
-        for despesa in self.despesas:
-            if despesa[7] == "Cartão de Crédito":
-                cartoes_sheet.append(despesa)
-        for col in range(1, len(cabecalho_desp_cartao) + 1):
-            linha_cab = cartoes_sheet.max_row - sum(1 for d in self.despesas if d[7]=="Cartão de Crédito") - 1
-            cell = cartoes_sheet.cell(row=linha_cab, column=col)
-            cell.font = bold_font
-            cell.alignment = center_alignment
-            cell.fill = header_fill
-            cell.border = thin_border
-        for col in cartoes_sheet.columns:
-            max_length = 0
-            col_letter = openpyxl.utils.get_column_letter(col[0].column)
-            for cell in col:
-                try:
-                    if cell.value:
-                        max_length = max(max_length, len(str(cell.value)))
-                except:
-                    pass
-            cartoes_sheet.column_dimensions[col_letter].width = max_length + 2
-
-        workbook.save(filepath)
-        messagebox.showinfo("Sucesso", f"Dados salvos com sucesso em {filepath}!")
+        self.exportacao = ExportacaoExcel(filepath, formatar_moeda(self.orcamento_mensal), saldo_restante)
+        self.janela_exportacao = JanelaProgresso(self, "Exportando para o Excel", self.exportacao.cancelar)
+        self.exportacao.iniciar(self.executor)
+        self.apos(100, self.acompanhar_exportacao)
+
+    def acompanhar_exportacao(self):
+        exportacao = self.exportacao
+        self.janela_exportacao.atualizar(exportacao.progresso, exportacao.total,
+                                         f"Exportando {exportacao.progresso} de {exportacao.total} linhas...")
+        if exportacao.em_andamento:
+            self.apos(100, self.acompanhar_exportacao)
+            return
+        self.janela_exportacao.destroy()
+        if exportacao.erro:
+            messagebox.showerror("Erro", f"Erro ao salvar no Excel: {exportacao.erro}")
+        elif exportacao.cancelada:
+            messagebox.showinfo("Aviso", "Exportação cancelada.")
+        else:
+            messagebox.showinfo("Sucesso", f"Dados salvos com sucesso em {exportacao.filepath}!")
 
+    @acao_usuario
     def atualizar_tabela(self):
-        self.tabela.delete(*self.tabela.get_children())
-        for despesa in self.despesas:
-            self.tabela.insert("", "end", values=despesa)
+        self.pagina_despesas.definir_consulta()
+
+    @acao_usuario
+    def ordenar_despesas(self, pagina, coluna, decrescente):
+        # Nova ordem com o mesmo filtro: a primeira página vem do índice da coluna
+        pagina.definir_ordem(self.ORDENACOES.get(coluna), decrescente)
+
+    def ordenar_modelo(self, modelo, colunas, coluna, decrescente):
+        modelo.ordenar(colunas.index(coluna) if coluna else None, decrescente)
+
+    def incluir_novas_nas_tabelas(self, ids):
+        # Despesas recém-gravadas entram nas tabelas paginadas sem recarregá-las (e sem
+        # perder o filtro e a ordem escolhidos); a de cartão só existe depois de a aba ser montada
+        if not ids:
+            return
+        self.pagina_despesas.incluir_novas(min(ids))
+        if "cartao" in self.abas_construidas:
+            self.pagina_despesas_cartao.incluir_novas(min(ids))
 
     def atualizar_tabela_despesas_cartao(self):
-        self.tabela_despesas_cartao.delete(*self.tabela_despesas_cartao.get_children())
-        for despesa in self.despesas:
-            if despesa[7] == "Cartão de Crédito":
-                self.tabela_despesas_cartao.insert("", "end", values=despesa)
+        self.pagina_despesas_cartao.definir_consulta(" WHERE pagamento = ?", ["Cartão de Crédito"])
 
     # -------------------------
     # Aba Cartão de Crédito
@@ -558,6 +1052,14 @@ class SpendingTracker(ttk.Window):
         self.entry_limite = ttk.Entry(self.frame_cartao_form, width=15)
         self.entry_limite.grid(row=5, column=1, padx=5, pady=5, sticky=tk.W)
         ToolTip(self.entry_limite, text="Digite o limite de crédito do cartão (ex: 1000,00).")
+        ttk.Label(self.frame_cartao_form, text="Dia de Fechamento:", font=("Helvetica", 10, "bold")).grid(row=6, column=0, padx=5, pady=5, sticky=tk.E)
+        self.entry_dia_fechamento = ttk.Spinbox(self.frame_cartao_form, from_=1, to=31, width=5)
+        self.entry_dia_fechamento.grid(row=6, column=1, padx=5, pady=5, sticky=tk.W)
+        ToolTip(self.entry_dia_fechamento, text="Dia do mês em que a fatura fecha; compras após esse dia entram na fatura seguinte.")
+        ttk.Label(self.frame_cartao_form, text="Dia de Vencimento:", font=("Helvetica", 10, "bold")).grid(row=7, column=0, padx=5, pady=5, sticky=tk.E)
+        self.entry_dia_vencimento = ttk.Spinbox(self.frame_cartao_form, from_=1, to=31, width=5)
+        self.entry_dia_vencimento.grid(row=7, column=1, padx=5, pady=5, sticky=tk.W)
+        ToolTip(self.entry_dia_vencimento, text="Dia do mês em que a fatura vence.")
         
         # Botões de ação para Cartão
         self.frame_cartao_botoes = ttk.Frame(self.tab_cartao, padding=10)
@@ -571,7 +1073,7 @@ class SpendingTracker(ttk.Window):
 
         self.frame_cartao_tabela = ttk.Frame(self.tab_cartao, padding=10)
         self.frame_cartao_tabela.pack(fill=ttk.BOTH, expand=True, pady=5)
-        colunas = ("Nome do Cartão", "Nome do Usuário", "Número", "Validade", "Bandeira", "Limite")
+        colunas = ("Nome do Cartão", "Nome do Usuário", "Número", "Validade", "Bandeira", "Limite", "Fechamento", "Vencimento")
         self.tabela_cartao = ttk.Treeview(self.frame_cartao_tabela, columns=colunas, show="headings")
         self.tabela_cartao.pack(fill=ttk.BOTH, expand=True)
         for col in colunas:
@@ -579,6 +1081,9 @@ class SpendingTracker(ttk.Window):
             self.tabela_cartao.column(col, width=120, anchor="center")
         # Vincula seleção para carregar dados no formulário
         self.tabela_cartao.bind("<<TreeviewSelect>>", self.carregar_cartao_selecionado)
+        self.modelo_cartoes = ModeloTabela(self.tabela_cartao)
+        CabecalhosOrdenaveis(self.tabela_cartao, colunas,
+                             lambda coluna, decrescente: self.ordenar_modelo(self.modelo_cartoes, colunas, coluna, decrescente))
 
         self.frame_dashboard = ttk.Frame(self.tab_cartao, padding=10)
         self.frame_dashboard.pack(fill=ttk.X, pady=5)
@@ -592,24 +1097,34 @@ class SpendingTracker(ttk.Window):
         self.combo_dashboard.bind("<<ComboboxSelected>>", self.atualizar_dashboard_cartao)
         self.progress_cartao = ttk.Progressbar(self.frame_dashboard, orient="horizontal", length=200, mode="determinate")
         self.progress_cartao.pack(side=ttk.LEFT, padx=5)
-        self.label_dashboard = ttk.Label(self.frame_dashboard, text="Gastos: R$ 0,00 / Limite: R$ 0,00 / Disponível: R$ 0,00", font=("Helvetica", 10))
+        self.label_dashboard = ttk.Label(self.frame_dashboard, text="Fatura atual: R$ 0,00 / Próxima fatura: R$ 0,00 / Limite: R$ 0,00 / Disponível: R$ 0,00", font=("Helvetica", 10))
         self.label_dashboard.pack(side=ttk.LEFT, padx=5)
 
         ttk.Label(self.tab_cartao, text="Despesas no Cartão de Crédito", font=("Helvetica", 12, "bold")).pack(pady=10)
         colunas = ("Ano", "Mês", "Despesa", "Valor", "Vencimento", "Categoria", "Observação", "Pagamento", "Cartão Utilizado")
-        self.tabela_despesas_cartao = ttk.Treeview(self.tab_cartao, columns=colunas, show="headings")
-        self.tabela_despesas_cartao.pack(fill=ttk.BOTH, expand=True, pady=5)
+        self.frame_despesas_cartao = ttk.Frame(self.tab_cartao)
+        self.frame_despesas_cartao.pack(fill=ttk.BOTH, expand=True, pady=5)
+        self.scroll_despesas_cartao = ttk.Scrollbar(self.frame_despesas_cartao, orient="vertical")
+        self.scroll_despesas_cartao.pack(side=ttk.RIGHT, fill=ttk.Y)
+        self.tabela_despesas_cartao = ttk.Treeview(self.frame_despesas_cartao, columns=colunas, show="headings")
+        self.tabela_despesas_cartao.pack(fill=ttk.BOTH, expand=True)
         for col in colunas:
             self.tabela_despesas_cartao.heading(col, text=col)
             self.tabela_despesas_cartao.column(col, width=120, anchor="center")
+        self.pagina_despesas_cartao = TabelaPaginada(self.tabela_despesas_cartao, self.scroll_despesas_cartao,
+                                                     self.consultar_async)
+        CabecalhosOrdenaveis(self.tabela_despesas_cartao, list(self.ORDENACOES),
+                             lambda coluna, decrescente: self.ordenar_despesas(self.pagina_despesas_cartao, coluna, decrescente))
+        self.atualizar_tabela_despesas_cartao()
 
+    @acao_usuario
     def cadastrar_cartao(self):
         nome_cartao = self.entry_nome_cartao.get().strip()
         nome_usuario = self.entry_nome_usuario.get().strip()
         numero = self.entry_numero_cartao.get().strip()
         validade = self.entry_validade.get().strip()
         bandeira = self.combo_bandeira.get().strip()
-        limite_texto = self.entry_limite.get().strip().replace(',', '.')
+        limite_texto = self.entry_limite.get().strip()
         if not nome_cartao or not nome_usuario or not numero or not validade or not bandeira or not limite_texto:
             messagebox.showerror("Erro", "Preencha todos os campos obrigatórios.")
             return
@@ -619,35 +1134,44 @@ class SpendingTracker(ttk.Window):
             messagebox.showerror("Erro", "Data de validade inválida. Use o formato mm/aa.")
             return
         try:
-            limite = float(limite_texto)
+            limite = para_centavos(limite_texto)
         except ValueError:
             messagebox.showerror("Erro", "O campo Limite de Crédito deve ser numérico.")
             return
+        try:
+            dia_fechamento = self.ler_dia_do_mes(self.entry_dia_fechamento)
+            dia_vencimento = self.ler_dia_do_mes(self.entry_dia_vencimento)
+        except ValueError:
+            messagebox.showerror("Erro", "Os dias de fechamento e vencimento devem estar entre 1 e 31.")
+            return
         if len(numero) >= 4:
             numero_mascarado = "**** " + numero[-4:]
         else:
             numero_mascarado = numero
-        # Insere os dados do cartão (sem fechamento e vencimento)
+        # Insere os dados do cartão (com os dias de fechamento e vencimento)
         cartao = (
             nome_cartao,
             nome_usuario,
             numero_mascarado,
             validade,
             bandeira,
-            f"{limite:.2f}".replace('.', ',')
+            limite,
+            dia_fechamento,
+            dia_vencimento
         )
-        try:
-            self.cursor.execute(
-                "INSERT INTO cartoes (nome_cartao, nome_usuario, numero, validade, bandeira, limite) VALUES (?, ?, ?, ?, ?, ?)",
+        self.no_banco(
+            lambda banco: banco.executar(
+                "INSERT INTO cartoes (nome_cartao, nome_usuario, numero, validade, bandeira, limite, dia_fechamento, dia_vencimento) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
                 cartao
-            )
-            self.conn.commit()
-            # Recupera o id recém-inserido e atualiza a lista de cartões
-            card_id = self.cursor.lastrowid
-            self.cartoes.append((card_id,) + cartao)
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao inserir cartão no banco: {e}")
-            return
+            ).lastrowid,
+            ao_concluir=lambda card_id: self.cartao_cadastrado(card_id, cartao),
+            erro="Erro ao inserir cartão no banco"
+        )
+
+    def cartao_cadastrado(self, card_id, cartao):
+        # Recebe o id recém-inserido e atualiza a lista de cartões
+        self.cartoes.append((card_id,) + cartao)
+        self.fechamentos_alterados()
         self.atualizar_tabela_cartao()
         messagebox.showinfo("Sucesso", "Cartão cadastrado com sucesso!")
         self.entry_nome_cartao.delete(0, "end")
@@ -656,6 +1180,8 @@ class SpendingTracker(ttk.Window):
         self.entry_validade.delete(0, "end")
         self.combo_bandeira.current(0)
         self.entry_limite.delete(0, "end")
+        self.entry_dia_fechamento.delete(0, "end")
+        self.entry_dia_vencimento.delete(0, "end")
         self.combo_cartao_utilizado["values"] = [c[1] for c in self.cartoes]
         self.combo_dashboard["values"] = [c[1] for c in self.cartoes]
         if self.cartoes:
@@ -682,9 +1208,14 @@ class SpendingTracker(ttk.Window):
                 self.entry_validade.insert(0, card[4])
                 self.combo_bandeira.set(card[5])
                 self.entry_limite.delete(0, tk.END)
-                self.entry_limite.insert(0, card[6])
+                self.entry_limite.insert(0, formatar_moeda(card[6] or 0))
+                self.entry_dia_fechamento.delete(0, tk.END)
+                self.entry_dia_fechamento.insert(0, card[7] or "")
+                self.entry_dia_vencimento.delete(0, tk.END)
+                self.entry_dia_vencimento.insert(0, card[8] or "")
                 break
 
+    @acao_usuario
     def atualizar_cartao(self):
         # Verifica se um cartão foi selecionado para edição
         if not hasattr(self, "card_edit_id"):
@@ -696,7 +1227,7 @@ class SpendingTracker(ttk.Window):
         numero = self.entry_numero_cartao.get().strip()
         validade = self.entry_validade.get().strip()
         bandeira = self.combo_bandeira.get().strip()
-        limite_texto = self.entry_limite.get().strip().replace(',', '.')
+        limite_texto = self.entry_limite.get().strip()
         if not nome_cartao or not nome_usuario or not numero or not validade or not bandeira or not limite_texto:
             messagebox.showerror("Erro", "Preencha todos os campos obrigatórios para edição.")
             return
@@ -706,59 +1237,82 @@ class SpendingTracker(ttk.Window):
             messagebox.showerror("Erro", "Data de validade inválida. Use o formato mm/aa.")
             return
         try:
-            limite = float(limite_texto)
+            limite = para_centavos(limite_texto)
         except ValueError:
             messagebox.showerror("Erro", "O campo Limite de Crédito deve ser numérico.")
             return
+        try:
+            dia_fechamento = self.ler_dia_do_mes(self.entry_dia_fechamento)
+            dia_vencimento = self.ler_dia_do_mes(self.entry_dia_vencimento)
+        except ValueError:
+            messagebox.showerror("Erro", "Os dias de fechamento e vencimento devem estar entre 1 e 31.")
+            return
         if len(numero) >= 4:
             numero_mascarado = "**** " + numero[-4:]
         else:
             numero_mascarado = numero
-        try:
-            self.cursor.execute(
-                "UPDATE cartoes SET nome_cartao=?, nome_usuario=?, numero=?, validade=?, bandeira=?, limite=? WHERE id=?",
-                (nome_cartao, nome_usuario, numero_mascarado, validade, bandeira, f"{limite:.2f}".replace('.', ','), card_id)
-            )
-            self.conn.commit()
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao atualizar cartão: {e}")
-            return
+        cartao = (card_id, nome_cartao, nome_usuario, numero_mascarado, validade, bandeira, limite, dia_fechamento, dia_vencimento)
+        self.no_banco(
+            lambda banco: banco.executar(
+                "UPDATE cartoes SET nome_cartao=?, nome_usuario=?, numero=?, validade=?, bandeira=?, limite=?, dia_fechamento=?, dia_vencimento=? WHERE id=?",
+                cartao[1:] + (card_id,)
+            ),
+            ao_concluir=lambda _: self.cartao_atualizado(cartao),
+            erro="Erro ao atualizar cartão"
+        )
+
+    def cartao_atualizado(self, cartao):
         # Atualiza a lista de cartões
         for i, card in enumerate(self.cartoes):
-            if card[0] == card_id:
-                self.cartoes[i] = (card_id, nome_cartao, nome_usuario, numero_mascarado, validade, bandeira, f"{limite:.2f}".replace('.', ','))
+            if card[0] == cartao[0]:
+                self.cartoes[i] = cartao
                 break
         self.atualizar_tabela_cartao()
+        self.fechamentos_alterados()
+        if self.cartao_dashboard_var.get():
+            self.atualizar_dashboard_cartao()
         messagebox.showinfo("Sucesso", "Cartão atualizado com sucesso!")
         # Limpa a variável de edição
         self.card_edit_id = None
 
+    @acao_usuario
     def excluir_cartao(self):
         selected = self.tabela_cartao.selection()
         if not selected:
             messagebox.showwarning("Aviso", "Selecione um cartão para excluir.")
             return
         card_id = int(selected[0])
-        try:
-            self.cursor.execute("DELETE FROM cartoes WHERE id=?", (card_id,))
-            self.conn.commit()
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao excluir cartão: {e}")
-            return
+        self.no_banco(
+            lambda banco: banco.executar("DELETE FROM cartoes WHERE id=?", (card_id,)),
+            ao_concluir=lambda _: self.cartao_excluido(card_id),
+            erro="Erro ao excluir cartão"
+        )
+
+    def cartao_excluido(self, card_id):
         # Remove da lista
         self.cartoes = [c for c in self.cartoes if c[0] != card_id]
         self.atualizar_tabela_cartao()
+        self.fechamentos_alterados()
         messagebox.showinfo("Sucesso", "Cartão excluído com sucesso!")
         # Atualiza os comboboxes que usam a lista de cartões
         self.combo_cartao_utilizado["values"] = [c[1] for c in self.cartoes]
         self.combo_dashboard["values"] = [c[1] for c in self.cartoes]
 
+    def fechamentos_alterados(self):
+        # O dia de fechamento define o ciclo das parcelas projetadas (no banco, os triggers
+        # das faturas recalculam o cartão); o relatório é refeito na próxima exibição
+        self.compras.fechamentos = ComprasParceladas.mapear_fechamentos((c[1], c[7]) for c in self.cartoes)
+        self.abas_pendentes.add("relatorios")
+
     def atualizar_tabela_cartao(self):
-        self.tabela_cartao.delete(*self.tabela_cartao.get_children())
-        for card in self.cartoes:
-            # Exibe sem o id; usa o id como iid
-            self.tabela_cartao.insert("", "end", iid=str(card[0]), values=(card[1], card[2], card[3], card[4], card[5], card[6]))
+        # Exibe sem o id; usa o id como iid (os valores brutos servem à ordenação)
+        self.modelo_cartoes.definir(
+            (card[0], (card[1], card[2], card[3], card[4], card[5], formatar_moeda(card[6] or 0), card[7] or "", card[8] or ""),
+             (), card[1:9])
+            for card in self.cartoes
+        )
 
+    @acao_usuario
     def atualizar_dashboard_cartao(self, event=None):
         selected_card = self.cartao_dashboard_var.get()
         card = None
@@ -768,20 +1322,43 @@ class SpendingTracker(ttk.Window):
                 break
         if not card:
             return
-        # Aqui, como não temos fechamento e vencimento, o dashboard pode mostrar apenas o total gasto (calculado a partir das despesas com o nome do cartão)
-        limite = float(card[6].replace(',', '.'))
-        total_cartao = sum(float(d[3]) for d in self.despesas if d[7]=="Cartão de Crédito" and d[8].strip() == card[1].strip())
-        disponivel = limite - total_cartao
-        if disponivel < 0:
-            disponivel = 0
-        percentual = (total_cartao / limite * 100) if limite > 0 else 0
+        # Lê só as faturas a partir do ciclo anterior ao atual (faixa na chave primária de faturas)
+        ciclo_atual = ciclo_fatura(date.today(), card[7])
+        self.no_banco(
+            lambda banco: banco.consultar(
+                "SELECT ciclo, total FROM faturas WHERE cartao = ? AND ciclo >= ?",
+                (card[1].strip(), somar_meses_ciclo(ciclo_atual, -1))
+            ),
+            ao_concluir=lambda linhas: self.exibir_dashboard_cartao(card, ciclo_atual, dict(linhas)),
+            erro="Erro ao consultar as faturas do cartão"
+        )
+
+    def exibir_dashboard_cartao(self, card, ciclo_atual, faturas):
+        limite = card[6] or 0
+        dia_fechamento, dia_vencimento = card[7], card[8]
+        ciclo_anterior = somar_meses_ciclo(ciclo_atual, -1)
+        # Comprometem o limite a fatura atual, as futuras e a anterior enquanto não vence
+        em_aberto = sum(total for ciclo, total in faturas.items() if ciclo >= ciclo_atual)
+        # Parcelas ainda não lançadas também comprometem o limite; a próxima fatura inclui a projeção
+        em_aberto += self.compras.restante_cartao(card[1])
+        ciclo_seguinte = somar_meses_ciclo(ciclo_atual, 1)
+        proxima = faturas.get(ciclo_seguinte, 0) + self.compras.projecao(ciclo_seguinte, card[1]).get(ciclo_seguinte, 0)
+        if dia_vencimento and vencimento_fatura(ciclo_anterior, dia_fechamento, dia_vencimento) >= date.today():
+            em_aberto += faturas.get(ciclo_anterior, 0)
+        disponivel = max(limite - em_aberto, 0)
+        percentual = (em_aberto / limite * 100) if limite > 0 else 0
+        texto_atual = f"Fatura atual: R$ {formatar_moeda(faturas.get(ciclo_atual, 0))}"
+        if dia_fechamento and dia_vencimento:
+            fecha = data_do_ciclo(ciclo_atual, dia_fechamento)
+            vence = vencimento_fatura(ciclo_atual, dia_fechamento, dia_vencimento)
+            texto_atual += f" (fecha {fecha:%d/%m}, vence {vence:%d/%m})"
         self.progress_cartao["value"] = percentual
         self.label_dashboard.config(
-            text=(f"Gastos: R$ {total_cartao:.2f}".replace('.', ',') +
-                  f" / Limite: R$ {card[6]} / Disponível: R$ {disponivel:.2f}".replace('.', ','))
+            text=(f"{texto_atual} / Próxima fatura: R$ {formatar_moeda(proxima)}"
+                  f" / Limite: R$ {formatar_moeda(limite)} / Disponível: R$ {formatar_moeda(disponivel)}")
         )
         if percentual >= 90:
-            messagebox.showwarning("Alerta", f"Você atingiu {percentual:.0f}% do limite do cartão {selected_card}!")
+            messagebox.showwarning("Alerta", f"Você atingiu {percentual:.0f}% do limite do cartão {card[1]}!")
 
     def carregar_cartao_selecionado(self, event):
         selected = self.tabela_cartao.selection()
@@ -801,7 +1378,11 @@ class SpendingTracker(ttk.Window):
                 self.entry_validade.insert(0, card[4])
                 self.combo_bandeira.set(card[5])
                 self.entry_limite.delete(0, tk.END)
-                self.entry_limite.insert(0, card[6])
+                self.entry_limite.insert(0, formatar_moeda(card[6] or 0))
+                self.entry_dia_fechamento.delete(0, tk.END)
+                self.entry_dia_fechamento.insert(0, card[7] or "")
+                self.entry_dia_vencimento.delete(0, tk.END)
+                self.entry_dia_vencimento.insert(0, card[8] or "")
                 break
 
     # -------------------------
@@ -844,13 +1425,23 @@ class SpendingTracker(ttk.Window):
         if not entry.get():
             entry.insert(0, placeholder)
 
+    def ler_dia_do_mes(self, entry):
+        # Dia do mês opcional (1 a 31); None se o campo estiver vazio
+        texto = entry.get().strip()
+        if not texto:
+            return None
+        dia = int(texto)
+        if not 1 <= dia <= 31:
+            raise ValueError(texto)
+        return dia
+
     def formatar_valor(self, event, entry, placeholder):
         if entry.get() == placeholder:
             return
         try:
-            valor = float(entry.get().replace(",", "."))
+            valor = para_centavos(entry.get())
             entry.delete(0, "end")
-            entry.insert(0, f"{valor:.2f}".replace(".", ","))
+            entry.insert(0, formatar_moeda(valor))
         except ValueError:
             messagebox.showerror("Erro", "Insira um valor numérico válido.")
             entry.delete(0, "end")
@@ -862,24 +1453,67 @@ class SpendingTracker(ttk.Window):
     def configurar_aba_relatorios(self):
         self.frame_relatorios = ttk.Frame(self.tab_relatorios, padding=10)
         self.frame_relatorios.pack(fill=ttk.BOTH, expand=True)
-        self.botao_gerar_relatorio = ttk.Button(self.frame_relatorios, text="Gerar Relatório", bootstyle=INFO, command=self.gerar_relatorio)
-        self.botao_gerar_relatorio.pack(pady=10)
-        self.text_relatorio = tk.Text(self.frame_relatorios, wrap="word", height=20)
+        self.frame_relatorio_opcoes = ttk.Frame(self.frame_relatorios)
+        self.frame_relatorio_opcoes.pack(fill=ttk.X, pady=5)
+        ttk.Label(self.frame_relatorio_opcoes, text="Agrupar por:", font=("Helvetica", 10, "bold")).pack(side=ttk.LEFT, padx=5)
+        # Qualquer combinação das dimensões gera uma tabela cruzada
+        self.relatorio_dimensoes = {}
+        for dimensao, titulo in MotorRelatorios.DIMENSOES.items():
+            var = ttk.BooleanVar(value=dimensao == "categoria")
+            ttk.Checkbutton(self.frame_relatorio_opcoes, text=titulo, variable=var).pack(side=ttk.LEFT, padx=5)
+            self.relatorio_dimensoes[dimensao] = var
+        self.botao_gerar_relatorio = ttk.Button(self.frame_relatorio_opcoes, text="Gerar Relatório", bootstyle=INFO, command=self.gerar_relatorio)
+        self.botao_gerar_relatorio.pack(side=ttk.LEFT, padx=10)
+        self.botao_relatorio_lote = ttk.Button(self.frame_relatorio_opcoes, text="Relatório Anual em Lote", bootstyle=SECONDARY,
+                                               command=self.gerar_relatorio_lote)
+        self.botao_relatorio_lote.pack(side=ttk.LEFT, padx=5)
+        ToolTip(self.botao_relatorio_lote, text="Gera num arquivo texto os totais por ano e mês de cada categoria e cartão, "
+                                                "processando os anos em paralelo.")
+        self.text_relatorio = tk.Text(self.frame_relatorios, wrap="none", height=20, font=("Courier", 10))
         self.text_relatorio.pack(fill=ttk.BOTH, expand=True)
 
+    @acao_usuario
     def gerar_relatorio(self):
-        relatorio = "Relatório de Despesas\n\n"
-        total_geral = sum(float(d[3]) for d in self.despesas)
-        relatorio += f"Total Geral: R$ {total_geral:.2f}\n\n"
-        por_categoria = {}
-        for d in self.despesas:
-            cat = d[5]
-            valor = float(d[3])
-            por_categoria[cat] = por_categoria.get(cat, 0) + valor
-        for cat, total in por_categoria.items():
-            relatorio += f"{cat}: R$ {total:.2f}\n"
+        inicio = time.perf_counter()
+        dimensoes = [d for d, var in self.relatorio_dimensoes.items() if var.get()]
+        linhas = linhas_relatorio(self.despesas, self.compras, dimensoes)
+        linhas += ["", f"Gerado em {(time.perf_counter() - inicio) * 1000:.0f} ms"]
         self.text_relatorio.delete(1.0, tk.END)
-        self.text_relatorio.insert(tk.END, relatorio)
+        self.text_relatorio.insert(tk.END, "\n".join(linhas) + "\n")
+
+    @acao_usuario
+    def gerar_relatorio_lote(self):
+        if getattr(self, "relatorio_lote", None) and self.relatorio_lote.em_andamento:
+            messagebox.showwarning("Aviso", "Já existe um relatório em lote em andamento.")
+            return
+        destino = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Texto", "*.txt")])
+        if not destino:
+            return
+        self.relatorio_lote = RelatorioLote(ARQUIVO_BANCO, destino)
+        # Os processos leem o arquivo do banco: antes, grava o que ainda estiver na fila
+        self.no_banco(lambda banco: banco.flush(), ao_concluir=lambda _: self.iniciar_relatorio_lote(),
+                      erro="Erro ao gravar alterações pendentes")
+
+    def iniciar_relatorio_lote(self):
+        self.janela_relatorio_lote = JanelaProgresso(self, "Relatório em lote", self.relatorio_lote.cancelar)
+        self.relatorio_lote.iniciar()
+        self.acompanhar_relatorio_lote()
+
+    def acompanhar_relatorio_lote(self):
+        relatorio = self.relatorio_lote
+        self.janela_relatorio_lote.atualizar(relatorio.progresso, relatorio.total,
+                                             f"Agregando {relatorio.progresso} de {relatorio.total} anos...")
+        if relatorio.em_andamento:
+            self.apos(100, self.acompanhar_relatorio_lote)
+            return
+        self.janela_relatorio_lote.destroy()
+        if relatorio.erro:
+            messagebox.showerror("Erro", f"Erro no relatório em lote: {relatorio.erro}")
+        elif relatorio.cancelado:
+            messagebox.showinfo("Aviso", "Relatório em lote cancelado.")
+        else:
+            messagebox.showinfo("Sucesso", f"Relatório gravado em {relatorio.destino} "
+                                           f"({relatorio.duracao:.1f} s em {relatorio.processos} processos).")
 
     # -------------------------
     # Aba Metas
@@ -917,24 +1551,30 @@ class SpendingTracker(ttk.Window):
             self.tabela_metas.heading(col, text=col)
             self.tabela_metas.column(col, width=120, anchor="center")
         self.tabela_metas.bind("<<TreeviewSelect>>", self.carregar_meta_selecionada)
+        self.tabela_metas.tag_configure("meta_ok", background="lightgreen")
+        self.tabela_metas.tag_configure("meta_incompleta", background="lightcoral")
+        self.modelo_metas = ModeloTabela(self.tabela_metas)
+        CabecalhosOrdenaveis(self.tabela_metas, colunas,
+                             lambda coluna, decrescente: self.ordenar_modelo(self.modelo_metas, colunas, coluna, decrescente))
         self.atualizar_tabela_metas()
 
+    @acao_usuario
     def cadastrar_meta(self):
         nome = self.entry_meta_nome.get().strip()
-        valor_meta_texto = self.entry_meta_valor.get().strip().replace(",", ".")
-        valor_atual_texto = self.entry_meta_atual.get().strip().replace(",", ".")
+        valor_meta_texto = self.entry_meta_valor.get().strip()
+        valor_atual_texto = self.entry_meta_atual.get().strip()
         data_inicial = self.entry_meta_data_inicial.get().strip()
         data_final = self.entry_meta_data_final.get().strip()
         if not nome or not valor_meta_texto or not data_inicial or not data_final:
             messagebox.showerror("Erro", "Preencha os campos obrigatórios da meta (Nome, Valor Meta, Data Inicial e Data Final).")
             return
         try:
-            valor_meta = float(valor_meta_texto)
+            valor_meta = para_centavos(valor_meta_texto)
         except ValueError:
             messagebox.showerror("Erro", "O campo Valor Meta deve ser numérico.")
             return
         try:
-            valor_atual = float(valor_atual_texto) if valor_atual_texto else 0.0
+            valor_atual = para_centavos(valor_atual_texto) if valor_atual_texto else 0
         except ValueError:
             messagebox.showerror("Erro", "O campo Valor Atual deve ser numérico.")
             return
@@ -944,19 +1584,22 @@ class SpendingTracker(ttk.Window):
         except ValueError:
             messagebox.showerror("Erro", "Data Inicial ou Data Final inválida. Use o formato dd/mm/aaaa.")
             return
-        try:
-            self.cursor.execute(
-                "INSERT INTO metas (nome, valor_meta, valor_atual, data_inicial, data_final) VALUES (?, ?, ?, ?, ?)",
-                (nome, valor_meta, valor_atual, data_inicial, data_final)
-            )
-            self.conn.commit()
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao inserir meta no banco: {e}")
-            return
-        self.cursor.execute("SELECT id, nome, valor_meta, valor_atual, data_inicial, data_final FROM metas")
-        self.metas = self.cursor.fetchall()
+        self.no_banco(
+            self.gravar_meta,
+            "INSERT INTO metas (nome, valor_meta, valor_atual, data_inicial, data_final) VALUES (?, ?, ?, ?, ?)",
+            (nome, valor_meta, valor_atual, data_inicial, data_final),
+            ao_concluir=lambda metas: self.meta_gravada(metas, "Meta cadastrada com sucesso!"),
+            erro="Erro ao inserir meta no banco"
+        )
+
+    def gravar_meta(self, banco, sql, parametros):
+        banco.executar(sql, parametros)
+        return banco.consultar("SELECT id, nome, valor_meta, valor_atual, data_inicial, data_final FROM metas")
+
+    def meta_gravada(self, metas, mensagem):
+        self.metas = metas
         self.atualizar_tabela_metas()
-        messagebox.showinfo("Sucesso", "Meta cadastrada com sucesso!")
+        messagebox.showinfo("Sucesso", mensagem)
         self.limpar_form_meta()
 
     def carregar_meta_selecionada(self, event):
@@ -977,26 +1620,27 @@ class SpendingTracker(ttk.Window):
         self.entry_meta_data_final.insert(0, valores[5])
         self.meta_selecionada_id = meta_id
 
+    @acao_usuario
     def atualizar_meta(self):
         if not hasattr(self, "meta_selecionada_id") or not self.meta_selecionada_id:
             messagebox.showwarning("Aviso", "Selecione uma meta para atualizar.")
             return
         meta_id = self.meta_selecionada_id
         nome = self.entry_meta_nome.get().strip()
-        valor_meta_texto = self.entry_meta_valor.get().strip().replace(",", ".")
-        valor_atual_texto = self.entry_meta_atual.get().strip().replace(",", ".")
+        valor_meta_texto = self.entry_meta_valor.get().strip()
+        valor_atual_texto = self.entry_meta_atual.get().strip()
         data_inicial = self.entry_meta_data_inicial.get().strip()
         data_final = self.entry_meta_data_final.get().strip()
         if not nome or not valor_meta_texto or not data_inicial or not data_final:
             messagebox.showerror("Erro", "Preencha os campos obrigatórios da meta (Nome, Valor Meta, Data Inicial e Data Final).")
             return
         try:
-            valor_meta = float(valor_meta_texto)
+            valor_meta = para_centavos(valor_meta_texto)
         except ValueError:
             messagebox.showerror("Erro", "O campo Valor Meta deve ser numérico.")
             return
         try:
-            valor_atual = float(valor_atual_texto) if valor_atual_texto else 0.0
+            valor_atual = para_centavos(valor_atual_texto) if valor_atual_texto else 0
         except ValueError:
             messagebox.showerror("Erro", "O campo Valor Atual deve ser numérico.")
             return
@@ -1006,33 +1650,25 @@ class SpendingTracker(ttk.Window):
         except ValueError:
             messagebox.showerror("Erro", "Data Inicial ou Data Final inválida. Use o formato dd/mm/aaaa.")
             return
-        try:
-            self.cursor.execute(
-                "UPDATE metas SET nome=?, valor_meta=?, valor_atual=?, data_inicial=?, data_final=? WHERE id=?",
-                (nome, valor_meta, valor_atual, data_inicial, data_final, self.meta_selecionada_id)
-            )
-            self.conn.commit()
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao atualizar meta no banco: {e}")
-            return
-        self.cursor.execute("SELECT id, nome, valor_meta, valor_atual, data_inicial, data_final FROM metas")
-        self.metas = self.cursor.fetchall()
-        self.atualizar_tabela_metas()
-        messagebox.showinfo("Sucesso", "Meta atualizada com sucesso!")
-        self.limpar_form_meta()
+        self.no_banco(
+            self.gravar_meta,
+            "UPDATE metas SET nome=?, valor_meta=?, valor_atual=?, data_inicial=?, data_final=? WHERE id=?",
+            (nome, valor_meta, valor_atual, data_inicial, data_final, meta_id),
+            ao_concluir=lambda metas: self.meta_gravada(metas, "Meta atualizada com sucesso!"),
+            erro="Erro ao atualizar meta no banco"
+        )
 
     def atualizar_tabela_metas(self):
-        self.tabela_metas.delete(*self.tabela_metas.get_children())
+        linhas = []
         for meta in self.metas:
             meta_id, nome, valor_meta, valor_atual, data_inicial, data_final = meta
-            percentual = (valor_atual / valor_meta * 100) if valor_meta > 0 else 0
+            percentual = (valor_atual / valor_meta * 100) if valor_meta and valor_meta > 0 else 0
             percentual_str = f"{percentual:.2f}%"
             tag = "meta_ok" if percentual >= 100 else "meta_incompleta"
-            self.tabela_metas.insert("", "end", iid=str(meta_id), values=(nome, f"{valor_meta:.2f}".replace(".", ","), 
-                                                                           f"{valor_atual:.2f}".replace(".", ","), percentual_str,
-                                                                           data_inicial, data_final), tags=(tag,))
-        self.tabela_metas.tag_configure("meta_ok", background="lightgreen")
-        self.tabela_metas.tag_configure("meta_incompleta", background="lightcoral")
+            linhas.append((meta_id, (nome, formatar_moeda(valor_meta or 0), formatar_moeda(valor_atual or 0),
+                                     percentual_str, data_inicial, data_final), (tag,),
+                           (nome, valor_meta, valor_atual, percentual, data_inicial, data_final)))
+        self.modelo_metas.definir(linhas)
 
     def limpar_form_meta(self):
         self.entry_meta_nome.delete(0, tk.END)
@@ -1047,64 +1683,188 @@ class SpendingTracker(ttk.Window):
     # -------------------------
     # Aba Importação de Planilha
     # -------------------------
+    @acao_usuario
     def importar_planilha(self):
+        if getattr(self, "importacao", None) and self.importacao.em_andamento:
+            messagebox.showwarning("Aviso", "Já existe uma importação em andamento.")
+            return
         filepath = filedialog.askopenfilename(filetypes=[("Excel Files", "*.xlsx")])
         if not filepath:
             return
-        try:
-            workbook = openpyxl.load_workbook(filepath)
-            sheet = workbook.active
-            imported_data = []
-            for row in sheet.iter_rows(min_row=2, values_only=True):
-                if row[0] is not None:
-                    imported_data.append(row)
-            if imported_data:
-                self.despesas.extend(imported_data)
-                self.atualizar_tabela()
-                self.atualizar_indicador_gastos()
-                self.atualizar_tabela_despesas_cartao()
-                messagebox.showinfo("Sucesso", f"Importados {len(imported_data)} despesas da planilha.")
-            else:
-                messagebox.showinfo("Aviso", "Nenhuma despesa encontrada na planilha.")
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao importar planilha: {e}")
+        self.importacao = ImportacaoPlanilha(filepath)
+        self.janela_importacao = JanelaProgresso(self, "Importando planilha", self.importacao.cancelar)
+        self.importacao.iniciar(self.executor)
+        self.apos(100, self.acompanhar_importacao)
+
+    def acompanhar_importacao(self):
+        importacao = self.importacao
+        if importacao.total is None:
+            texto = f"Importando... {importacao.progresso} linhas lidas"
+        else:
+            texto = f"Importando {importacao.progresso} de {importacao.total} linhas..."
+        self.janela_importacao.atualizar(importacao.progresso, importacao.total, texto)
+        if importacao.em_andamento:
+            self.apos(100, self.acompanhar_importacao)
+            return
+        self.janela_importacao.destroy()
+        if importacao.erro:
+            messagebox.showerror("Erro", f"Erro ao importar planilha: {importacao.erro}")
+            return
+        if importacao.cancelada:
+            messagebox.showinfo("Aviso", "Importação cancelada. Nenhuma despesa foi gravada.")
+            return
+        if importacao.importadas:
+            self.despesas.update(importacao.importadas)
+            self.agregados.mesclar(importacao.agregados)
+            self.incluir_novas_nas_tabelas(importacao.importadas)
+            self.atualizar_indicador_gastos()
+            self.abas_pendentes.add("cartao")
+            mensagem = f"Importados {len(importacao.importadas)} despesas da planilha."
+        else:
+            mensagem = "Nenhuma despesa encontrada na planilha."
+        if importacao.quantidade_rejeitadas:
+            mensagem += (f"\n\n{importacao.quantidade_rejeitadas} linha(s) ignorada(s):\n"
+                         + "\n".join(importacao.rejeitadas))
+        messagebox.showinfo("Sucesso" if importacao.importadas else "Aviso", mensagem)
 
     # -------------------------
     # Aba Backup e Restauração
     # -------------------------
+    @acao_usuario
     def backup_db(self):
         backup_path = filedialog.asksaveasfilename(defaultextension=".db", filetypes=[("Database Files", "*.db")])
         if backup_path:
-            try:
-                self.conn.commit()
-                shutil.copy("financeiro.db", backup_path)
-                messagebox.showinfo("Backup", f"Backup realizado com sucesso em {backup_path}")
-            except Exception as e:
-                messagebox.showerror("Erro", f"Erro no backup: {e}")
+            # O lote pendente da thread de escrita é gravado antes da cópia
+            self.no_banco(lambda banco: banco.flush(),
+                          ao_concluir=lambda _: self.iniciar_backup(backup_path),
+                          erro="Erro no backup")
+
+    def iniciar_backup(self, backup_path):
+        self.snapshot_manual = SnapshotBanco(ARQUIVO_BANCO, backup_path)
+        self.snapshot_manual.iniciar()
+        self.apos(100, self.acompanhar_backup)
+
+    def acompanhar_backup(self):
+        snapshot = self.snapshot_manual
+        if snapshot.em_andamento:
+            self.apos(100, self.acompanhar_backup)
+            return
+        self.snapshots.registrar(snapshot)
+        if snapshot.erro:
+            messagebox.showerror("Erro", f"Erro no backup: {snapshot.erro}")
+        else:
+            messagebox.showinfo("Backup", f"Backup realizado com sucesso em {snapshot.destino} "
+                                          f"({snapshot.tamanho / 1024:.0f} KB em {snapshot.duracao:.2f} s)")
 
+    @acao_usuario
     def restaurar_backup(self):
+        if getattr(self, "restauracao", None) and self.restauracao.em_andamento:
+            messagebox.showwarning("Aviso", "Já existe uma restauração em andamento.")
+            return
         backup_path = filedialog.askopenfilename(defaultextension=".db", filetypes=[("Database Files", "*.db")])
         if backup_path:
-            try:
-                self.conn.commit()
-                self.conn.close()
-                shutil.copy(backup_path, "financeiro.db")
-                self.conectar_banco()
-                self.carregar_dados()
-                self.atualizar_tabela()
-                self.atualizar_tabela_despesas_cartao()
-                self.atualizar_tabela_cartao()
-                self.cursor.execute("SELECT id, nome, valor_meta, valor_atual, data_inicial, data_final FROM metas")
-                self.metas = self.cursor.fetchall()
-                self.atualizar_tabela_metas()
-                self.combo_dashboard["values"] = [c[1] for c in self.cartoes]
-                if self.cartoes:
-                    self.combo_dashboard.current(0)
-                    self.atualizar_dashboard_cartao()
-                messagebox.showinfo("Backup", "Backup restaurado com sucesso!")
-            except Exception as e:
-                messagebox.showerror("Erro", f"Erro ao restaurar backup: {e}")
+            self.restauracao = RestauracaoBanco(backup_path, ARQUIVO_BANCO)
+            self.restauracao.iniciar()
+            self.apos(100, self.acompanhar_restauracao)
+
+    def acompanhar_restauracao(self):
+        restauracao = self.restauracao
+        if restauracao.em_andamento:
+            self.apos(100, self.acompanhar_restauracao)
+            return
+        if restauracao.erro:
+            messagebox.showerror("Erro", f"Erro ao restaurar backup: {restauracao.erro}")
+            return
+        if restauracao.problemas:
+            messagebox.showerror("Erro", "O backup está corrompido ou incompatível e não foi restaurado:\n\n"
+                                 + "\n".join(restauracao.problemas))
+            return
+        # Do fechamento do banco até a reabertura com o arquivo restaurado, a janela principal
+        # fica bloqueada (o executor encerrado recusa novas tarefas)
+        self.janela_restauracao = JanelaProgresso(self, "Restaurando backup", None)
+        self.janela_restauracao.atualizar(0, None, "Trocando o arquivo do banco...")
+        self.janela_restauracao.grab_set()
+        # O executor grava o lote pendente e fecha todas as conexões antes da troca do arquivo
+        self.aguardar_encerramento(self.executor.encerrar())
+
+    def aguardar_encerramento(self, futuro):
+        if not futuro.done():
+            self.apos(10, self.aguardar_encerramento, futuro)
+            return
+        if futuro.exception() is not None:
+            # As conexões já foram fechadas: reabre o banco atual sem trocar o arquivo
+            self.restauracao.descartar()
+            self.conectar_banco()
+            self.janela_restauracao.destroy()
+            messagebox.showerror("Erro", f"Erro ao gravar alterações pendentes; backup não restaurado: "
+                                         f"{futuro.exception()}")
+            return
+        self.aplicar_restauracao()
+
+    def aplicar_restauracao(self):
+        restauracao = self.restauracao
+        try:
+            restauracao.aplicar()
+        except Exception as e:
+            restauracao.descartar()
+            self.conectar_banco()
+            self.janela_restauracao.destroy()
+            messagebox.showerror("Erro", f"Erro ao restaurar backup: {e}")
+            return
+        self.conectar_banco()
+        self.janela_restauracao.destroy()
+        self.carregar_dados(ao_concluir=self.restauracao_concluida)
+
+    def restauracao_concluida(self):
+        # Banco trocado por inteiro: as tabelas paginadas montadas voltam à primeira página
+        if "cartao" in self.abas_construidas:
+            self.atualizar_tabela_despesas_cartao()
+        self.recarregar_abas({"despesas", "cartao", "relatorios", "metas"})
+        messagebox.showinfo("Backup", "Backup restaurado com sucesso!")
+
+    # -------------------------
+    # Recarga preguiçosa das abas
+    # -------------------------
+    def nome_aba_atual(self):
+        abas = {
+            str(self.tab_despesas): "despesas",
+            str(self.tab_cartao): "cartao",
+            str(self.tab_relatorios): "relatorios",
+            str(self.tab_metas): "metas",
+        }
+        return abas.get(self.notebook.select())
+
+    def recarregar_abas(self, abas):
+        # Marca as abas como desatualizadas e redesenha só a que está visível
+        self.abas_pendentes.update(abas)
+        self.ao_trocar_aba()
+
+    @acao_usuario
+    def ao_trocar_aba(self, event=None):
+        aba = self.nome_aba_atual()
+        if aba is not None and aba not in self.abas_construidas:
+            self.abas_construidas.add(aba)
+            getattr(self, self.CONSTRUTORES_ABAS[aba])()
+        if aba not in self.abas_pendentes:
+            return
+        self.abas_pendentes.discard(aba)
+        if aba == "despesas":
+            self.atualizar_tabela()
+            self.atualizar_indicador_gastos()
+            self.combo_cartao_utilizado["values"] = [c[1] for c in self.cartoes]
+        elif aba == "cartao":
+            self.atualizar_tabela_cartao()
+            self.combo_dashboard["values"] = [c[1] for c in self.cartoes]
+            if self.cartoes:
+                self.combo_dashboard.current(0)
+                self.atualizar_dashboard_cartao()
+        elif aba == "relatorios":
+            self.gerar_relatorio()
+        elif aba == "metas":
+            self.atualizar_tabela_metas()
 
 if __name__ == "__main__":
+    # No executável congelado, os processos do relatório em lote (spawn) não reabrem a janela
+    multiprocessing.freeze_support()
     app = SpendingTracker()
     app.mainloop()
@@ -0,0 +1,335 @@
+# Benchmarks das operações principais sobre bancos sintéticos, sem Tk: cada operação da
+# interface é medida pelo caminho de dados que ela usa em rastreador_dados.
+#   python -m rastreador_bench --tamanhos 10000 100000 --saida bench_resultados.json
+#   python -m rastreador_bench --tamanhos 10000 --comparar bench_resultados.json
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from rastreador_dados import (
+    MESES, abrir_conexao, dia_epoca, FilaEscrita, MigracoesBanco, CacheAgregados,
+    ExportacaoExcel, ImportacaoPlanilha, preparar_banco, ler_dados, inserir_despesa, linhas_relatorio,
+    montar_filtro_despesas, periodo_vencimento, sql_pagina_despesas, condicao_pagina, ORDENACOES_DESPESAS
+)
+
+TAMANHOS = (10_000, 100_000, 1_000_000)
+OPERACOES = ("carregar_dados", "filtrar_despesas", "buscar_despesas", "ordenar_despesas", "adicionar_despesa", "excluir_despesa",
+             "gerar_relatorio", "salvar_no_excel", "importar_planilha")
+# Nome da despesa por categoria e peso de cada categoria/forma de pagamento nos dados gerados
+DESPESAS = {
+    "Alimentação": (["Mercado", "Padaria", "Restaurante", "Delivery", "Feira"], 35),
+    "Transporte": (["Combustível", "Uber", "Ônibus", "Estacionamento"], 20),
+    "Lazer": (["Cinema", "Streaming", "Viagem", "Show"], 12),
+    "Saúde": (["Farmácia", "Consulta", "Academia"], 10),
+    "Moradia": (["Aluguel", "Condomínio", "Energia", "Internet", "Água"], 15),
+    "Outros": (["Presente", "Roupas", "Assinatura"], 8),
+}
+PESOS_PAGAMENTO = {"VR": 15, "Cartão de Crédito": 45, "PIX": 25, "Débito": 15}
+CARTOES = [("Nubank", 5, 12, 800000), ("Itaú", 25, 5, 1500000), ("Inter", 10, 17, 500000)]
+PERIODO = (date(2023, 1, 1), date(2025, 12, 31))
+LOTE = 10_000
+OPERACOES_ESCRITA = 1000  # despesas incluídas (e depois excluídas) por repetição
+# Passos fora da medição: antes de excluir é preciso incluir, e o que foi incluído é desfeito
+PREPARO = {"excluir_despesa": "adicionar_despesa"}
+LIMPEZA = {"adicionar_despesa": "excluir_despesa"}
+
+
+# -------------------------------------------------
+# Geração dos bancos sintéticos
+# -------------------------------------------------
+def gerar_despesas(quantidade, semente=2025):
+    # Despesas no formato gravado pelo app, com valores log-normais (mediana ~R$ 50)
+    rng = random.Random(semente)
+    categorias = list(DESPESAS)
+    pesos_categoria = [DESPESAS[c][1] for c in categorias]
+    pagamentos = list(PESOS_PAGAMENTO)
+    pesos_pagamento = list(PESOS_PAGAMENTO.values())
+    dias = (PERIODO[1] - PERIODO[0]).days
+    for _ in range(quantidade):
+        categoria = rng.choices(categorias, pesos_categoria)[0]
+        pagamento = rng.choices(pagamentos, pesos_pagamento)[0]
+        vencimento = PERIODO[0] + timedelta(days=rng.randrange(dias + 1))
+        yield (str(vencimento.year), MESES[vencimento.month - 1], rng.choice(DESPESAS[categoria][0]),
+               max(int(rng.lognormvariate(8.5, 1.0)), 100), vencimento.strftime("%d/%m/%Y"), categoria,
+               "" if rng.random() < 0.8 else "gerado",
+               pagamento, rng.choice(CARTOES)[0] if pagamento == "Cartão de Crédito" else "")
+
+
+def gerar_banco(caminho, quantidade, semente=2025):
+    banco = FilaEscrita(abrir_conexao(caminho))
+    try:
+        preparar_banco(banco)
+        banco.conn.executemany(
+            "INSERT INTO cartoes (nome_cartao, nome_usuario, numero, validade, bandeira, limite, dia_fechamento, dia_vencimento) "
+            "VALUES (?, 'Benchmark', '**** **** **** 0000', '12/30', 'Visa', ?, ?, ?)",
+            [(nome, limite, fechamento, vencimento) for nome, fechamento, vencimento, limite in CARTOES]
+        )
+        lote = []
+        for despesa in gerar_despesas(quantidade, semente):
+            lote.append(despesa + (dia_epoca(datetime.strptime(despesa[4], "%d/%m/%Y").date()),))
+            if len(lote) >= LOTE:
+                inserir_lote(banco.conn, lote)
+                lote = []
+        inserir_lote(banco.conn, lote)
+        banco.conn.commit()
+        banco.conn.execute("ANALYZE")
+    finally:
+        banco.conn.close()
+
+
+def inserir_lote(conn, lote):
+    conn.executemany(
+        "INSERT INTO despesas (ano, mes, despesa, valor, vencimento, categoria, observacao, pagamento, cartao_utilizado, vencimento_dia) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", lote
+    )
+
+
+def obter_banco(pasta, quantidade):
+    # Reaproveita o banco já gerado se ele tiver a quantidade e a versão de esquema esperadas
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, f"financeiro_{quantidade}.db")
+    if os.path.exists(caminho):
+        conn = sqlite3.connect(caminho)
+        try:
+            existente = conn.execute("SELECT COUNT(*) FROM despesas").fetchone()[0]
+            versao = conn.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            conn.close()
+        if existente == quantidade and versao == MigracoesBanco.VERSAO:
+            return caminho
+        for sufixo in ("", "-wal", "-shm"):
+            if os.path.exists(caminho + sufixo):
+                os.remove(caminho + sufixo)
+    inicio = time.perf_counter()
+    print(f"Gerando {caminho} ({quantidade} despesas)...", file=sys.stderr)
+    gerar_banco(caminho, quantidade)
+    print(f"  pronto em {time.perf_counter() - inicio:.1f} s", file=sys.stderr)
+    return caminho
+
+
+# -------------------------------------------------
+# Operações medidas (o mesmo caminho de dados da interface)
+# -------------------------------------------------
+class Bancada:
+    # Estado compartilhado entre as operações de um tamanho: conexão de escrita, dados
+    # carregados (para o relatório) e a planilha exportada (para a importação)
+    def __init__(self, caminho, pasta_temporaria):
+        self.caminho = caminho
+        self.pasta_temporaria = pasta_temporaria
+        self.banco = FilaEscrita(abrir_conexao(caminho))
+        preparar_banco(self.banco)
+        self.banco.flush()
+        self.dados = None
+        self.incluidas = []
+        self.planilha = os.path.join(pasta_temporaria, "exportacao.xlsx")
+
+    def fechar(self):
+        self.banco.flush()
+        self.banco.conn.close()
+
+    def carregar_dados(self):
+        self.dados = ler_dados(self.banco)
+        return len(self.dados[0])
+
+    def filtrar_despesas(self):
+        # Primeira página de cada filtro da aba Despesas, como em TabelaPaginada
+        filtros = [
+            montar_filtro_despesas(),
+            montar_filtro_despesas("2024", "Março"),
+            montar_filtro_despesas(categoria="Lazer"),
+            montar_filtro_despesas("2025", "Dezembro", "Saúde"),
+        ]
+        for opcao in ("Vencidas", "Próximos 30 dias", "2º Trimestre"):
+            inicio, fim = periodo_vencimento(opcao, "2024")
+            filtros.append(montar_filtro_despesas(vencimento_de=inicio, vencimento_ate=fim))
+        return self._primeiras_paginas(filtros)
+
+    def buscar_despesas(self):
+        # Busca textual como digitada (prefixos), sozinha e combinada com os filtros
+        filtros = [montar_filtro_despesas(busca=texto) for texto in ("u", "ub", "uber", "cinema", "xyz")]
+        filtros += [
+            montar_filtro_despesas("2024", "Março", busca="merc"),
+            montar_filtro_despesas(categoria="Saúde", busca="gerado"),
+        ]
+        return self._primeiras_paginas(filtros)
+
+    def ordenar_despesas(self):
+        # Cabeçalho clicado (crescente e decrescente) e uma página seguinte pelo keyset,
+        # sem filtro e com o filtro de mês, para cada coluna ordenável
+        linhas = 0
+        for ordenacao in ORDENACOES_DESPESAS:
+            for where, parametros in (montar_filtro_despesas(), montar_filtro_despesas("2024", "Março")):
+                for ordem in ("ASC", "DESC"):
+                    pagina = self.banco.consultar(sql_pagina_despesas(where, ordem, ordenacao), parametros + [200])
+                    linhas += len(pagina)
+                    if not pagina:
+                        continue
+                    condicao, valores = condicao_pagina(ordenacao, ordem == "ASC", pagina[-1][-1], pagina[-1][0])
+                    seguinte = (where + " AND " if where else " WHERE ") + condicao
+                    linhas += len(self.banco.consultar(sql_pagina_despesas(seguinte, ordem, ordenacao),
+                                                       parametros + valores + [200]))
+        return linhas
+
+    def _primeiras_paginas(self, filtros):
+        linhas = 0
+        for where, parametros in filtros:
+            where = (where + " AND " if where else " WHERE ") + "id > ?"
+            linhas += len(self.banco.consultar(sql_pagina_despesas(where), parametros + [0, 200]))
+        return linhas
+
+    def adicionar_despesa(self):
+        # Inclusões individuais pela FilaEscrita (commit agrupado), com o cache de agregados
+        agregados = CacheAgregados()
+        self.incluidas = []
+        for despesa in gerar_despesas(OPERACOES_ESCRITA, semente=7):
+            self.incluidas.append(inserir_despesa(self.banco, despesa))
+            agregados.adicionar(despesa)
+        self.banco.flush()
+        return len(self.incluidas)
+
+    def excluir_despesa(self):
+        # Uma exclusão em lote (executemany), como a seleção múltipla da tabela
+        ids = self.incluidas
+        self.banco.executar_varios("DELETE FROM despesas WHERE id = ?", [(despesa_id,) for despesa_id in ids])
+        self.banco.flush()
+        self.incluidas = []
+        return len(ids)
+
+    def gerar_relatorio(self):
+        if self.dados is None:
+            self.carregar_dados()
+        despesas, _, _, _, compras = self.dados
+        linhas = 0
+        for dimensoes in (["categoria"], ["ano", "mes"], ["pagamento", "cartao"]):
+            linhas += len(linhas_relatorio(despesas, compras, dimensoes))
+        return linhas
+
+    def salvar_no_excel(self):
+        exportacao = ExportacaoExcel(self.planilha, "0,00", 0)
+        exportacao.executar(self.banco.conn)
+        if exportacao.erro:
+            raise exportacao.erro
+        return exportacao.progresso
+
+    def importar_planilha(self):
+        # Importa a planilha exportada num banco vazio (o banco medido não cresce)
+        if not os.path.exists(self.planilha):
+            self.salvar_no_excel()
+        destino = os.path.join(self.pasta_temporaria, f"importacao_{time.perf_counter_ns()}.db")
+        banco = FilaEscrita(abrir_conexao(destino))
+        try:
+            preparar_banco(banco)
+            importacao = ImportacaoPlanilha(self.planilha)
+            importacao.executar(banco)
+        finally:
+            banco.conn.close()
+        for sufixo in ("", "-wal", "-shm"):
+            if os.path.exists(destino + sufixo):
+                os.remove(destino + sufixo)
+        if importacao.erro:
+            raise importacao.erro
+        return len(importacao.importadas)
+
+
+def medir(funcao, repeticoes, antes=None, depois=None):
+    amostras = []
+    itens = 0
+    for _ in range(repeticoes):
+        if antes is not None:
+            antes()
+        inicio = time.perf_counter()
+        itens = funcao()
+        amostras.append(time.perf_counter() - inicio)
+        if depois is not None:
+            depois()
+    return {
+        "itens": itens,
+        "mediana_s": statistics.median(amostras),
+        "min_s": min(amostras),
+        "max_s": max(amostras),
+        "amostras_s": [round(a, 6) for a in amostras],
+    }
+
+
+def executar(tamanhos, operacoes, repeticoes, pasta):
+    resultados = {}
+    for quantidade in tamanhos:
+        caminho = obter_banco(pasta, quantidade)
+        with tempfile.TemporaryDirectory() as pasta_temporaria:
+            bancada = Bancada(caminho, pasta_temporaria)
+            try:
+                resultados[str(quantidade)] = por_operacao = {}
+                for operacao in OPERACOES:
+                    if operacao not in operacoes:
+                        continue
+                    antes, depois = (getattr(bancada, passos[operacao]) if operacao in passos else None
+                                     for passos in (PREPARO, LIMPEZA))
+                    por_operacao[operacao] = medir(getattr(bancada, operacao), repeticoes, antes, depois)
+                    print(f"{quantidade:>9} {operacao:<20} {por_operacao[operacao]['mediana_s'] * 1000:>10.1f} ms",
+                          file=sys.stderr)
+            finally:
+                bancada.fechar()
+    return {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+        "versao_esquema": MigracoesBanco.VERSAO,
+        "repeticoes": repeticoes,
+        "resultados": resultados,
+    }
+
+
+def comparar(atual, anterior, tolerancia):
+    # Razão atual/anterior das medianas; acima de 1 + tolerância é marcada como regressão
+    regressoes = 0
+    print(f"{'Tamanho':>9} {'Operação':<20} {'Anterior':>11} {'Atual':>11} {'Razão':>7}")
+    for tamanho, por_operacao in atual["resultados"].items():
+        for operacao, medida in por_operacao.items():
+            base = anterior.get("resultados", {}).get(tamanho, {}).get(operacao)
+            if base is None or not base["mediana_s"]:
+                continue
+            razao = medida["mediana_s"] / base["mediana_s"]
+            marca = "  REGRESSÃO" if razao > 1 + tolerancia else ""
+            regressoes += bool(marca)
+            print(f"{tamanho:>9} {operacao:<20} {base['mediana_s'] * 1000:>9.1f}ms "
+                  f"{medida['mediana_s'] * 1000:>9.1f}ms {razao:>6.2f}x{marca}")
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m rastreador_bench",
+                                     description="Mede as operações principais em bancos sintéticos.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=list(TAMANHOS), help="quantidades de despesas")
+    parser.add_argument("--operacoes", nargs="+", choices=OPERACOES, default=list(OPERACOES))
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--pasta", default="bench_dados", help="onde ficam os bancos gerados (reaproveitados)")
+    parser.add_argument("--saida", default="bench_resultados.json")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior para comparar as medianas")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="folga antes de marcar regressão (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+    resultado = executar(args.tamanhos, set(args.operacoes), args.repeticoes, args.pasta)
+    with open(args.saida, "w", encoding="utf-8") as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+    print(f"Resultados gravados em {args.saida}", file=sys.stderr)
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            anterior = json.load(arquivo)
+        if comparar(resultado, anterior, args.tolerancia):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+# Linha de comando do Rastreador de Gastos: não importa Tk nem ttkbootstrap (e o openpyxl
+# só em import/export), então roda em servidores sem tela e em tarefas do cron.
+#   python -m rastreador_cli add "Mercado" 152,30 05/03/2025 --categoria Alimentação --pagamento PIX
+#   python -m rastreador_cli report --por categoria pagamento
+#   python -m rastreador_cli annual relatorio_anual.txt --particao mes --processos 8
+#   python -m rastreador_cli backup
+#   python -m rastreador_cli rebuild
+import argparse
+import sys
+from datetime import datetime
+
+from rastreador_dados import (
+    ARQUIVO_BANCO, FORMAS_PAGAMENTO, MESES, abrir_conexao, formatar_moeda, para_centavos, FilaEscrita, MigracoesBanco,
+    DespesasColunares, MotorRelatorios, ComprasParceladas, ExportacaoExcel, ImportacaoPlanilha,
+    SnapshotBanco, AgendadorSnapshots, RestauracaoBanco, RelatorioLote, preparar_banco, inserir_despesa, linhas_relatorio
+)
+
+
+class ErroComando(Exception):
+    # Falha já explicada ao usuário (mensagem pronta, sem traceback)
+    pass
+
+
+def abrir_banco(caminho_db):
+    # Conexão de escrita sem threads: a FilaEscrita sem "agendar" só grava no flush()
+    banco = FilaEscrita(abrir_conexao(caminho_db))
+    try:
+        preparar_banco(banco)
+    except Exception:
+        banco.conn.close()
+        raise
+    return banco
+
+
+def fechar_banco(banco):
+    try:
+        banco.flush()
+    finally:
+        banco.conn.close()
+
+
+def comando_add(args):
+    try:
+        vencimento = datetime.strptime(args.vencimento, "%d/%m/%Y")
+    except ValueError:
+        raise ErroComando("Data de vencimento inválida. Use o formato dd/mm/aaaa.")
+    linha = (args.ano or vencimento.year, args.mes or MESES[vencimento.month - 1], args.despesa, args.valor,
+             args.vencimento, args.categoria, args.observacao, args.pagamento, args.cartao)
+    try:
+        despesa = ImportacaoPlanilha.normalizar(linha)
+    except ValueError as e:
+        raise ErroComando(f"Despesa inválida: {e}.")
+    if not 1 <= args.parcelas <= 48:
+        raise ErroComando("O número de parcelas deve estar entre 1 e 48.")
+    banco = abrir_banco(args.banco)
+    try:
+        if args.parcelas > 1:
+            nome, valor, vencimento_texto, categoria, observacao, pagamento, cartao = despesa[2:]
+            novas, _ = ComprasParceladas.registrar(
+                banco, (nome, valor, args.parcelas, vencimento_texto, categoria, observacao, pagamento, cartao)
+            )
+            print(f"Compra em {args.parcelas} parcelas registrada ({len(novas)} já lançada(s)).")
+        else:
+            despesa_id = inserir_despesa(banco, despesa)
+            print(f"Despesa {despesa_id} adicionada: {despesa[2]} R$ {formatar_moeda(despesa[3])}.")
+    finally:
+        fechar_banco(banco)
+
+
+def comando_import(args):
+    banco = abrir_banco(args.banco)
+    try:
+        importacao = ImportacaoPlanilha(args.arquivo)
+        importacao.executar(banco)
+    finally:
+        fechar_banco(banco)
+    if importacao.erro:
+        raise ErroComando(f"Erro ao importar planilha: {importacao.erro}")
+    for rejeitada in importacao.rejeitadas:
+        print(rejeitada, file=sys.stderr)
+    print(f"{len(importacao.importadas)} despesas importadas, {importacao.quantidade_rejeitadas} rejeitadas.")
+
+
+def comando_export(args):
+    try:
+        orcamento = para_centavos(args.orcamento)
+    except ValueError:
+        raise ErroComando("Orçamento inválido.")
+    banco = abrir_banco(args.banco)
+    try:
+        banco.flush()
+        total_gastos = banco.consultar(
+            "SELECT COALESCE(SUM(total), 0) FROM resumo_mensal WHERE pagamento IN ('Débito', 'PIX')"
+        )[0][0]
+        exportacao = ExportacaoExcel(args.arquivo, formatar_moeda(orcamento), max(orcamento - total_gastos, 0))
+        exportacao.executar(banco.conn)
+    finally:
+        fechar_banco(banco)
+    if exportacao.erro:
+        raise ErroComando(f"Erro ao salvar no Excel: {exportacao.erro}")
+    print(f"{exportacao.progresso} linhas exportadas para {args.arquivo}.")
+
+
+def comando_report(args):
+    banco = abrir_banco(args.banco)
+    try:
+        cursor = banco.conn.cursor()
+        despesas = DespesasColunares()
+        despesas.carregar(cursor)
+        compras = ComprasParceladas.carregar(cursor)
+    finally:
+        fechar_banco(banco)
+    print("\n".join(linhas_relatorio(despesas, compras, args.por)))
+
+
+def comando_annual(args):
+    # Grava o que estiver pendente (e migra o esquema) antes de os processos lerem o arquivo
+    fechar_banco(abrir_banco(args.banco))
+    relatorio = RelatorioLote(args.banco, args.destino, por_mes=args.particao == "mes", processos=args.processos)
+    relatorio.executar()
+    if relatorio.erro:
+        raise ErroComando(f"Erro no relatório em lote: {relatorio.erro}")
+    print(f"Relatório gravado em {args.destino} ({relatorio.total} partes, {relatorio.processos} processos, "
+          f"{relatorio.duracao:.2f} s).")
+
+
+def comando_rebuild(args):
+    # Recalcula o resumo mensal a partir das despesas (os triggers o mantêm em dia; serve
+    # de reparo se alguma ferramenta apagou os triggers ou editou a tabela)
+    banco = abrir_banco(args.banco)
+    try:
+        banco.flush()
+        MigracoesBanco(banco.conn).reconstruir_resumo()
+        banco.conn.commit()
+        grupos = banco.consultar("SELECT COUNT(*) FROM resumo_mensal")[0][0]
+    finally:
+        fechar_banco(banco)
+    print(f"Resumo mensal reconstruído ({grupos} grupos).")
+
+
+def comando_backup(args):
+    # Sem destino: snapshot na pasta de backups com retenção, como o agendamento automático
+    agendador = AgendadorSnapshots(args.banco, pasta=args.pasta, manter=args.manter)
+    if args.destino:
+        snapshot = SnapshotBanco(args.banco, args.destino)
+        snapshot.executar()
+        agendador.registrar(snapshot)
+    else:
+        snapshot = agendador.executar_agora()
+    if snapshot.erro:
+        raise ErroComando(f"Erro no backup: {snapshot.erro}")
+    print(f"Backup realizado em {snapshot.destino} ({snapshot.tamanho / 1024:.0f} KB em {snapshot.duracao:.2f} s).")
+
+
+def comando_restore(args):
+    # O aplicativo não deve estar aberto com o mesmo banco durante a troca do arquivo
+    restauracao = RestauracaoBanco(args.arquivo, args.banco)
+    restauracao.iniciar()
+    restauracao.thread.join()
+    if restauracao.erro:
+        raise ErroComando(f"Erro ao restaurar backup: {restauracao.erro}")
+    if restauracao.problemas:
+        raise ErroComando("O backup está corrompido ou incompatível e não foi restaurado:\n"
+                          + "\n".join(restauracao.problemas))
+    try:
+        restauracao.aplicar()
+    except Exception:
+        restauracao.descartar()
+        raise
+    # Leva o banco restaurado até a versão atual do esquema
+    fechar_banco(abrir_banco(args.banco))
+    print(f"Backup {args.arquivo} restaurado em {args.banco}.")
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(prog="python -m rastreador_cli", description="Rastreador de Gastos sem interface gráfica.")
+    parser.add_argument("--banco", default=ARQUIVO_BANCO, help=f"arquivo do banco SQLite (padrão: {ARQUIVO_BANCO})")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    add = comandos.add_parser("add", help="adiciona uma despesa ou compra parcelada")
+    add.add_argument("despesa")
+    add.add_argument("valor", help="valor em reais (ex.: 152,30); total da compra se parcelada")
+    add.add_argument("vencimento", help="dd/mm/aaaa (da 1ª parcela, se parcelada)")
+    add.add_argument("--categoria", default="Outros")
+    add.add_argument("--observacao", default="")
+    add.add_argument("--pagamento", choices=FORMAS_PAGAMENTO, default=FORMAS_PAGAMENTO[0])
+    add.add_argument("--cartao", default="", help="cartão utilizado (com --pagamento 'Cartão de Crédito')")
+    add.add_argument("--parcelas", type=int, default=1)
+    add.add_argument("--ano", help="padrão: ano do vencimento")
+    add.add_argument("--mes", help="nome ou número (padrão: mês do vencimento)")
+    add.set_defaults(funcao=comando_add)
+
+    importar = comandos.add_parser("import", help="importa despesas de uma planilha .xlsx")
+    importar.add_argument("arquivo")
+    importar.set_defaults(funcao=comando_import)
+
+    exportar = comandos.add_parser("export", help="exporta despesas e cartões para .xlsx")
+    exportar.add_argument("arquivo")
+    exportar.add_argument("--orcamento", default="0", help="orçamento mensal impresso na planilha")
+    exportar.set_defaults(funcao=comando_export)
+
+    relatorio = comandos.add_parser("report", help="imprime o relatório de despesas")
+    relatorio.add_argument("--por", nargs="*", default=[], choices=list(MotorRelatorios.DIMENSOES),
+                           help="dimensões da tabela cruzada")
+    relatorio.set_defaults(funcao=comando_report)
+
+    anual = comandos.add_parser("annual", help="relatório de vários anos em lote, em paralelo, num arquivo texto")
+    anual.add_argument("destino")
+    anual.add_argument("--particao", choices=["ano", "mes"], default="ano", help="como dividir as despesas entre os processos")
+    anual.add_argument("--processos", type=int, help="padrão: número de núcleos")
+    anual.set_defaults(funcao=comando_annual)
+
+    reconstruir = comandos.add_parser("rebuild", help="recalcula o resumo mensal a partir das despesas")
+    reconstruir.set_defaults(funcao=comando_rebuild)
+
+    backup = comandos.add_parser("backup", help="cópia consistente do banco")
+    backup.add_argument("destino", nargs="?", help="arquivo .db (padrão: snapshot na pasta de backups)")
+    backup.add_argument("--pasta", default="backups")
+    backup.add_argument("--manter", type=int, default=10, help="snapshots mantidos na pasta")
+    backup.set_defaults(funcao=comando_backup)
+
+    restaurar = comandos.add_parser("restore", help="restaura um backup (com o aplicativo fechado)")
+    restaurar.add_argument("arquivo")
+    restaurar.set_defaults(funcao=comando_restore)
+    return parser
+
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    try:
+        args.funcao(args)
+    except Exception as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2199 @@
+# Camada de dados do Rastreador de Gastos: banco SQLite (conexão, fila de escrita,
+# migrações, backup/restauração), estruturas em memória, relatórios e Excel.
+# Não depende de Tk: é usada pela interface e pela linha de comando (rastreador_cli).
+import calendar
+import cProfile
+import io
+import json
+import multiprocessing
+import os
+import pstats
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+import tracemalloc
+from array import array
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ARQUIVO_BANCO = "financeiro.db"
+MESES = [
+    "Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho",
+    "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"
+]
+FORMAS_PAGAMENTO = ["VR", "Cartão de Crédito", "PIX", "Débito"]
+
+
+def _fts5_disponivel():
+    # O SQLite embutido no Python quase sempre traz o FTS5; sem ele a busca usa LIKE
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE teste USING fts5(texto)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+FTS5_DISPONIVEL = _fts5_disponivel()
+
+
+def abrir_conexao(caminho_db, timeout=10.0, **kwargs):
+    # Conexão com os ajustes de desempenho usados em todo o app (WAL é persistente no arquivo)
+    conn = sqlite3.connect(caminho_db, timeout=timeout, **kwargs)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-20000")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def para_centavos(valor):
+    # Único ponto de leitura de dinheiro: número ou texto ("1.234,56", "1234.56", "R$ 10")
+    # vira um inteiro de centavos, com arredondamento comercial; ValueError se inválido
+    if isinstance(valor, str):
+        valor = valor.replace("R$", "").replace(" ", "").strip()
+        if "," in valor:
+            valor = valor.replace(".", "").replace(",", ".")
+    elif isinstance(valor, float):
+        valor = repr(valor)
+    try:
+        return int((Decimal(valor) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError(f"valor inválido: {valor!r}")
+
+
+def formatar_moeda(centavos):
+    # Centavos no formato exibido em toda a interface: "1234,56" (sem o "R$")
+    sinal = "-" if centavos < 0 else ""
+    reais, resto = divmod(abs(int(centavos)), 100)
+    return f"{sinal}{reais},{resto:02d}"
+
+
+def dia_epoca(data):
+    # Dias desde 01/01/1970, o mesmo valor gravado em despesas.vencimento_dia
+    return (data - date(1970, 1, 1)).days
+
+
+def dia_epoca_texto(texto):
+    # Versão para o texto dd/mm/aaaa das despesas; None se a data for inválida
+    try:
+        dia, mes, ano = texto.split("/")
+        return dia_epoca(date(int(ano), int(mes), int(dia)))
+    except (AttributeError, ValueError):
+        return None
+
+
+def ciclo_fatura(data, dia_fechamento):
+    # Ciclo da fatura (aaaamm do mês de fechamento) em que cai uma compra feita em "data";
+    # sem dia de fechamento cadastrado, a fatura fecha no fim do mês
+    ano, mes = data.year, data.month
+    if data.day > (dia_fechamento or 31):
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    return ano * 100 + mes
+
+
+def somar_meses_data(data, meses):
+    # Mesmo dia "meses" depois, limitado ao fim do mês (31/01 + 1 mês = 28/02 ou 29/02)
+    ano, mes = divmod(data.year * 12 + data.month - 1 + meses, 12)
+    return date(ano, mes + 1, min(data.day, calendar.monthrange(ano, mes + 1)[1]))
+
+
+def somar_meses_ciclo(ciclo, meses):
+    ano, mes = divmod(ciclo, 100)
+    ano, mes = divmod(ano * 12 + mes - 1 + meses, 12)
+    return ano * 100 + mes + 1
+
+
+def data_do_ciclo(ciclo, dia):
+    # O dia é limitado ao tamanho do mês (fechamento no dia 31 em fevereiro cai no dia 28/29)
+    ano, mes = divmod(ciclo, 100)
+    return date(ano, mes, min(dia, calendar.monthrange(ano, mes)[1]))
+
+
+def vencimento_fatura(ciclo, dia_fechamento, dia_vencimento):
+    # Vence no mês do fechamento se o dia de vencimento vier depois dele; senão no mês seguinte
+    if dia_vencimento > (dia_fechamento or 31):
+        return data_do_ciclo(ciclo, dia_vencimento)
+    return data_do_ciclo(somar_meses_ciclo(ciclo, 1), dia_vencimento)
+
+
+def sql_ciclo_fatura(dia, cartao):
+    # Mesmo cálculo de ciclo_fatura em SQL ("dia" em dias desde 1970), com o dia de
+    # fechamento lido da tabela cartoes
+    fechamento = f"COALESCE((SELECT MIN(dia_fechamento) FROM cartoes WHERE TRIM(nome_cartao) = {cartao}), 31)"
+    return (f"CAST(strftime('%Y%m', {dia} * 86400, 'unixepoch', 'start of month', "
+            f"CASE WHEN CAST(strftime('%d', {dia} * 86400, 'unixepoch') AS INTEGER) > {fechamento} "
+            f"THEN '+1 month' ELSE '+0 months' END) AS INTEGER)")
+
+
+def sql_dia_epoca(coluna):
+    # Expressão SQL que converte um texto dd/mm/aaaa (ou d/m/aaaa, aceito pelo app desde a
+    # primeira versão) em dias desde 01/01/1970, como dia_epoca_texto (NULL se inválido).
+    # A volta por date(..., '+0 days') recusa dias inexistentes, que o SQLite normaliza (31/02 -> 03/03)
+    resto = f"substr({coluna}, instr({coluna}, '/') + 1)"
+    dia = f"substr({coluna}, 1, instr({coluna}, '/') - 1)"
+    mes = f"substr({resto}, 1, instr({resto}, '/') - 1)"
+    ano = f"substr({resto}, instr({resto}, '/') + 1)"
+    iso = f"printf('%s-%02d-%02d', {ano}, {mes}, {dia})"
+    formatos = " OR ".join(f"{coluna} GLOB '{d}/{m}/[0-9][0-9][0-9][0-9]'"
+                           for d in ("[0-9]", "[0-9][0-9]") for m in ("[0-9]", "[0-9][0-9]"))
+    return f"CASE WHEN ({formatos}) AND date({iso}, '+0 days') = {iso} THEN CAST(julianday({iso}) - 2440587.5 AS INTEGER) END"
+
+
+class FilaEscrita:
+    # Write-behind com group commit: cada gravação executa na hora na conexão de escrita
+    # (leituras e lastrowid continuam valendo), mas o COMMIT é agrupado e só acontece ao
+    # atingir "tamanho_lote" operações ou após "intervalo_ms" — um fsync para várias gravações.
+    # Sem "agendar", quem é dono da conexão chama flush() quando fica ocioso (ExecutorBanco).
+    def __init__(self, conn, agendar=None, intervalo_ms=250, tamanho_lote=200):
+        self.conn = conn
+        self.agendar = agendar
+        self.intervalo_ms = intervalo_ms
+        self.tamanho_lote = tamanho_lote
+        self.pendentes = 0
+        self._agendado = False
+        self._em_tarefa = False
+        self._savepoint = False
+        self._pendentes_antes = 0
+
+    def executar(self, sql, parametros=()):
+        self._abrir_savepoint()
+        cursor = self.conn.execute(sql, parametros)
+        self._registrar(1)
+        return cursor
+
+    def consultar(self, sql, parametros=()):
+        return self.conn.execute(sql, parametros).fetchall()
+
+    def executar_varios(self, sql, lista_parametros):
+        lista_parametros = list(lista_parametros)
+        self._abrir_savepoint()
+        cursor = self.conn.executemany(sql, lista_parametros)
+        self._registrar(len(lista_parametros))
+        return cursor
+
+    @contextmanager
+    def tarefa(self):
+        # Tarefa do ExecutorBanco: suas gravações ficam num SAVEPOINT dentro do lote e, se
+        # ela falhar, são desfeitas antes do próximo commit (nada pela metade é gravado).
+        # O commit por tamanho de lote espera a tarefa terminar; flush() explícito grava
+        # o que veio antes, e as gravações seguintes abrem um novo SAVEPOINT
+        self._em_tarefa = True
+        try:
+            yield self
+        except BaseException:
+            if self._savepoint:
+                if self._pendentes_antes:
+                    self.conn.execute("ROLLBACK TO tarefa")
+                    self.conn.execute("RELEASE tarefa")
+                else:
+                    # O lote só tinha esta tarefa: desfaz tudo e libera o banco
+                    self.conn.rollback()
+                self.pendentes = self._pendentes_antes
+            raise
+        else:
+            if self._savepoint:
+                self.conn.execute("RELEASE tarefa")
+        finally:
+            self._em_tarefa = False
+            self._savepoint = False
+
+    def _abrir_savepoint(self):
+        # A transação do lote é aberta antes: um SAVEPOINT fora dela faria commit no RELEASE
+        if self._em_tarefa and not self._savepoint:
+            if not self.conn.in_transaction:
+                self.conn.execute("BEGIN")
+            self.conn.execute("SAVEPOINT tarefa")
+            self._savepoint = True
+            self._pendentes_antes = self.pendentes
+
+    def _registrar(self, quantidade):
+        self.pendentes += quantidade
+        if self._em_tarefa:
+            return
+        if self.pendentes >= self.tamanho_lote:
+            self.flush()
+        elif self.agendar is not None and not self._agendado:
+            self._agendado = True
+            self.agendar(self.intervalo_ms, self._ao_expirar)
+
+    def _ao_expirar(self):
+        self._agendado = False
+        self.flush()
+
+    def flush(self):
+        if self.pendentes:
+            self.conn.commit()
+            self.pendentes = 0
+            self._savepoint = False
+
+
+def memoria_pico_kb():
+    # Pico de memória residente do processo (ru_maxrss vem em bytes no macOS); None no Windows
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico // 1024 if sys.platform == "darwin" else pico
+
+
+class AcaoMedida:
+    # Uma ação do usuário em medição. "pendentes" conta o próprio tratador mais as tarefas
+    # de banco e callbacks ainda não concluídos; a ação termina quando chega a zero.
+    def __init__(self, nome, perfilar=False):
+        self.nome = nome
+        self.data = datetime.now()
+        self.inicio = time.perf_counter()
+        self.tempo_ui = 0.0
+        self.tempo_banco = 0.0
+        self.pausa = 0.0
+        self.linhas = 0
+        self.pendentes = 1
+        self.memoria_inicial = memoria_pico_kb()
+        # Com perfil: um cProfile por trecho executado (interface ou banco), somados no fim
+        self.perfis = [] if perfilar else None
+        self.registro = None
+
+
+class Diagnostico:
+    # Instrumentação das ações do usuário: tempo na thread da interface (sem o tempo com
+    # diálogos abertos), tempo das tarefas de banco disparadas pela ação, linhas gravadas
+    # ou lidas e pico de memória do processo. As ações concluídas ficam em "recentes" e
+    # num JSONL com rotação por tamanho. perfilar_proxima captura a próxima ação com cProfile.
+    def __init__(self, arquivo="diagnostico.jsonl", tamanho_max=1_000_000, manter=200):
+        self.arquivo = arquivo
+        self.tamanho_max = tamanho_max
+        self.recentes = deque(maxlen=manter)
+        self.atual = None
+        self.perfilar_proxima = False
+        self.ultimo_perfil = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acao(self, nome):
+        # Dentro de outra ação (ou de um callback dela) o trecho conta para a ação externa
+        if self.atual is not None:
+            yield self.atual
+            return
+        acao = AcaoMedida(nome, self.perfilar_proxima)
+        if acao.perfis is not None:
+            self.perfilar_proxima = False
+            tracemalloc.start()
+        try:
+            with self.retomar(acao):
+                yield acao
+        finally:
+            self.liberar(acao)
+
+    @contextmanager
+    def retomar(self, acao):
+        # Trecho na thread da interface atribuído à ação (tratador ou callback de tarefa)
+        if acao is None or self.atual is acao:
+            yield
+            return
+        anterior, self.atual = self.atual, acao
+        perfil = self._iniciar_perfil(acao)
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            acao.tempo_ui += time.perf_counter() - inicio
+            self._encerrar_perfil(acao, perfil)
+            self.atual = anterior
+
+    @contextmanager
+    def pausado(self):
+        # Tempo com um diálogo modal aberto (o usuário lendo ou escolhendo arquivo) não conta
+        acao = self.atual
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            if acao is not None:
+                acao.pausa += time.perf_counter() - inicio
+
+    def vincular(self, acao=None):
+        # Registra mais uma pendência (tarefa ou callback) na ação atual ou na informada
+        acao = acao or self.atual
+        if acao is not None:
+            with self._lock:
+                acao.pendentes += 1
+        return acao
+
+    def liberar(self, acao):
+        if acao is None:
+            return
+        with self._lock:
+            acao.pendentes -= 1
+            concluida = acao.pendentes == 0
+        if concluida:
+            self._concluir(acao)
+
+    def tarefa(self, acao, funcao, recurso, *args):
+        # Executa funcao(recurso, *args) numa thread do banco medindo tempo e linhas; recurso
+        # é a FilaEscrita (escrita) ou a conexão (leitura). Libera a pendência no final.
+        conn = getattr(recurso, "conn", recurso)
+        alteracoes = conn.total_changes
+        perfil = self._iniciar_perfil(acao)
+        inicio = time.perf_counter()
+        try:
+            resultado = funcao(recurso, *args)
+            lidas = len(resultado) if isinstance(resultado, list) else 0
+            with self._lock:
+                acao.linhas += conn.total_changes - alteracoes + lidas
+            return resultado
+        finally:
+            duracao = time.perf_counter() - inicio
+            self._encerrar_perfil(acao, perfil)
+            with self._lock:
+                acao.tempo_banco += duracao
+            self.liberar(acao)
+
+    def _iniciar_perfil(self, acao):
+        if acao.perfis is None:
+            return None
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            # Python 3.12+: só um profiler ativo por vez; este trecho fica sem perfil
+            return None
+        return perfil
+
+    def _encerrar_perfil(self, acao, perfil):
+        if perfil is not None:
+            perfil.disable()
+            with self._lock:
+                acao.perfis.append(perfil)
+
+    def _concluir(self, acao):
+        registro = {
+            "acao": acao.nome,
+            "data": acao.data.isoformat(timespec="seconds"),
+            "total_ms": round((time.perf_counter() - acao.inicio - acao.pausa) * 1000, 1),
+            "interface_ms": round((acao.tempo_ui - acao.pausa) * 1000, 1),
+            "banco_ms": round(acao.tempo_banco * 1000, 1),
+            "linhas": acao.linhas,
+            # Pico do processo inteiro até aqui (não só desta ação); o quanto a ação o
+            # elevou fica em memoria_aumento_kb, e o pico Python dela só com perfil
+            "memoria_pico_processo_kb": memoria_pico_kb(),
+        }
+        if acao.memoria_inicial is not None:
+            registro["memoria_aumento_kb"] = registro["memoria_pico_processo_kb"] - acao.memoria_inicial
+        if acao.perfis is not None:
+            registro["memoria_python_pico_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+            tracemalloc.stop()
+            if acao.perfis:
+                registro["perfil"] = self._salvar_perfil(acao)
+        acao.registro = registro
+        self.recentes.append(registro)
+        with self._lock:
+            try:
+                if os.path.exists(self.arquivo) and os.path.getsize(self.arquivo) > self.tamanho_max:
+                    os.replace(self.arquivo, self.arquivo + ".1")
+                with open(self.arquivo, "a", encoding="utf-8") as arquivo:
+                    arquivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            except OSError:
+                pass
+
+    def _salvar_perfil(self, acao):
+        # .prof ao lado do log (abre no snakeviz/pstats) e resumo em texto para o painel
+        estatisticas = pstats.Stats(*acao.perfis)
+        caminho = os.path.join(os.path.dirname(self.arquivo),
+                               f"perfil_{acao.nome}_{acao.data:%Y%m%d_%H%M%S}.prof")
+        try:
+            estatisticas.dump_stats(caminho)
+        except OSError:
+            caminho = None
+        texto = io.StringIO()
+        estatisticas.stream = texto
+        estatisticas.sort_stats("cumulative").print_stats(30)
+        self.ultimo_perfil = f"{acao.nome} ({acao.data:%d/%m %H:%M:%S})\n{texto.getvalue()}"
+        return caminho
+
+    def mais_lentas(self, quantidade=50):
+        return sorted(self.recentes, key=lambda r: r["total_ms"], reverse=True)[:quantidade]
+
+
+class ExecutorBanco:
+    # Serviço de banco fora da thread da interface. Uma thread dona da conexão de escrita
+    # consome uma fila de tarefas (gravações e as leituras que precisam enxergá-las), com
+    # commit agrupado pela FilaEscrita; consultas pesadas (relatórios, exportação) rodam
+    # num pool de conexões somente leitura, em paralelo às gravações.
+    # Cada tarefa recebe a FilaEscrita (escrita) ou uma conexão (leitura) e devolve um Future.
+    # Com um Diagnostico, cada tarefa conta para a ação do usuário que a submeteu.
+    def __init__(self, caminho_db, leitores=2, diagnostico=None):
+        self.caminho_db = caminho_db
+        self.diagnostico = diagnostico
+        self._tarefas = queue.Queue()
+        self._local = threading.local()
+        self._conexoes_leitura = []
+        self._lock = threading.Lock()
+        self._leitores = ThreadPoolExecutor(max_workers=leitores, thread_name_prefix="leitor-db")
+        self._encerramento = Future()
+        self.encerrado = False
+        self._thread = threading.Thread(target=self._laco, name="escritor-db", daemon=True)
+        self._thread.start()
+
+    def submeter(self, funcao, *args):
+        futuro = Future()
+        with self._lock:
+            # Depois de encerrar() nada mais seria executado: o Future falha na hora
+            if self.encerrado:
+                futuro.set_exception(self._erro_encerrado())
+                return futuro
+            self._tarefas.put((funcao, args, futuro, self._vincular()))
+        return futuro
+
+    @staticmethod
+    def _erro_encerrado():
+        return RuntimeError("a conexão com o banco foi encerrada (restauração de backup ou saída do aplicativo)")
+
+    def _ler(self, acao, funcao, args):
+        return self._leitores.submit(self._executar_leitura, funcao, args, acao)
+
+    def _vincular(self):
+        # Chamado na thread de quem submete: a tarefa conta para a ação atual da interface
+        return self.diagnostico.vincular() if self.diagnostico is not None else None
+
+    def _executar(self, acao, funcao, recurso, args):
+        if acao is None:
+            return funcao(recurso, *args)
+        return self.diagnostico.tarefa(acao, funcao, recurso, *args)
+
+    def ler_consolidado(self, funcao, *args):
+        # Grava o que estiver pendente antes de ler pelo pool (que só vê dados já commitados)
+        futuro = Future()
+
+        def repassar(origem):
+            if origem.exception() is not None:
+                futuro.set_exception(origem.exception())
+            elif origem is not consolidacao:
+                futuro.set_result(origem.result())
+
+        # A leitura é submetida da thread de escrita: leva a ação capturada aqui
+        acao = self.diagnostico.atual if self.diagnostico is not None else None
+
+        def consolidar(banco):
+            banco.flush()
+            if acao is not None:
+                self.diagnostico.vincular(acao)
+            self._ler(acao, funcao, args).add_done_callback(repassar)
+
+        consolidacao = self.submeter(consolidar)
+        consolidacao.add_done_callback(repassar)
+        return futuro
+
+    def encerrar(self):
+        # Grava as pendências, fecha todas as conexões e devolve um Future do encerramento;
+        # tarefas submetidas depois disso são recusadas
+        with self._lock:
+            if not self.encerrado:
+                self.encerrado = True
+                self._tarefas.put(None)
+        return self._encerramento
+
+    @staticmethod
+    def _gravar_lote(banco):
+        try:
+            banco.flush()
+        except sqlite3.Error:
+            # Commit falhou (ex.: banco ocupado): mantém o lote e tenta de novo
+            pass
+
+    def _executar_leitura(self, funcao, args, acao=None):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = abrir_conexao(self.caminho_db, check_same_thread=False)
+            conn.execute("PRAGMA query_only=ON")
+            self._local.conn = conn
+            with self._lock:
+                self._conexoes_leitura.append(conn)
+        return self._executar(acao, funcao, conn, args)
+
+    def _laco(self):
+        banco = None
+        erro = None
+        try:
+            banco = FilaEscrita(abrir_conexao(self.caminho_db))
+            while True:
+                try:
+                    espera = banco.intervalo_ms / 1000 if banco.pendentes else None
+                    tarefa = self._tarefas.get(timeout=espera)
+                except queue.Empty:
+                    self._gravar_lote(banco)
+                    continue
+                if tarefa is None:
+                    break
+                funcao, args, futuro, acao = tarefa
+                if not futuro.set_running_or_notify_cancel():
+                    if self.diagnostico is not None:
+                        self.diagnostico.liberar(acao)
+                    continue
+                try:
+                    with banco.tarefa():
+                        resultado = self._executar(acao, funcao, banco, args)
+                except BaseException as e:
+                    futuro.set_exception(e)
+                else:
+                    futuro.set_result(resultado)
+                if banco.pendentes >= banco.tamanho_lote:
+                    self._gravar_lote(banco)
+            banco.flush()
+        except BaseException as e:
+            erro = e
+        finally:
+            if banco is not None:
+                banco.conn.close()
+            self._leitores.shutdown(wait=True)
+            with self._lock:
+                for conn in self._conexoes_leitura:
+                    conn.close()
+                self._conexoes_leitura = []
+            if erro is None:
+                self._encerramento.set_result(None)
+            else:
+                self._encerramento.set_exception(erro)
+
+
+class CacheAgregados:
+    # Totais acumulados (soma em centavos, quantidade) por (ano, mes, categoria, pagamento,
+    # cartao_utilizado), mais totais derivados por pagamento e categoria em O(1).
+    # Carregado da tabela resumo_mensal (mantida por triggers); os totais por cartão e
+    # ciclo de fatura ficam na tabela faturas.
+    # Inclusões e exclusões atualizam tudo incrementalmente, sem varrer as despesas.
+    def __init__(self):
+        self.limpar()
+
+    def limpar(self):
+        self.por_chave = {}
+        self.por_pagamento = {}
+        self.por_categoria = {}
+        self.total_geral = 0
+        self.quantidade = 0
+        # Conta as mudanças locais (quem recarrega em segundo plano sabe se ficou defasado)
+        self.alteracoes = 0
+
+    def carregar(self, cursor):
+        self.limpar()
+        cursor.execute("SELECT ano, mes, categoria, pagamento, cartao, total, quantidade FROM resumo_mensal")
+        for ano, mes, categoria, pagamento, cartao, soma, quantidade in cursor.fetchall():
+            self._acumular((ano, mes, categoria, pagamento, cartao), soma, quantidade)
+
+    @staticmethod
+    def _valor(despesa):
+        return despesa[3] or 0
+
+    @staticmethod
+    def _chave(despesa):
+        # despesa no formato (Ano, Mês, Despesa, Valor, Vencimento, Categoria, Observação, Pagamento, Cartão);
+        # nulos viram '' como em resumo_mensal
+        ano, mes, categoria, pagamento = ("" if despesa[i] is None else str(despesa[i]) for i in (0, 1, 5, 7))
+        return (ano, mes, categoria, pagamento, (despesa[8] or "").strip())
+
+    def _acumular(self, chave, valor, quantidade):
+        _, _, categoria, pagamento, _ = chave
+        for tabela, k in ((self.por_chave, chave),
+                          (self.por_pagamento, pagamento),
+                          (self.por_categoria, categoria)):
+            atual = tabela.setdefault(k, [0, 0])
+            atual[0] += valor
+            atual[1] += quantidade
+            if atual[1] <= 0:
+                del tabela[k]
+        self.total_geral += valor
+        self.quantidade += quantidade
+        self.alteracoes += 1
+
+    def adicionar(self, despesa):
+        self._acumular(self._chave(despesa), self._valor(despesa), 1)
+
+    def remover(self, despesa):
+        self._acumular(self._chave(despesa), -self._valor(despesa), -1)
+
+    def mesclar(self, outro):
+        # Soma os totais de outro cache (ex.: despesas recém-importadas)
+        for chave, (soma, quantidade) in outro.por_chave.items():
+            self._acumular(chave, soma, quantidade)
+
+    def total_pagamento(self, *pagamentos):
+        return sum(self.por_pagamento.get(p, (0, 0))[0] for p in pagamentos)
+
+    def quantidade_pagamento(self, pagamento):
+        return self.por_pagamento.get(pagamento, (0, 0))[1]
+
+    def totais_por_categoria(self):
+        return {cat: soma for cat, (soma, _) in self.por_categoria.items()}
+
+
+class DicionarioCategorico:
+    # Textos repetidos (ano, mês, categoria, pagamento, cartão) guardados uma única vez;
+    # as colunas armazenam só o código inteiro de cada valor.
+    __slots__ = ("textos", "codigos")
+
+    def __init__(self):
+        self.textos = []
+        self.codigos = {}
+
+    def codigo(self, texto):
+        codigo = self.codigos.get(texto)
+        if codigo is None:
+            codigo = self.codigos[texto] = len(self.textos)
+            self.textos.append(texto)
+        return codigo
+
+
+class DespesasColunares:
+    # Despesas em memória por colunas: valor (centavos) em array('q'), vencimento em array('i')
+    # (aaaammdd), campos repetidos como códigos de DicionarioCategorico em array('I') e
+    # apenas os textos livres (despesa, observação) em listas. Interface de dicionário
+    # {id: (Ano, Mês, Despesa, Valor, Vencimento, Categoria, Observação, Pagamento, Cartão)}:
+    # cada linha é montada sob demanda. Exclusão em O(1) movendo a última linha para o buraco.
+    __slots__ = ("ids", "anos", "meses", "nomes", "valores", "vencimentos", "categorias",
+                 "observacoes", "pagamentos", "cartoes", "dic_ano", "dic_mes", "dic_categoria",
+                 "dic_pagamento", "dic_cartao", "_posicao", "_vencimento_texto")
+
+    def __init__(self, despesas=()):
+        self.ids = array("q")
+        self.anos = array("I")
+        self.meses = array("I")
+        self.nomes = []
+        self.valores = array("q")
+        self.vencimentos = array("i")
+        self.categorias = array("I")
+        self.observacoes = []
+        self.pagamentos = array("I")
+        self.cartoes = array("I")
+        self.dic_ano = DicionarioCategorico()
+        self.dic_mes = DicionarioCategorico()
+        self.dic_categoria = DicionarioCategorico()
+        self.dic_pagamento = DicionarioCategorico()
+        self.dic_cartao = DicionarioCategorico()
+        self._posicao = {}
+        # Vencimentos fora do formato dd/mm/aaaa são guardados como texto à parte
+        self._vencimento_texto = {}
+        self.update(despesas)
+
+    def _colunas(self):
+        return (self.ids, self.anos, self.meses, self.nomes, self.valores, self.vencimentos,
+                self.categorias, self.observacoes, self.pagamentos, self.cartoes)
+
+    @staticmethod
+    def _data_para_int(texto):
+        try:
+            dia, mes, ano = texto.split("/")
+            numero = int(ano) * 10000 + int(mes) * 100 + int(dia)
+        except (AttributeError, ValueError):
+            return None
+        # Só aceita o que volta idêntico ao texto original
+        return numero if DespesasColunares._int_para_data(numero) == texto else None
+
+    @staticmethod
+    def _int_para_data(numero):
+        return f"{numero % 100:02d}/{numero // 100 % 100:02d}/{numero // 10000}"
+
+    @staticmethod
+    def _valor(valor):
+        return int(valor or 0)
+
+    def _codificar(self, despesa_id, despesa):
+        ano, mes, nome, valor, vencimento, categoria, observacao, pagamento, cartao = despesa
+        data = self._data_para_int(vencimento)
+        if data is None:
+            self._vencimento_texto[despesa_id] = vencimento
+            data = 0
+        else:
+            self._vencimento_texto.pop(despesa_id, None)
+        return (despesa_id, self.dic_ano.codigo(ano), self.dic_mes.codigo(mes), nome,
+                self._valor(valor), data, self.dic_categoria.codigo(categoria), observacao,
+                self.dic_pagamento.codigo(pagamento), self.dic_cartao.codigo(cartao))
+
+    def _linha(self, posicao):
+        despesa_id = self.ids[posicao]
+        data = self.vencimentos[posicao]
+        vencimento = self._int_para_data(data) if data else self._vencimento_texto.get(despesa_id)
+        return (self.dic_ano.textos[self.anos[posicao]], self.dic_mes.textos[self.meses[posicao]],
+                self.nomes[posicao], self.valores[posicao], vencimento,
+                self.dic_categoria.textos[self.categorias[posicao]], self.observacoes[posicao],
+                self.dic_pagamento.textos[self.pagamentos[posicao]],
+                self.dic_cartao.textos[self.cartoes[posicao]])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, despesa_id):
+        return despesa_id in self._posicao
+
+    def __iter__(self):
+        return iter(list(self.ids))
+
+    def __getitem__(self, despesa_id):
+        return self._linha(self._posicao[despesa_id])
+
+    def __setitem__(self, despesa_id, despesa):
+        campos = self._codificar(despesa_id, despesa)
+        posicao = self._posicao.get(despesa_id)
+        if posicao is None:
+            self._posicao[despesa_id] = len(self.ids)
+            for coluna, campo in zip(self._colunas(), campos):
+                coluna.append(campo)
+        else:
+            for coluna, campo in zip(self._colunas(), campos):
+                coluna[posicao] = campo
+
+    def get(self, despesa_id, padrao=None):
+        posicao = self._posicao.get(despesa_id)
+        return padrao if posicao is None else self._linha(posicao)
+
+    def pop(self, despesa_id, *padrao):
+        posicao = self._posicao.pop(despesa_id, None)
+        if posicao is None:
+            if padrao:
+                return padrao[0]
+            raise KeyError(despesa_id)
+        despesa = self._linha(posicao)
+        ultima = len(self.ids) - 1
+        colunas = self._colunas()
+        if posicao != ultima:
+            for coluna in colunas:
+                coluna[posicao] = coluna[ultima]
+            self._posicao[self.ids[posicao]] = posicao
+        for coluna in colunas:
+            coluna.pop()
+        self._vencimento_texto.pop(despesa_id, None)
+        return despesa
+
+    def update(self, despesas):
+        itens = despesas.items() if hasattr(despesas, "items") else despesas
+        for despesa_id, despesa in itens:
+            self[despesa_id] = despesa
+
+    def items(self):
+        return ((self.ids[posicao], self._linha(posicao)) for posicao in range(len(self.ids)))
+
+    def values(self):
+        return (self._linha(posicao) for posicao in range(len(self.ids)))
+
+    def carregar(self, cursor, tamanho_lote=5000):
+        # Lê as despesas do banco em blocos, sem materializar a lista inteira de tuplas
+        cursor.execute("SELECT id, ano, mes, despesa, valor, vencimento, categoria, observacao, pagamento, cartao_utilizado FROM despesas")
+        while True:
+            linhas = cursor.fetchmany(tamanho_lote)
+            if not linhas:
+                break
+            for linha in linhas:
+                self[linha[0]] = linha[1:]
+
+
+class MotorRelatorios:
+    # Relatórios vetorizados: as colunas de DespesasColunares viram arrays NumPy uma vez e
+    # cada agrupamento (qualquer combinação de dimensões) sai de um np.unique sobre a chave
+    # combinada mais um np.bincount ponderado pelo valor — sem laço Python por despesa.
+    # Os códigos de cada dimensão são renumerados na ordem de exibição (meses no calendário).
+    # O NumPy só é importado aqui, quando um relatório é de fato montado: a interface e a
+    # linha de comando não pagam o custo dele na abertura.
+    DIMENSOES = {"ano": "Ano", "mes": "Mês", "categoria": "Categoria", "pagamento": "Pagamento", "cartao": "Cartão"}
+    MAX_CHAVES_DIRETAS = 1 << 20
+
+    def __init__(self, despesas):
+        # Centavos: somas inteiras exatas (bincount acumula em float64, exato até 2**53)
+        import numpy as np
+        self.valores = np.array(despesas.valores, dtype=np.int64)
+        self.codigos = {}
+        self.rotulos = {}
+        colunas = {
+            "ano": (despesas.anos, despesas.dic_ano),
+            "mes": (despesas.meses, despesas.dic_mes),
+            "categoria": (despesas.categorias, despesas.dic_categoria),
+            "pagamento": (despesas.pagamentos, despesas.dic_pagamento),
+            "cartao": (despesas.cartoes, despesas.dic_cartao),
+        }
+        for dimensao, (coluna, dicionario) in colunas.items():
+            textos = dicionario.textos
+            ordem = sorted(range(len(textos)), key=lambda codigo: self._ordem(dimensao, textos[codigo]))
+            posicao = np.empty(len(textos), dtype=np.int64)
+            posicao[ordem] = np.arange(len(textos))
+            self.codigos[dimensao] = posicao[np.array(coluna, dtype=np.int64)]
+            self.rotulos[dimensao] = [textos[codigo] for codigo in ordem]
+
+    @staticmethod
+    def _ordem(dimensao, texto):
+        texto = "" if texto is None else str(texto).strip()
+        if dimensao == "mes":
+            return (MESES.index(texto) if texto in MESES else len(MESES), texto)
+        return (0, texto)
+
+    @property
+    def total_geral(self):
+        return int(self.valores.sum())
+
+    def _chave(self, dimensoes):
+        import numpy as np
+        chave = np.zeros(len(self.valores), dtype=np.int64)
+        for dimensao in dimensoes:
+            chave = chave * len(self.rotulos[dimensao]) + self.codigos[dimensao]
+        return chave
+
+    def agrupar(self, *dimensoes):
+        # [(rótulos, total, quantidade)] ordenado pelas dimensões na ordem pedida
+        import numpy as np
+        if not len(self.valores):
+            return []
+        chave = self._chave(dimensoes)
+        formato = tuple(len(self.rotulos[d]) for d in dimensoes)
+        if np.prod(formato) <= self.MAX_CHAVES_DIRETAS:
+            # Espaço de chaves pequeno: bincount direto na chave, O(n) sem ordenação
+            totais = np.bincount(chave, weights=self.valores, minlength=int(np.prod(formato)))
+            quantidades = np.bincount(chave, minlength=len(totais))
+            grupos = np.flatnonzero(quantidades)
+            totais, quantidades = totais[grupos], quantidades[grupos]
+        else:
+            grupos, inverso = np.unique(chave, return_inverse=True)
+            totais = np.bincount(inverso, weights=self.valores, minlength=len(grupos))
+            quantidades = np.bincount(inverso, minlength=len(grupos))
+        totais = np.rint(totais).astype(np.int64)
+        codigos = np.unravel_index(grupos, formato)
+        rotulos = zip(*(np.array(self.rotulos[d], dtype=object)[c] for d, c in zip(dimensoes, codigos)))
+        return list(zip(rotulos, totais.tolist(), quantidades.tolist()))
+
+    def evolucao_mensal(self):
+        # [(ano, mês, total, diferença, variação %)] em relação ao mês anterior com despesas;
+        # no primeiro mês diferença e variação são None
+        import numpy as np
+        meses = self.agrupar("ano", "mes")
+        if not meses:
+            return []
+        totais = np.array([total for _, total, _ in meses], dtype=np.int64)
+        diferencas = np.diff(totais)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            variacoes = np.where(totais[:-1] != 0, diferencas / np.abs(totais[:-1]) * 100, np.nan)
+        diferencas = [None] + diferencas.tolist()
+        variacoes = [None] + [None if np.isnan(v) else v for v in variacoes.tolist()]
+        return [(ano, mes, total, diferenca, variacao)
+                for ((ano, mes), _, _), total, diferenca, variacao
+                in zip(meses, totais.tolist(), diferencas, variacoes)]
+
+    def percentis(self, dimensao=None, quantis=(50, 90, 99)):
+        # Percentis do valor por despesa (em centavos), no geral ({(): [...]}) ou por grupo da dimensão
+        import numpy as np
+        if not len(self.valores):
+            return {}
+        if dimensao is None:
+            return {(): np.percentile(self.valores, quantis).tolist()}
+        codigos = self.codigos[dimensao]
+        ordem = np.argsort(codigos, kind="stable")
+        grupos, inicios = np.unique(codigos[ordem], return_index=True)
+        fatias = np.split(self.valores[ordem], inicios[1:])
+        return {self.rotulos[dimensao][grupo]: np.percentile(fatia, quantis).tolist()
+                for grupo, fatia in zip(grupos.tolist(), fatias)}
+
+
+class ComprasParceladas:
+    # Compras em N parcelas: só a compra é gravada (compras_parceladas) e as parcelas saem
+    # sob demanda de gerar_parcelas. Cada parcela vira despesa apenas quando o ciclo de
+    # cobrança dela abre (lancar_vencidas); as projeções de meses futuros percorrem o
+    # gerador sem gravar nada e param no último ciclo pedido.
+    COLUNAS = ("id, despesa, valor_total, parcelas, primeira_parcela, categoria, observacao, "
+               "pagamento, cartao_utilizado, parcelas_lancadas")
+
+    def __init__(self, compras=(), fechamentos=None):
+        # compras: tuplas na ordem de COLUNAS, só as que ainda têm parcelas a lançar
+        self.compras = list(compras)
+        # nome do cartão -> dia de fechamento
+        self.fechamentos = fechamentos or {}
+
+    @classmethod
+    def carregar(cls, cursor):
+        cursor.execute(f"SELECT {cls.COLUNAS} FROM compras_parceladas WHERE parcelas_lancadas < parcelas")
+        compras = cursor.fetchall()
+        cursor.execute("SELECT nome_cartao, dia_fechamento FROM cartoes")
+        return cls(compras, cls.mapear_fechamentos(cursor.fetchall()))
+
+    @staticmethod
+    def mapear_fechamentos(cartoes):
+        # (nome, dia de fechamento) -> {nome: dia}; com nomes repetidos vale o menor dia
+        # informado, como no ciclo calculado em SQL para a tabela faturas
+        fechamentos = {}
+        for nome, dia in cartoes:
+            nome = (nome or "").strip()
+            atual = fechamentos.get(nome)
+            fechamentos[nome] = dia if atual is None or (dia is not None and dia < atual) else atual
+        return fechamentos
+
+    @staticmethod
+    def gerar_parcelas(valor_total, parcelas, primeira_parcela, inicio=1):
+        # (número, data, valor) de cada parcela a partir de "inicio"; os centavos que sobram
+        # da divisão vão para as primeiras parcelas, então a soma é exatamente o total
+        primeira = datetime.strptime(primeira_parcela, "%d/%m/%Y").date()
+        base, resto = divmod(valor_total, parcelas)
+        for numero in range(inicio, parcelas + 1):
+            yield numero, somar_meses_data(primeira, numero - 1), base + (1 if numero <= resto else 0)
+
+    def ciclo_cobranca(self, data, pagamento, cartao):
+        # Cartão: ciclo da fatura; demais formas de pagamento: o próprio mês (aaaamm)
+        if pagamento == "Cartão de Crédito":
+            return ciclo_fatura(data, self.fechamentos.get((cartao or "").strip()))
+        return data.year * 100 + data.month
+
+    def pendentes(self, compra):
+        # (número, data, valor, ciclo) das parcelas ainda não lançadas, sob demanda
+        _, _, valor_total, parcelas, primeira, _, _, pagamento, cartao, lancadas = compra
+        for numero, data, valor in self.gerar_parcelas(valor_total, parcelas, primeira, lancadas + 1):
+            yield numero, data, valor, self.ciclo_cobranca(data, pagamento, cartao)
+
+    def projecao(self, ate_ciclo, cartao=None):
+        # {ciclo: total} das parcelas futuras até "ate_ciclo" (opcionalmente de um só cartão)
+        totais = {}
+        for compra in self.compras:
+            if cartao is not None and (compra[7] != "Cartão de Crédito" or (compra[8] or "").strip() != cartao.strip()):
+                continue
+            for _, _, valor, ciclo in self.pendentes(compra):
+                if ciclo > ate_ciclo:
+                    break
+                totais[ciclo] = totais.get(ciclo, 0) + valor
+        return totais
+
+    def restante_cartao(self, cartao):
+        # Total ainda não lançado das compras parceladas no cartão (compromete o limite)
+        return sum(valor for compra in self.compras
+                   if compra[7] == "Cartão de Crédito" and (compra[8] or "").strip() == cartao.strip()
+                   for _, _, valor, _ in self.pendentes(compra))
+
+    @classmethod
+    def registrar(cls, banco, compra):
+        # compra: (despesa, valor_total, parcelas, primeira_parcela, categoria, observacao,
+        # pagamento, cartao_utilizado). Grava a compra e lança as parcelas já abertas.
+        banco.executar(
+            "INSERT INTO compras_parceladas (despesa, valor_total, parcelas, primeira_parcela, categoria, "
+            "observacao, pagamento, cartao_utilizado) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            compra
+        )
+        return cls.lancar_vencidas(banco)
+
+    @classmethod
+    def lancar_vencidas(cls, banco, hoje=None):
+        # Grava como despesas as parcelas cujo ciclo de cobrança já abriu; devolve
+        # {id: despesa} das despesas criadas e as compras que continuam com parcelas futuras
+        hoje = hoje or date.today()
+        agenda = cls.carregar(banco.conn.cursor())
+        novas = {}
+        for compra in agenda.compras:
+            compra_id, nome, _, parcelas, _, categoria, observacao, pagamento, cartao, _ = compra
+            ultima = None
+            for numero, data, valor, ciclo in agenda.pendentes(compra):
+                if ciclo > agenda.ciclo_cobranca(hoje, pagamento, cartao):
+                    break
+                vencimento = data.strftime("%d/%m/%Y")
+                despesa = (str(data.year), MESES[data.month - 1], f"{nome} ({numero}/{parcelas})", valor,
+                           vencimento, categoria, observacao, pagamento, cartao)
+                cursor = banco.executar(
+                    "INSERT INTO despesas (ano, mes, despesa, valor, vencimento, categoria, observacao, pagamento, "
+                    "cartao_utilizado, vencimento_dia, compra_id, parcela) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    despesa + (dia_epoca(data), compra_id, numero)
+                )
+                novas[cursor.lastrowid] = despesa
+                ultima = numero
+            if ultima is not None:
+                banco.executar("UPDATE compras_parceladas SET parcelas_lancadas = ? WHERE id = ?", (ultima, compra_id))
+        return novas, cls.carregar(banco.conn.cursor())
+
+
+class ExportacaoExcel:
+    # Exporta despesas e cartões no modo write-only do openpyxl, lendo as linhas direto
+    # de um cursor SQLite no pool de leitura do ExecutorBanco (em paralelo às gravações).
+    # A interface acompanha "progresso"/"total" e pode pedir o cancelamento a qualquer momento.
+    CABECALHO_DESPESAS = ["Ano", "Mês", "Despesa", "Valor", "Vencimento", "Categoria", "Observação", "Pagamento", "Cartão Utilizado"]
+    CABECALHO_CARTOES = ["Nome do Cartão", "Nome do Usuário", "Número", "Validade", "Bandeira", "Limite", "Fechamento", "Vencimento"]
+    # Valores em centavos no banco saem em reais, como número, na planilha
+    COLUNAS_DESPESAS = ["ano", "mes", "despesa", "valor / 100.0", "vencimento", "categoria", "observacao", "pagamento", "cartao_utilizado"]
+    COLUNAS_CARTOES = ["nome_cartao", "nome_usuario", "numero", "validade", "bandeira", "limite / 100.0", "dia_fechamento", "dia_vencimento"]
+    LOTE = 500
+    ESTILO_CABECALHO = "Cabeçalho"
+    ESTILO_BORDA = "Com borda"
+
+    def __init__(self, filepath, orcamento_texto, saldo_restante):
+        self.filepath = filepath
+        self.orcamento_texto = orcamento_texto
+        self.saldo_restante = saldo_restante
+        self.progresso = 0
+        self.total = 0
+        self.erro = None
+        self.futuro = None
+        self._cancelar = threading.Event()
+
+    def iniciar(self, executor):
+        self.futuro = executor.ler_consolidado(self.executar)
+
+    def cancelar(self):
+        self._cancelar.set()
+
+    @property
+    def cancelada(self):
+        return self._cancelar.is_set()
+
+    @property
+    def em_andamento(self):
+        return self.futuro is not None and not self.futuro.done()
+
+    def executar(self, conn):
+        # Grava num arquivo temporário e só substitui o destino se tudo der certo
+        temporario = self.filepath + ".parcial"
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*), COALESCE(SUM(pagamento = 'Cartão de Crédito'), 0) FROM despesas")
+            self.total = sum(cursor.fetchone())
+            # openpyxl só é importado quando uma planilha é de fato gravada
+            import openpyxl
+            from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+            thin_border = Border(left=Side(style="thin"), right=Side(style="thin"),
+                                 top=Side(style="thin"), bottom=Side(style="thin"))
+            workbook = openpyxl.Workbook(write_only=True)
+            # Estilos registrados uma vez no workbook e atribuídos pelo nome: montar fonte,
+            # preenchimento e borda em cada célula custava mais que gravar as linhas
+            workbook.add_named_style(NamedStyle(
+                name=self.ESTILO_CABECALHO, font=Font(bold=True), alignment=Alignment(horizontal="center"),
+                fill=PatternFill(start_color="BDD7EE", end_color="BDD7EE", fill_type="solid"), border=thin_border
+            ))
+            workbook.add_named_style(NamedStyle(name=self.ESTILO_BORDA, border=thin_border))
+            if self._escrever_despesas(workbook, cursor) and self._escrever_cartoes(workbook, cursor):
+                workbook.save(temporario)
+                os.replace(temporario, self.filepath)
+            else:
+                # Cancelada: fecha as abas já iniciadas para liberar os arquivos temporários
+                for sheet in workbook.worksheets:
+                    if not sheet.closed:
+                        sheet.close()
+        except Exception as e:
+            self.erro = e
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+
+    def _larguras(self, cursor, cabecalho, colunas, tabela, where="", parametros=()):
+        # No modo write-only as larguras vão para o XML antes das linhas, então o
+        # maior comprimento de cada coluna vem de uma única agregação no SQLite.
+        expr = ", ".join(f"COALESCE(MAX(LENGTH({c})), 0)" for c in colunas)
+        cursor.execute(f"SELECT {expr} FROM {tabela}{where}", parametros)
+        maximos = cursor.fetchone()
+        return [max(len(titulo), tamanho) for titulo, tamanho in zip(cabecalho, maximos)]
+
+    def _aplicar_larguras(self, sheet, larguras):
+        from openpyxl.utils import get_column_letter
+        for indice, largura in enumerate(larguras, 1):
+            sheet.column_dimensions[get_column_letter(indice)].width = largura + 2
+
+    def _cabecalho(self, sheet, titulos):
+        from openpyxl.cell import WriteOnlyCell
+        linha = []
+        for titulo in titulos:
+            cell = WriteOnlyCell(sheet, value=titulo)
+            cell.style = self.ESTILO_CABECALHO
+            linha.append(cell)
+        return linha
+
+    def _com_borda(self, sheet, valores):
+        from openpyxl.cell import WriteOnlyCell
+        linha = []
+        for valor in valores:
+            cell = WriteOnlyCell(sheet, value=valor)
+            cell.style = self.ESTILO_BORDA
+            linha.append(cell)
+        return linha
+
+    def _transmitir(self, cursor, sheet, formatar=None):
+        # Copia as linhas do cursor para a planilha em lotes; devolve False se cancelado
+        while True:
+            if self._cancelar.is_set():
+                return False
+            lote = cursor.fetchmany(self.LOTE)
+            if not lote:
+                return True
+            for row in lote:
+                sheet.append(formatar(row) if formatar else row)
+            self.progresso += len(lote)
+
+    def _escrever_despesas(self, workbook, cursor):
+        sheet = workbook.create_sheet(title="Despesas")
+        saldo_texto = f"R$ {formatar_moeda(self.saldo_restante)}"
+        orcamento_texto = f"R$ {self.orcamento_texto}"
+        larguras = self._larguras(cursor, self.CABECALHO_DESPESAS, self.COLUNAS_DESPESAS, "despesas")
+        larguras[0] = max(larguras[0], len("Saldo Restante"))
+        larguras[1] = max(larguras[1], len(orcamento_texto), len(saldo_texto))
+        self._aplicar_larguras(sheet, larguras)
+        sheet.auto_filter.ref = "A1:I1"
+        sheet.append(self._cabecalho(sheet, self.CABECALHO_DESPESAS))
+        cursor.execute(f"SELECT {', '.join(self.COLUNAS_DESPESAS)} FROM despesas ORDER BY id")
+        if not self._transmitir(cursor, sheet, lambda row: self._com_borda(sheet, row)):
+            return False
+        sheet.append([])
+        sheet.append(["Orçamento", orcamento_texto])
+        sheet.append(["Saldo Restante", saldo_texto])
+        return True
+
+    def _escrever_cartoes(self, workbook, cursor):
+        sheet = workbook.create_sheet(title="Cartões")
+        titulo_bloco = "Despesas no Cartão de Crédito"
+        where = " WHERE pagamento = ?"
+        parametros = ("Cartão de Crédito",)
+        larguras = self._larguras(cursor, self.CABECALHO_CARTOES, self.COLUNAS_CARTOES, "cartoes")
+        larguras_desp = self._larguras(cursor, self.CABECALHO_DESPESAS, self.COLUNAS_DESPESAS, "despesas", where, parametros)
+        larguras = [max(a, b) for a, b in zip(larguras + [0] * (len(larguras_desp) - len(larguras)), larguras_desp)]
+        larguras[0] = max(larguras[0], len(titulo_bloco))
+        self._aplicar_larguras(sheet, larguras)
+        sheet.auto_filter.ref = "A1:H1"
+        sheet.append(self._cabecalho(sheet, self.CABECALHO_CARTOES))
+        cursor.execute(f"SELECT {', '.join(self.COLUNAS_CARTOES)} FROM cartoes ORDER BY id")
+        for cartao in cursor.fetchall():
+            sheet.append(self._com_borda(sheet, cartao))
+
+        # Bloco: Despesas no Cartão de Crédito
+        sheet.append([])
+        sheet.append([titulo_bloco])
+        sheet.append(self._cabecalho(sheet, self.CABECALHO_DESPESAS))
+        cursor.execute(f"SELECT {', '.join(self.COLUNAS_DESPESAS)} FROM despesas{where} ORDER BY id", parametros)
+        return self._transmitir(cursor, sheet, lambda row: self._com_borda(sheet, row))
+
+
+class ImportacaoPlanilha:
+    # Importa despesas de uma planilha lida em modo read_only. Leitura e validação rodam
+    # numa thread própria; só os lotes já validados vão para a thread de escrita do
+    # ExecutorBanco, numa tabela temporária, e a última tarefa os copia para despesas num
+    # único INSERT ... SELECT (tudo ou nada). Enquanto a planilha é lida, a fila de escrita
+    # segue atendendo a interface. Cancelamento ou erro descartam a tabela temporária.
+    LOTE = 1000
+    MAX_REJEITADAS = 10
+    COLUNAS = "ano, mes, despesa, valor, vencimento, categoria, observacao, pagamento, cartao_utilizado, vencimento_dia"
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.progresso = 0
+        self.total = 0
+        self.importadas = DespesasColunares()
+        self.rejeitadas = []
+        self.quantidade_rejeitadas = 0
+        self.agregados = CacheAgregados()
+        self.erro = None
+        self.thread = None
+        self._cancelar = threading.Event()
+
+    def iniciar(self, executor):
+        def gravar(funcao, *args):
+            return executor.submeter(funcao, *args).result()
+        self.thread = threading.Thread(target=self._importar, args=(gravar,), daemon=True)
+        self.thread.start()
+
+    def cancelar(self):
+        self._cancelar.set()
+
+    @property
+    def cancelada(self):
+        return self._cancelar.is_set()
+
+    @property
+    def em_andamento(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    @staticmethod
+    def _texto(valor):
+        if valor is None:
+            return ""
+        if isinstance(valor, float) and valor.is_integer():
+            valor = int(valor)
+        return str(valor).strip()
+
+    @classmethod
+    def normalizar(cls, row):
+        # Converte uma linha (Ano, Mês, Despesa, Valor, Vencimento, Categoria, Observação,
+        # Pagamento, Cartão Utilizado) para o formato gravado no banco; ValueError se inválida.
+        row = tuple(row[:9]) + (None,) * (9 - len(row))
+        ano, mes, despesa, valor, vencimento, categoria, observacao, pagamento, cartao = row
+        ano = cls._texto(ano)
+        if not ano.isdigit():
+            raise ValueError("ano inválido")
+        mes = cls._texto(mes)
+        if mes.isdigit() and 1 <= int(mes) <= 12:
+            mes = MESES[int(mes) - 1]
+        if mes not in MESES:
+            raise ValueError("mês inválido")
+        despesa = cls._texto(despesa)
+        if not despesa:
+            raise ValueError("despesa sem nome")
+        try:
+            valor = para_centavos(valor)
+        except ValueError:
+            raise ValueError("valor inválido")
+        if isinstance(vencimento, datetime):
+            vencimento = vencimento.strftime("%d/%m/%Y")
+        else:
+            vencimento = cls._texto(vencimento)
+            try:
+                datetime.strptime(vencimento, "%d/%m/%Y")
+            except ValueError:
+                raise ValueError("vencimento inválido")
+        pagamento = cls._texto(pagamento)
+        cartao = cls._texto(cartao) if pagamento == "Cartão de Crédito" else ""
+        return (ano, mes, despesa, valor, vencimento, cls._texto(categoria) or "Outros",
+                cls._texto(observacao), pagamento, cartao)
+
+    def executar(self, banco):
+        # Sem ExecutorBanco (linha de comando, benchmark): lê e grava na mesma thread
+        self._importar(lambda funcao, *args: funcao(banco, *args))
+
+    def _importar(self, gravar):
+        # gravar(funcao, *args) roda funcao(banco, *args) na conexão de escrita e devolve o resultado
+        workbook = None
+        validas = []
+        concluida = False
+        try:
+            import openpyxl
+            workbook = openpyxl.load_workbook(self.filepath, read_only=True, data_only=True)
+            sheet = workbook.active
+            # Total pelo <dimension> da planilha, quando ela traz um (o Excel sempre grava);
+            # sem ele fica None e a interface mostra progresso indeterminado. As linhas são
+            # lidas até o fim mesmo que a dimensão informada esteja errada
+            self.total = None if sheet.max_row is None else max(sheet.max_row - 1, 0)
+            sheet.reset_dimensions()
+            gravar(self._preparar)
+            lote = []
+            for numero, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), 2):
+                self.progresso += 1
+                if not row or row[0] is None:
+                    continue
+                try:
+                    despesa = self.normalizar(row)
+                except ValueError as e:
+                    self.quantidade_rejeitadas += 1
+                    if len(self.rejeitadas) < self.MAX_REJEITADAS:
+                        self.rejeitadas.append(f"Linha {numero}: {e}")
+                    continue
+                lote.append(despesa)
+                if len(lote) >= self.LOTE:
+                    if self._cancelar.is_set():
+                        return
+                    gravar(self._gravar_lote, lote)
+                    validas += lote
+                    lote = []
+            if self._cancelar.is_set():
+                return
+            gravar(self._gravar_lote, lote)
+            validas += lote
+            ultimo_id = gravar(self._concluir)
+            concluida = True
+            # Um único INSERT numa transação: os ids das despesas importadas são consecutivos
+            self.importadas.update(zip(range(ultimo_id - len(validas) + 1, ultimo_id + 1), validas))
+            for despesa in validas:
+                self.agregados.adicionar(despesa)
+        except Exception as e:
+            self.erro = e
+        finally:
+            if not concluida:
+                try:
+                    gravar(self._descartar)
+                except Exception:
+                    pass
+            if workbook is not None:
+                workbook.close()
+
+    def _preparar(self, banco):
+        banco.conn.execute("DROP TABLE IF EXISTS temp.importacao")
+        banco.conn.execute(f"CREATE TEMP TABLE importacao ({self.COLUNAS})")
+
+    def _gravar_lote(self, banco, lote):
+        # Pela FilaEscrita, que faz o commit (a transação não fica aberta durante a leitura)
+        banco.executar_varios(
+            "INSERT INTO temp.importacao VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [despesa + (dia_epoca_texto(despesa[4]),) for despesa in lote]
+        )
+
+    def _concluir(self, banco):
+        # Grava antes as pendências da interface: se a cópia falhar, só ela é desfeita
+        banco.flush()
+        conn = banco.conn
+        try:
+            conn.execute(f"INSERT INTO despesas ({self.COLUNAS}) SELECT {self.COLUNAS} FROM temp.importacao ORDER BY rowid")
+            ultimo_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            conn.execute("DROP TABLE temp.importacao")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return ultimo_id
+
+    def _descartar(self, banco):
+        banco.conn.execute("DROP TABLE IF EXISTS temp.importacao")
+
+
+class SnapshotBanco:
+    # Cópia consistente do banco com a API de backup do SQLite (Connection.backup),
+    # copiando N páginas por passo numa thread própria; entre os passos o banco fica
+    # livre para novas gravações. Grava num arquivo temporário e renomeia no final.
+    def __init__(self, caminho_db, destino, paginas_por_passo=256, pausa=0.001):
+        self.caminho_db = caminho_db
+        self.destino = destino
+        self.paginas_por_passo = paginas_por_passo
+        self.pausa = pausa
+        self.paginas_total = 0
+        self.paginas_copiadas = 0
+        self.duracao = 0.0
+        self.tamanho = 0
+        self.erro = None
+        self.thread = threading.Thread(target=self.executar, daemon=True)
+
+    def iniciar(self):
+        self.thread.start()
+
+    @property
+    def em_andamento(self):
+        return self.thread.is_alive()
+
+    def _progresso(self, status, restantes, total):
+        self.paginas_total = total
+        self.paginas_copiadas = total - restantes
+
+    def executar(self):
+        temporario = self.destino + ".parcial"
+        inicio = time.perf_counter()
+        origem = sqlite3.connect(self.caminho_db)
+        copia = sqlite3.connect(temporario)
+        try:
+            origem.backup(copia, pages=self.paginas_por_passo, progress=self._progresso, sleep=self.pausa)
+            copia.close()
+            os.replace(temporario, self.destino)
+            self.tamanho = os.path.getsize(self.destino)
+        except Exception as e:
+            self.erro = e
+        finally:
+            copia.close()
+            origem.close()
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            self.duracao = time.perf_counter() - inicio
+
+
+class AgendadorSnapshots:
+    # Snapshots automáticos periódicos numa thread de fundo, com retenção dos N mais
+    # recentes e histórico de métricas (duração, tamanho, páginas) em snapshots.jsonl.
+    PREFIXO = "snapshot_"
+
+    def __init__(self, caminho_db, pasta="backups", intervalo=6 * 60 * 60, manter=10):
+        self.caminho_db = caminho_db
+        self.pasta = pasta
+        self.intervalo = intervalo
+        self.manter = manter
+        self.ultimo = None
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+        self.thread = None
+
+    def iniciar(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._laco, daemon=True)
+            self.thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    def _snapshots_existentes(self):
+        if not os.path.isdir(self.pasta):
+            return []
+        return sorted(os.path.join(self.pasta, nome) for nome in os.listdir(self.pasta)
+                      if nome.startswith(self.PREFIXO) and nome.endswith(".db"))
+
+    def _laco(self):
+        # O primeiro snapshot sai assim que o mais recente estiver mais velho que o intervalo
+        existentes = self._snapshots_existentes()
+        idade = time.time() - os.path.getmtime(existentes[-1]) if existentes else self.intervalo
+        espera = max(self.intervalo - idade, 0)
+        while not self._parar.wait(espera):
+            self.executar_agora()
+            espera = self.intervalo
+
+    def executar_agora(self):
+        os.makedirs(self.pasta, exist_ok=True)
+        destino = os.path.join(self.pasta, f"{self.PREFIXO}{datetime.now():%Y%m%d_%H%M%S}.db")
+        snapshot = SnapshotBanco(self.caminho_db, destino)
+        snapshot.executar()
+        self.registrar(snapshot, automatico=True)
+        if snapshot.erro is None:
+            self.aplicar_retencao()
+        self.ultimo = snapshot
+        return snapshot
+
+    def aplicar_retencao(self):
+        for antigo in self._snapshots_existentes()[:-self.manter]:
+            try:
+                os.remove(antigo)
+            except OSError:
+                pass
+
+    def registrar(self, snapshot, automatico=False):
+        registro = {
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "arquivo": snapshot.destino,
+            "automatico": automatico,
+            "duracao_s": round(snapshot.duracao, 4),
+            "tamanho_bytes": snapshot.tamanho,
+            "paginas": snapshot.paginas_total,
+            "erro": str(snapshot.erro) if snapshot.erro else None,
+        }
+        with self._lock:
+            os.makedirs(self.pasta, exist_ok=True)
+            with open(os.path.join(self.pasta, "snapshots.jsonl"), "a", encoding="utf-8") as arquivo:
+                arquivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+
+class MigracoesBanco:
+    # Evolução do esquema versionada por PRAGMA user_version: a etapa N leva o banco da
+    # versão N-1 para N e a versão só avança quando a etapa termina, então uma migração
+    # interrompida é retomada na próxima abertura. Novas etapas entram no fim de ETAPAS.
+    ETAPAS = ("_v1_esquema_inicial", "_v2_vencimento_dia", "_v3_centavos", "_v4_faturas", "_v5_compras_parceladas",
+              "_v6_busca_textual", "_v7_indices_ordenacao", "_v8_resumo_mensal")
+    VERSAO = len(ETAPAS)
+    LOTE = 5000
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def versao_atual(self):
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def aplicar(self):
+        versao = self.versao_atual()
+        for numero, etapa in enumerate(self.ETAPAS[versao:], versao + 1):
+            getattr(self, etapa)()
+            self.conn.execute(f"PRAGMA user_version = {numero}")
+            self.conn.commit()
+
+    def _colunas(self, tabela):
+        return {linha[1] for linha in self.conn.execute(f"PRAGMA table_info({tabela})")}
+
+    def _v1_esquema_inicial(self):
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS despesas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ano TEXT,
+                mes TEXT,
+                despesa TEXT,
+                valor REAL,
+                vencimento TEXT,
+                categoria TEXT,
+                observacao TEXT,
+                pagamento TEXT,
+                cartao_utilizado TEXT
+            )
+        """)
+        # Tabela Cartões – removidos os campos de fechamento e vencimento
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS cartoes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome_cartao TEXT,
+                nome_usuario TEXT,
+                numero TEXT,
+                validade TEXT,
+                bandeira TEXT,
+                limite REAL
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS metas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome TEXT,
+                valor_meta REAL,
+                valor_atual REAL,
+                data_inicial TEXT,
+                data_final TEXT
+            )
+        """)
+        # Índices compostos usados pelos filtros e consultas de despesas
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_despesas_ano_mes_categoria ON despesas (ano, mes, categoria)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_despesas_pagamento_cartao ON despesas (pagamento, cartao_utilizado)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_despesas_vencimento ON despesas (vencimento)")
+
+    def _v2_vencimento_dia(self):
+        # vencimento_dia (dias desde 01/01/1970) torna intervalos de datas buscas por faixa
+        # no índice. O app grava o valor já calculado nos INSERTs; os triggers cobrem quem
+        # não o informa e as alterações do texto
+        if "vencimento_dia" not in self._colunas("despesas"):
+            self.conn.execute("ALTER TABLE despesas ADD COLUMN vencimento_dia INTEGER")
+        # O índice sobre o texto dd/mm/aaaa não serve para faixas nem ordenação
+        self.conn.execute("DROP INDEX IF EXISTS idx_despesas_vencimento")
+        self._indices_despesas()
+        self.conn.commit()
+        # Preenche as linhas existentes em lotes por faixa de id, com um commit por lote
+        ultimo_id = 0
+        while True:
+            limite = self.conn.execute(
+                "SELECT MAX(id) FROM (SELECT id FROM despesas WHERE id > ? ORDER BY id LIMIT ?)",
+                (ultimo_id, self.LOTE)
+            ).fetchone()[0]
+            if limite is None:
+                break
+            self.conn.execute(
+                f"UPDATE despesas SET vencimento_dia = {sql_dia_epoca('vencimento')} WHERE id > ? AND id <= ?",
+                (ultimo_id, limite)
+            )
+            self.conn.commit()
+            ultimo_id = limite
+
+    def _indices_despesas(self):
+        # Índices e triggers de despesas a partir da versão 2 (recriados se a tabela for refeita)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_despesas_ano_mes_categoria ON despesas (ano, mes, categoria)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_despesas_pagamento_cartao ON despesas (pagamento, cartao_utilizado)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_despesas_vencimento_dia ON despesas (vencimento_dia)")
+        self.conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_despesas_vencimento_dia_inserir AFTER INSERT ON despesas
+            WHEN NEW.vencimento_dia IS NULL AND NEW.vencimento IS NOT NULL
+            BEGIN
+                UPDATE despesas SET vencimento_dia = {sql_dia_epoca("NEW.vencimento")} WHERE id = NEW.id;
+            END
+        """)
+        self.conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_despesas_vencimento_dia_atualizar AFTER UPDATE OF vencimento ON despesas
+            BEGIN
+                UPDATE despesas SET vencimento_dia = {sql_dia_epoca("NEW.vencimento")} WHERE id = NEW.id;
+            END
+        """)
+
+    def _refazer_tabela(self, tabela, definicao, selecao):
+        # SQLite não muda o tipo de uma coluna: cria a tabela nova, copia, troca os nomes e
+        # preserva o contador do AUTOINCREMENT (ids excluídos não são reaproveitados)
+        sequencia = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (tabela,)).fetchone()
+        self.conn.execute(f"CREATE TABLE {tabela}_nova ({definicao})")
+        self.conn.execute(f"INSERT INTO {tabela}_nova SELECT {selecao} FROM {tabela}")
+        self.conn.execute(f"DROP TABLE {tabela}")
+        self.conn.execute(f"ALTER TABLE {tabela}_nova RENAME TO {tabela}")
+        if sequencia is not None:
+            self.conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (tabela,))
+            self.conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (tabela, sequencia[0]))
+
+    def _v3_centavos(self):
+        # Dinheiro passa a ser INTEGER em centavos: SUM() exato e sem texto "1000,00" no
+        # limite dos cartões. Tudo numa transação: ou as três tabelas migram, ou nenhuma
+        def centavos(coluna):
+            return f"CAST(ROUND(CAST(REPLACE({coluna}, ',', '.') AS REAL) * 100) AS INTEGER)"
+        self.conn.execute("BEGIN")
+        self._refazer_tabela("despesas", """
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ano TEXT,
+                mes TEXT,
+                despesa TEXT,
+                valor INTEGER,
+                vencimento TEXT,
+                categoria TEXT,
+                observacao TEXT,
+                pagamento TEXT,
+                cartao_utilizado TEXT,
+                vencimento_dia INTEGER
+            """, f"id, ano, mes, despesa, {centavos('valor')}, vencimento, categoria, observacao, "
+                 f"pagamento, cartao_utilizado, vencimento_dia")
+        self._indices_despesas()
+        self._refazer_tabela("cartoes", """
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome_cartao TEXT,
+                nome_usuario TEXT,
+                numero TEXT,
+                validade TEXT,
+                bandeira TEXT,
+                limite INTEGER
+            """, f"id, nome_cartao, nome_usuario, numero, validade, bandeira, {centavos('limite')}")
+        self._refazer_tabela("metas", """
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome TEXT,
+                valor_meta INTEGER,
+                valor_atual INTEGER,
+                data_inicial TEXT,
+                data_final TEXT
+            """, f"id, nome, {centavos('valor_meta')}, {centavos('valor_atual')}, data_inicial, data_final")
+
+    def _v4_faturas(self):
+        # Dias de fechamento/vencimento voltam aos cartões e "faturas" guarda o total por
+        # cartão e ciclo (aaaamm do fechamento). Triggers mantêm os totais a cada inclusão,
+        # exclusão ou alteração de despesa, e recalculam o cartão quando o nome ou o dia de
+        # fechamento mudam. O painel do cartão lê só algumas linhas pela chave primária.
+        colunas = self._colunas("cartoes")
+        for coluna in ("dia_fechamento", "dia_vencimento"):
+            if coluna not in colunas:
+                self.conn.execute(f"ALTER TABLE cartoes ADD COLUMN {coluna} INTEGER")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS faturas (
+                cartao TEXT NOT NULL,
+                ciclo INTEGER NOT NULL,
+                total INTEGER NOT NULL,
+                quantidade INTEGER NOT NULL,
+                PRIMARY KEY (cartao, ciclo)
+            ) WITHOUT ROWID
+        """)
+        credito = "'Cartão de Crédito'"
+
+        def somar(linha, sinal):
+            # Soma (sinal=+1) ou subtrai (sinal=-1) a despesa NEW/OLD da fatura do seu ciclo.
+            # O dia sai do texto quando vencimento_dia ainda não foi preenchido pelo trigger
+            # dele, que dispara logo depois e passa por trg_faturas_despesa_atualizar
+            cartao = f"COALESCE(TRIM({linha}.cartao_utilizado), '')"
+            dia = f"COALESCE({linha}.vencimento_dia, {sql_dia_epoca(f'{linha}.vencimento')})"
+            if sinal > 0:
+                return f"""
+                INSERT INTO faturas (cartao, ciclo, total, quantidade)
+                SELECT {cartao}, {sql_ciclo_fatura("dia", cartao)}, COALESCE({linha}.valor, 0), 1
+                FROM (SELECT {dia} AS dia)
+                WHERE dia IS NOT NULL AND {linha}.pagamento = {credito}
+                ON CONFLICT (cartao, ciclo) DO UPDATE SET total = total + excluded.total, quantidade = quantidade + 1;"""
+            return f"""
+                UPDATE faturas SET total = total - COALESCE({linha}.valor, 0), quantidade = quantidade - 1
+                WHERE {linha}.pagamento = {credito} AND cartao = {cartao}
+                AND ciclo = {sql_ciclo_fatura(dia, cartao)};
+                DELETE FROM faturas WHERE cartao = {cartao} AND quantidade <= 0;"""
+
+        def recalcular(nomes):
+            return f"""
+                DELETE FROM faturas WHERE cartao IN ({nomes});
+                INSERT INTO faturas (cartao, ciclo, total, quantidade)
+                SELECT TRIM(cartao_utilizado), {sql_ciclo_fatura("vencimento_dia", "TRIM(cartao_utilizado)")},
+                       SUM(COALESCE(valor, 0)), COUNT(*)
+                FROM despesas
+                WHERE pagamento = {credito} AND vencimento_dia IS NOT NULL AND TRIM(cartao_utilizado) IN ({nomes})
+                GROUP BY 1, 2;"""
+
+        gatilhos = {
+            "trg_faturas_despesa_inserir": f"AFTER INSERT ON despesas BEGIN {somar('NEW', 1)} END",
+            "trg_faturas_despesa_excluir": f"AFTER DELETE ON despesas BEGIN {somar('OLD', -1)} END",
+            "trg_faturas_despesa_atualizar": (
+                "AFTER UPDATE OF valor, vencimento_dia, pagamento, cartao_utilizado ON despesas "
+                f"BEGIN {somar('OLD', -1)} {somar('NEW', 1)} END"
+            ),
+            "trg_faturas_cartao_inserir": f"AFTER INSERT ON cartoes BEGIN {recalcular('TRIM(NEW.nome_cartao)')} END",
+            "trg_faturas_cartao_excluir": f"AFTER DELETE ON cartoes BEGIN {recalcular('TRIM(OLD.nome_cartao)')} END",
+            "trg_faturas_cartao_atualizar": (
+                "AFTER UPDATE OF nome_cartao, dia_fechamento ON cartoes "
+                f"BEGIN {recalcular('TRIM(OLD.nome_cartao), TRIM(NEW.nome_cartao)')} END"
+            ),
+        }
+        for nome, corpo in gatilhos.items():
+            self.conn.execute(f"CREATE TRIGGER IF NOT EXISTS {nome} {corpo}")
+        # Carga inicial com as despesas existentes
+        self.conn.execute("DELETE FROM faturas")
+        self.conn.execute(f"""
+            INSERT INTO faturas (cartao, ciclo, total, quantidade)
+            SELECT COALESCE(TRIM(cartao_utilizado), ''),
+                   {sql_ciclo_fatura("vencimento_dia", "COALESCE(TRIM(cartao_utilizado), '')")},
+                   SUM(COALESCE(valor, 0)), COUNT(*)
+            FROM despesas
+            WHERE pagamento = {credito} AND vencimento_dia IS NOT NULL
+            GROUP BY 1, 2
+        """)
+
+    def _v5_compras_parceladas(self):
+        # Compras parceladas guardam só o cabeçalho; as parcelas viram despesas quando o
+        # ciclo de cobrança abre (ComprasParceladas.lancar_vencidas), ligadas à compra por
+        # compra_id/parcela. O índice parcial cobre só as compras com parcelas pendentes.
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS compras_parceladas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                despesa TEXT,
+                valor_total INTEGER NOT NULL,
+                parcelas INTEGER NOT NULL,
+                primeira_parcela TEXT NOT NULL,
+                categoria TEXT,
+                observacao TEXT,
+                pagamento TEXT,
+                cartao_utilizado TEXT,
+                parcelas_lancadas INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_compras_parceladas_pendentes ON compras_parceladas (id) "
+            "WHERE parcelas_lancadas < parcelas"
+        )
+        colunas = self._colunas("despesas")
+        for coluna in ("compra_id", "parcela"):
+            if coluna not in colunas:
+                self.conn.execute(f"ALTER TABLE despesas ADD COLUMN {coluna} INTEGER")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_despesas_compra ON despesas (compra_id, parcela) WHERE compra_id IS NOT NULL"
+        )
+
+    def _v6_busca_textual(self):
+        self.criar_busca_textual()
+
+    def _v7_indices_ordenacao(self):
+        # Um índice por expressão de ORDENACOES_DESPESAS: a tabela ordenada por valor,
+        # vencimento ou categoria lê cada página direto do índice (que termina no id)
+        for coluna, expressao in ORDENACOES_DESPESAS.items():
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_despesas_ordem_{coluna} ON despesas ({expressao})")
+
+    def _v8_resumo_mensal(self):
+        # "resumo_mensal" guarda soma e quantidade por ano, mês, categoria, pagamento e cartão
+        # (os campos de CacheAgregados). Triggers mantêm os totais a cada inclusão, exclusão ou
+        # alteração de despesa, venha ela do app, da linha de comando ou de outra ferramenta;
+        # o indicador de gastos lê poucas dezenas de linhas em vez das despesas. O relatório
+        # em lote continua agregando as despesas em paralelo (é a parte pesada, fora da interface).
+        # Chaves nulas viram '' (a chave primária não aceita NULL)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS resumo_mensal (
+                ano TEXT NOT NULL,
+                mes TEXT NOT NULL,
+                categoria TEXT NOT NULL,
+                pagamento TEXT NOT NULL,
+                cartao TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                quantidade INTEGER NOT NULL,
+                PRIMARY KEY (ano, mes, categoria, pagamento, cartao)
+            ) WITHOUT ROWID
+        """)
+
+        def chave(linha):
+            return (f"COALESCE({linha}.ano, ''), COALESCE({linha}.mes, ''), COALESCE({linha}.categoria, ''), "
+                    f"COALESCE({linha}.pagamento, ''), COALESCE(TRIM({linha}.cartao_utilizado), '')")
+
+        def somar(linha, sinal):
+            # Soma (sinal=+1) ou subtrai (sinal=-1) a despesa NEW/OLD do seu grupo
+            if sinal > 0:
+                return f"""
+                INSERT INTO resumo_mensal (ano, mes, categoria, pagamento, cartao, total, quantidade)
+                VALUES ({chave(linha)}, COALESCE({linha}.valor, 0), 1)
+                ON CONFLICT (ano, mes, categoria, pagamento, cartao)
+                DO UPDATE SET total = total + excluded.total, quantidade = quantidade + 1;"""
+            return f"""
+                UPDATE resumo_mensal SET total = total - COALESCE({linha}.valor, 0), quantidade = quantidade - 1
+                WHERE (ano, mes, categoria, pagamento, cartao) = ({chave(linha)});
+                DELETE FROM resumo_mensal
+                WHERE (ano, mes, categoria, pagamento, cartao) = ({chave(linha)}) AND quantidade <= 0;"""
+
+        gatilhos = {
+            "trg_resumo_despesa_inserir": f"AFTER INSERT ON despesas BEGIN {somar('NEW', 1)} END",
+            "trg_resumo_despesa_excluir": f"AFTER DELETE ON despesas BEGIN {somar('OLD', -1)} END",
+            "trg_resumo_despesa_atualizar": (
+                "AFTER UPDATE OF ano, mes, categoria, pagamento, cartao_utilizado, valor ON despesas "
+                f"BEGIN {somar('OLD', -1)} {somar('NEW', 1)} END"
+            ),
+        }
+        for nome, corpo in gatilhos.items():
+            self.conn.execute(f"CREATE TRIGGER IF NOT EXISTS {nome} {corpo}")
+        # Carga inicial com as despesas existentes
+        self.reconstruir_resumo()
+
+    def reconstruir_resumo(self):
+        # Recalcula resumo_mensal a partir das despesas (carga inicial, ou reparo pelo
+        # comando "rebuild" da linha de comando); quem chama faz o commit
+        self.conn.execute("DELETE FROM resumo_mensal")
+        self.conn.execute("""
+            INSERT INTO resumo_mensal (ano, mes, categoria, pagamento, cartao, total, quantidade)
+            SELECT COALESCE(ano, ''), COALESCE(mes, ''), COALESCE(categoria, ''), COALESCE(pagamento, ''),
+                   COALESCE(TRIM(cartao_utilizado), ''), SUM(COALESCE(valor, 0)), COUNT(*)
+            FROM despesas
+            GROUP BY 1, 2, 3, 4, 5
+        """)
+
+    def criar_busca_textual(self):
+        # Índice FTS5 de conteúdo externo sobre despesa e observação (o texto fica só em
+        # despesas; o índice guarda os termos e o id). Sem acentos e sem diferença de
+        # maiúsculas, com índices de prefixo para a busca enquanto se digita. Triggers o
+        # mantêm em dia. Também chamado a cada abertura: cria o índice se o banco foi
+        # migrado num Python sem FTS5 e ele passou a existir.
+        if not FTS5_DISPONIVEL or self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'despesas_busca'").fetchone():
+            return
+        self.conn.execute("BEGIN")
+        self.conn.execute("""
+            CREATE VIRTUAL TABLE despesas_busca USING fts5(
+                despesa, observacao, content='despesas', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        """)
+        inserir = "INSERT INTO despesas_busca (rowid, despesa, observacao) VALUES (NEW.id, NEW.despesa, NEW.observacao);"
+        excluir = ("INSERT INTO despesas_busca (despesas_busca, rowid, despesa, observacao) "
+                   "VALUES ('delete', OLD.id, OLD.despesa, OLD.observacao);")
+        gatilhos = {
+            "trg_busca_despesa_inserir": f"AFTER INSERT ON despesas BEGIN {inserir} END",
+            "trg_busca_despesa_excluir": f"AFTER DELETE ON despesas BEGIN {excluir} END",
+            "trg_busca_despesa_atualizar": f"AFTER UPDATE OF despesa, observacao ON despesas BEGIN {excluir} {inserir} END",
+        }
+        for nome, corpo in gatilhos.items():
+            self.conn.execute(f"CREATE TRIGGER IF NOT EXISTS {nome} {corpo}")
+        self.conn.execute("INSERT INTO despesas_busca (despesas_busca) VALUES ('rebuild')")
+        self.conn.commit()
+
+
+class RestauracaoBanco:
+    # Prepara a restauração fora da thread da interface: copia o backup para um arquivo
+    # temporário ao lado do banco, roda PRAGMA integrity_check e confere o esquema.
+    # Só depois a interface troca o arquivo de uma vez com os.replace (aplicar).
+    TABELAS_OBRIGATORIAS = {
+        "despesas": {"id", "ano", "mes", "despesa", "valor", "vencimento", "categoria",
+                     "observacao", "pagamento", "cartao_utilizado"},
+        "cartoes": {"id", "nome_cartao", "nome_usuario", "numero", "validade", "bandeira", "limite"},
+        "metas": {"id", "nome", "valor_meta", "valor_atual", "data_inicial", "data_final"},
+    }
+
+    def __init__(self, origem, caminho_db):
+        self.origem = origem
+        self.caminho_db = caminho_db
+        self.temporario = caminho_db + ".restaurando"
+        self.problemas = []
+        self.erro = None
+        self.thread = threading.Thread(target=self._executar, daemon=True)
+
+    def iniciar(self):
+        self.thread.start()
+
+    @property
+    def em_andamento(self):
+        return self.thread.is_alive()
+
+    @property
+    def valida(self):
+        return self.erro is None and not self.problemas
+
+    def _executar(self):
+        if not os.path.isfile(self.origem):
+            self.erro = FileNotFoundError(f"Arquivo não encontrado: {self.origem}")
+            return
+        copia = SnapshotBanco(self.origem, self.temporario)
+        copia.executar()
+        if copia.erro:
+            self.erro = copia.erro
+            return
+        try:
+            self.problemas = self.verificar(self.temporario)
+        except Exception as e:
+            self.erro = e
+        if not self.valida:
+            self.descartar()
+
+    @classmethod
+    def verificar(cls, caminho):
+        problemas = []
+        conn = sqlite3.connect(caminho)
+        try:
+            resultado = [linha[0] for linha in conn.execute("PRAGMA integrity_check")]
+            if resultado != ["ok"]:
+                problemas.extend(resultado[:5])
+            versao = conn.execute("PRAGMA user_version").fetchone()[0]
+            if versao > MigracoesBanco.VERSAO:
+                problemas.append(f"Backup de uma versão mais nova do aplicativo (esquema {versao}).")
+            for tabela, colunas in cls.TABELAS_OBRIGATORIAS.items():
+                existentes = {linha[1] for linha in conn.execute(f"PRAGMA table_info({tabela})")}
+                if not existentes:
+                    problemas.append(f"Tabela '{tabela}' não encontrada.")
+                elif colunas - existentes:
+                    problemas.append(f"Tabela '{tabela}' sem as colunas: {', '.join(sorted(colunas - existentes))}.")
+        finally:
+            conn.close()
+        return problemas
+
+    def aplicar(self):
+        # Chamado com a conexão principal fechada (o WAL já foi consolidado no fechamento).
+        # Sobras de -wal/-shm do arquivo antigo não podem ser aplicadas ao novo banco.
+        os.replace(self.temporario, self.caminho_db)
+        for sufixo in ("-wal", "-shm"):
+            if os.path.exists(self.caminho_db + sufixo):
+                os.remove(self.caminho_db + sufixo)
+
+    def descartar(self):
+        if os.path.exists(self.temporario):
+            os.remove(self.temporario)
+
+
+# -------------------------------------------------
+# Operações comuns à interface e à linha de comando
+# -------------------------------------------------
+def preparar_banco(banco):
+    # Cria ou atualiza o esquema até a versão atual (PRAGMA user_version) e lança as
+    # parcelas cujo ciclo de cobrança abriu desde a última abertura
+    banco.flush()
+    migracoes = MigracoesBanco(banco.conn)
+    migracoes.aplicar()
+    migracoes.criar_busca_textual()
+    ComprasParceladas.lancar_vencidas(banco)
+
+
+def ler_dados(banco):
+    # (despesas, agregados, cartões, metas, compras parceladas) a partir da conexão de escrita
+    cursor = banco.conn.cursor()
+    despesas = DespesasColunares()
+    despesas.carregar(cursor)
+    agregados = CacheAgregados()
+    agregados.carregar(cursor)
+    # Incluímos o campo id para os cartões
+    cursor.execute("SELECT id, nome_cartao, nome_usuario, numero, validade, bandeira, limite, dia_fechamento, dia_vencimento FROM cartoes")
+    cartoes = cursor.fetchall()
+    cursor.execute("SELECT id, nome, valor_meta, valor_atual, data_inicial, data_final FROM metas")
+    metas = cursor.fetchall()
+    return despesas, agregados, cartoes, metas, ComprasParceladas.carregar(cursor)
+
+
+def ler_agregados(banco, versao_conhecida=None):
+    # (versão, agregados) recarregados de resumo_mensal se outra conexão (linha de comando,
+    # outra ferramenta) gravou no banco desde versao_conhecida; senão (versão, None).
+    # PRAGMA data_version não muda com as gravações da própria conexão.
+    versao = banco.conn.execute("PRAGMA data_version").fetchone()[0]
+    if versao == versao_conhecida:
+        return versao, None
+    agregados = CacheAgregados()
+    agregados.carregar(banco.conn.cursor())
+    return versao, agregados
+
+
+def inserir_despesa(banco, despesa):
+    # despesa: (Ano, Mês, Despesa, Valor, Vencimento, Categoria, Observação, Pagamento, Cartão); devolve o id
+    return banco.executar(
+        "INSERT INTO despesas (ano, mes, despesa, valor, vencimento, categoria, observacao, pagamento, cartao_utilizado, vencimento_dia) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        tuple(despesa) + (dia_epoca_texto(despesa[4]),)
+    ).lastrowid
+
+
+def montar_filtro_despesas(ano="", mes="", categoria="Todas", vencimento_de=None, vencimento_ate=None, busca=""):
+    # Monta a cláusula WHERE parametrizada (aproveita o índice ano/mes/categoria e, para
+    # intervalos de vencimento, a faixa no índice de vencimento_dia). A busca textual vira
+    # um conjunto de ids vindo do índice FTS5, combinado com os demais filtros.
+    condicoes = []
+    parametros = []
+    # Cada palavra digitada vale como prefixo ("nat" acha "Natal"); entre aspas, sem operadores do FTS5
+    termos = re.findall(r"\w+", busca or "")
+    if termos and FTS5_DISPONIVEL:
+        condicoes.append("id IN (SELECT rowid FROM despesas_busca WHERE despesas_busca MATCH ?)")
+        parametros.append(" ".join(f'"{termo}"*' for termo in termos))
+    else:
+        for termo in termos:
+            condicoes.append("(despesa LIKE ? OR observacao LIKE ?)")
+            parametros += [f"%{termo}%"] * 2
+    if vencimento_de is not None:
+        condicoes.append("vencimento_dia >= ?")
+        parametros.append(dia_epoca(vencimento_de))
+    if vencimento_ate is not None:
+        condicoes.append("vencimento_dia <= ?")
+        parametros.append(dia_epoca(vencimento_ate))
+    if ano:
+        condicoes.append("ano = ?")
+        parametros.append(ano)
+    if mes:
+        condicoes.append("mes = ?")
+        parametros.append(mes)
+    if categoria and categoria != "Todas":
+        condicoes.append("categoria = ?")
+        parametros.append(categoria)
+    where = (" WHERE " + " AND ".join(condicoes)) if condicoes else ""
+    return where, parametros
+
+
+def periodo_vencimento(opcao, ano):
+    # (início, fim) das datas de vencimento para a opção do filtro, ou None
+    hoje = date.today()
+    if opcao == "Vencidas":
+        return None, hoje - timedelta(days=1)
+    if opcao.startswith("Próximos"):
+        return hoje, hoje + timedelta(days=int(opcao.split()[1]))
+    if opcao.endswith("Trimestre") and ano.isdigit():
+        trimestre = int(opcao[0])
+        inicio = date(int(ano), 3 * trimestre - 2, 1)
+        fim = date(int(ano) + 1, 1, 1) if trimestre == 4 else date(int(ano), 3 * trimestre + 1, 1)
+        return inicio, fim - timedelta(days=1)
+    return None
+
+
+# Colunas pelas quais a tabela de despesas pode ser ordenada: expressão sem NULL (a
+# comparação do keyset não funciona com NULL), igual à do índice criado na versão 7
+ORDENACOES_DESPESAS = {
+    "valor": "IFNULL(valor, 0)",
+    "vencimento": "IFNULL(vencimento_dia, 0)",
+    "categoria": "IFNULL(categoria, '')",
+}
+
+
+def sql_pagina_despesas(where, ordem="ASC", ordenacao=None, por_id=False):
+    # Página de despesas por keyset na ordem (chave, id), com a chave como última coluna;
+    # "where" termina na condição de condicao_pagina. Sem ordenação, a chave é o próprio id.
+    # por_id: só as linhas de uma faixa de ids (recém-incluídas), sem varrer o índice da chave.
+    chave = ORDENACOES_DESPESAS.get(ordenacao, "id")
+    ordenar = f"id {ordem}" if por_id or chave == "id" else f"{chave} {ordem}, id {ordem}"
+    return (f"SELECT id, ano, mes, despesa, valor, vencimento, categoria, observacao, pagamento, cartao_utilizado, {chave} "
+            f"FROM despesas{where} ORDER BY {ordenar} LIMIT ?")
+
+
+def condicao_pagina(ordenacao, posterior, chave, despesa_id):
+    # (condição, parâmetros) das linhas depois (posterior=True) ou antes da âncora (chave, id)
+    # na ordem crescente. Escrita como "chave >= ? AND (...)" para o SQLite buscar a faixa no
+    # índice, o que ele não faz com a comparação de row values "(chave, id) > (?, ?)".
+    sinal = ">" if posterior else "<"
+    expressao = ORDENACOES_DESPESAS.get(ordenacao)
+    if expressao is None:
+        return f"id {sinal} ?", [despesa_id]
+    return (f"{expressao} {sinal}= ? AND ({expressao} {sinal} ? OR id {sinal} ?)",
+            [chave, chave, despesa_id])
+
+
+def tabela_totais(titulos, grupos):
+    # Seção "Totais por ..." do relatório: uma linha por grupo (rótulos, total, quantidade)
+    linhas = ["", "Totais por " + " x ".join(titulos), ""]
+    linhas.append("".join(f"{t:<22}" for t in titulos) + f"{'Qtd':>8}{'Total (R$)':>16}")
+    for rotulos, total, quantidade in grupos:
+        linhas.append("".join(f"{str(r or '-')[:21]:<22}" for r in rotulos) + f"{quantidade:>8}{formatar_moeda(total):>16}")
+    return linhas
+
+
+def linhas_relatorio(despesas, compras, dimensoes=()):
+    # Texto do relatório (lista de linhas) agrupado pelas dimensões de MotorRelatorios.DIMENSOES
+    motor = MotorRelatorios(despesas)
+    titulos = [MotorRelatorios.DIMENSOES[d] for d in dimensoes]
+    linhas = ["Relatório de Despesas", ""]
+    linhas.append(f"Total Geral: R$ {formatar_moeda(motor.total_geral)} ({len(motor.valores)} despesas)")
+    for _, (p50, p90, p99) in motor.percentis().items():
+        linhas.append(f"Valor por despesa: mediana R$ {formatar_moeda(round(p50))} | "
+                      f"P90 R$ {formatar_moeda(round(p90))} | P99 R$ {formatar_moeda(round(p99))}")
+    if dimensoes:
+        linhas += tabela_totais(titulos, motor.agrupar(*dimensoes))
+    if len(dimensoes) == 1:
+        linhas += ["", f"Percentis por {titulos[0]} (mediana / P90 / P99)", ""]
+        for rotulo, (p50, p90, p99) in motor.percentis(dimensoes[0]).items():
+            linhas.append(f"{str(rotulo or '-')[:21]:<22}" + "".join(f"{formatar_moeda(round(p)):>12}" for p in (p50, p90, p99)))
+    linhas += ["", "Evolução mensal", ""]
+    linhas.append(f"{'Ano':<8}{'Mês':<12}{'Total (R$)':>16}{'Diferença':>14}{'Variação':>10}")
+    for ano, mes, total, diferenca, variacao in motor.evolucao_mensal():
+        diferenca = "" if diferenca is None else ("+" if diferenca >= 0 else "") + formatar_moeda(diferenca)
+        variacao = "" if variacao is None else f"{variacao:+.1f}%"
+        linhas.append(f"{str(ano):<8}{str(mes):<12}{formatar_moeda(total):>16}{diferenca:>14}{variacao:>10}")
+    if compras.compras:
+        # Parcelas ainda não lançadas, projetadas por ciclo de cobrança (nada é gravado)
+        hoje = date.today()
+        projecao = compras.projecao(somar_meses_ciclo(hoje.year * 100 + hoje.month, 12))
+        linhas += ["", "Parcelas a vencer (próximos 12 meses)", ""]
+        linhas.append(f"{'Ciclo':<16}{'Total (R$)':>16}")
+        for ciclo in sorted(projecao):
+            linhas.append(f"{ciclo % 100:02d}/{ciclo // 100:<13}{formatar_moeda(projecao[ciclo]):>16}")
+    return linhas
+
+
+def agregar_particao(caminho_db, particao):
+    # Roda num processo do RelatorioLote: conexão própria somente leitura e totais da
+    # parte (um ano, ou ano e mês) por ano, mês, categoria, pagamento e cartão
+    conn = sqlite3.connect(Path(caminho_db).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        condicao = "ano IS ?" + (" AND mes IS ?" if len(particao) > 1 else "")
+        return conn.execute(f"""
+            SELECT ano, mes, categoria, pagamento, TRIM(COALESCE(cartao_utilizado, '')), COALESCE(SUM(valor), 0), COUNT(*)
+            FROM despesas WHERE {condicao}
+            GROUP BY 1, 2, 3, 4, 5
+        """, particao).fetchall()
+    finally:
+        conn.close()
+
+
+class RelatorioLote:
+    # Relatório de vários anos em lote: despesas divididas por ano (ou por mês), cada parte
+    # agregada em paralelo num ProcessPoolExecutor (agregar_particao) e os totais parciais
+    # somados aqui; o relatório combinado vai para um arquivo texto. Processos "spawn":
+    # fork com as threads do ExecutorBanco vivas pode travar o filho.
+    # A interface acompanha "progresso"/"total" (partes) e pode cancelar.
+    DIMENSOES = ("ano", "mes", "categoria", "pagamento", "cartao")
+    SECOES = (("ano",), ("ano", "mes"), ("ano", "categoria"), ("ano", "mes", "categoria"),
+              ("ano", "cartao"), ("ano", "mes", "cartao"))
+
+    def __init__(self, caminho_db, destino, por_mes=False, processos=None):
+        self.caminho_db = caminho_db
+        self.destino = destino
+        self.por_mes = por_mes
+        self.processos = processos or os.cpu_count() or 1
+        self.totais = {}
+        self.progresso = 0
+        self.total = 0
+        self.duracao = 0.0
+        self.erro = None
+        self._cancelar = threading.Event()
+        self.thread = threading.Thread(target=self.executar, daemon=True)
+
+    def iniciar(self):
+        self.thread.start()
+
+    def cancelar(self):
+        self._cancelar.set()
+
+    @property
+    def cancelado(self):
+        return self._cancelar.is_set()
+
+    @property
+    def em_andamento(self):
+        return self.thread.is_alive()
+
+    def particoes(self):
+        colunas = "ano, mes" if self.por_mes else "ano"
+        conn = sqlite3.connect(Path(self.caminho_db).resolve().as_uri() + "?mode=ro", uri=True)
+        try:
+            return conn.execute(f"SELECT DISTINCT {colunas} FROM despesas").fetchall()
+        finally:
+            conn.close()
+
+    def executar(self):
+        inicio = time.perf_counter()
+        try:
+            particoes = self.particoes()
+            self.total = len(particoes)
+            self.processos = max(min(self.processos, self.total), 1)
+            contexto = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=self.processos, mp_context=contexto) as pool:
+                futuros = [pool.submit(agregar_particao, self.caminho_db, particao) for particao in particoes]
+                for futuro in as_completed(futuros):
+                    if self.cancelado:
+                        pool.shutdown(cancel_futures=True)
+                        return
+                    self.somar(futuro.result())
+                    self.progresso += 1
+            self.duracao = time.perf_counter() - inicio
+            temporario = self.destino + ".parcial"
+            with open(temporario, "w", encoding="utf-8") as arquivo:
+                arquivo.write("\n".join(self.linhas()) + "\n")
+            os.replace(temporario, self.destino)
+        except Exception as e:
+            self.erro = e
+
+    def somar(self, linhas):
+        # Junta os totais parciais de uma parte: (ano, mês, categoria, pagamento, cartão) -> [total, qtd]
+        for *chave, total, quantidade in linhas:
+            acumulado = self.totais.setdefault(tuple(chave), [0, 0])
+            acumulado[0] += total
+            acumulado[1] += quantidade
+
+    def agrupar(self, *dimensoes, somente_credito=False):
+        # [(rótulos, total, quantidade)] ordenado como no MotorRelatorios (meses no calendário)
+        indices = [self.DIMENSOES.index(d) for d in dimensoes]
+        grupos = {}
+        for chave, (total, quantidade) in self.totais.items():
+            if somente_credito and chave[3] != "Cartão de Crédito":
+                continue
+            acumulado = grupos.setdefault(tuple(chave[i] for i in indices), [0, 0])
+            acumulado[0] += total
+            acumulado[1] += quantidade
+        ordem = sorted(grupos, key=lambda rotulos: [MotorRelatorios._ordem(d, r) for d, r in zip(dimensoes, rotulos)])
+        return [(rotulos, grupos[rotulos][0], grupos[rotulos][1]) for rotulos in ordem]
+
+    def linhas(self):
+        total = sum(t for t, _ in self.totais.values())
+        quantidade = sum(q for _, q in self.totais.values())
+        particao = "mês" if self.por_mes else "ano"
+        linhas = ["Relatório de Despesas em Lote", ""]
+        linhas.append(f"Gerado em {datetime.now():%d/%m/%Y %H:%M} a partir de {self.total} partes por {particao}, "
+                      f"em {self.processos} processos ({self.duracao:.2f} s)")
+        linhas.append(f"Total Geral: R$ {formatar_moeda(total)} ({quantidade} despesas)")
+        for dimensoes in self.SECOES:
+            credito = "cartao" in dimensoes
+            titulos = [MotorRelatorios.DIMENSOES[d] for d in dimensoes]
+            secao = tabela_totais(titulos, self.agrupar(*dimensoes, somente_credito=credito))
+            if credito:
+                secao[1] += " (Cartão de Crédito)"
+            linhas += secao
+        return linhas
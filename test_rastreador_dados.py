@@ -0,0 +1,17 @@
+# Testes da camada de dados (python -m pytest)
+import sqlite3
+
+import pytest
+
+from rastreador_dados import dia_epoca_texto, sql_dia_epoca
+
+
+@pytest.mark.parametrize("texto", [
+    "05/03/2025", "5/3/2025", "5/03/2025", "05/3/2025", "1/12/2024", "29/02/2024",
+    "29/02/2025", "31/4/2025", "32/01/2025", "5/13/2025", "5-3-2025", "", None,
+])
+def test_dia_epoca_igual_em_sql_e_python(texto):
+    # Triggers (sql_dia_epoca) e inserções do app (dia_epoca_texto) gravam o mesmo vencimento_dia
+    conn = sqlite3.connect(":memory:")
+    em_sql = conn.execute(f"SELECT {sql_dia_epoca('texto')} FROM (SELECT ? AS texto)", (texto,)).fetchone()[0]
+    assert em_sql == dia_epoca_texto(texto)